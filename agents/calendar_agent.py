@@ -1,269 +1,352 @@
-import os
-import signal
-import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
-from typing import Dict
-from pydantic import BaseModel, Field
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Windows compatibility
-if os.name == "nt":
-    unix_signals = ["SIGHUP", "SIGTSTP", "SIGQUIT", "SIGCONT"]
-    for sig_name in unix_signals:
-        if not hasattr(signal, sig_name):
-            setattr(signal, sig_name, signal.SIGTERM)
-
-os.environ["CREWAI_DISABLE_TRACING"] = "true"
-import os
-import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
-from pydantic import BaseModel, Field
-from crewai import Agent
-from crewai.tools import BaseTool
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-
-# Input schemas
-class AvailabilityCheckInput(BaseModel):
-    start_time: str = Field(..., description="Start time (YYYY-MM-DDTHH:MM:SS)")
-    end_time: str = Field(..., description="End time (YYYY-MM-DDTHH:MM:SS)")
-    timezone: str = Field(default="Africa/Tunis")
-
-class FindAlternativeInput(BaseModel):
-    start_date: str = Field(..., description="Start date (YYYY-MM-DDTHH:MM:SS)")
-    duration_hours: float = Field(default=1.0)
-    days_ahead: int = Field(default=7)
-    timezone: str = Field(default="Africa/Tunis")
-
-class CreateEventInput(BaseModel):
-    summary: str = Field(..., description="Event title")
-    start_time: str = Field(..., description="Start time")
-    end_time: str = Field(..., description="End time")
-    description: str = Field(default="")
-    attendees: str = Field(default="", description="Comma-separated email addresses")
-    timezone: str = Field(default="Africa/Tunis")
-
-class SendEmailInput(BaseModel):
-    recipient: str = Field(..., description="Recipient email address")
-    subject: str = Field(..., description="Email subject")
-    body: str = Field(..., description="Email body content")
-    meeting_details: str = Field(default="", description="Meeting details to include")
-
-# Tool: Check Availability
-class CalendarAvailabilityTool(BaseTool):
-    name: str = "check_calendar_availability"
-    description: str = """Checks if a time slot is available in Google Calendar.
-    Input: start_time, end_time in format YYYY-MM-DDTHH:MM:SS
-    Returns JSON with 'available' field (true/false)"""
-    args_schema: type = AvailabilityCheckInput
-    token_file: str = Field(default="token.json", exclude=True)
-
-    def _run(self, start_time: str, end_time: str, timezone: str = "Africa/Tunis") -> str:
-        try:
-            creds = Credentials.from_authorized_user_file(self.token_file)
-            service = build("calendar", "v3", credentials=creds)
-            tz = ZoneInfo(timezone)
-            
-            start_dt = datetime.fromisoformat(start_time).replace(tzinfo=tz)
-            end_dt = datetime.fromisoformat(end_time).replace(tzinfo=tz)
-
-            body = {
-                "timeMin": start_dt.astimezone(ZoneInfo("UTC")).isoformat(),
-                "timeMax": end_dt.astimezone(ZoneInfo("UTC")).isoformat(),
-                "timeZone": timezone,
-                "items": [{"id": "primary"}]
-            }
-
-            result = service.freebusy().query(body=body).execute()
-            busy_times = result["calendars"]["primary"]["busy"]
-            
-            if busy_times:
-                print(f"❌ Time slot NOT available - {len(busy_times)} conflict(s)")
-                return json.dumps({
-                    "available": False,
-                    "message": f"NOT AVAILABLE"
-                })
-            
-            print(f"✅ Time slot is available!")
-            return json.dumps({
-                "available": True,
-                "message": "AVAILABLE"
-            })
-        except Exception as e:
-            print(f"❌ Error: {str(e)}")
-            return json.dumps({"error": str(e), "available": False})
-
-# Tool: Find Alternatives
-class FindAlternativeSlotsTool(BaseTool):
-    name: str = "find_alternative_slots"
-    description: str = """Finds alternative available slots (Monday-Friday, 9 AM - 5 PM).
-    Returns JSON with 'alternatives' array."""
-    args_schema: type = FindAlternativeInput
-    token_file: str = Field(default="token.json", exclude=True)
-
-    def _run(self, start_date: str, duration_hours: float = 1.0, 
-             days_ahead: int = 7, timezone: str = "Africa/Tunis") -> str:
-        try:
-            print(f"🔍 Finding alternatives...")
-            creds = Credentials.from_authorized_user_file(self.token_file)
-            service = build("calendar", "v3", credentials=creds)
-            tz = ZoneInfo(timezone)
-            start_dt = datetime.fromisoformat(start_date).replace(tzinfo=tz)
-            alternatives = []
-
-            for day_offset in range(days_ahead):
-                search_date = start_dt + timedelta(days=day_offset)
-                if search_date.weekday() >= 5:
-                    continue
-                
-                max_hour = 17 - int(duration_hours)
-                for hour in range(9, max_hour + 1):
-                    slot_start = search_date.replace(hour=hour, minute=0, second=0, microsecond=0)
-                    slot_end = slot_start + timedelta(hours=duration_hours)
-                    
-                    if slot_end.hour > 17:
-                        continue
-
-                    body = {
-                        "timeMin": slot_start.astimezone(ZoneInfo("UTC")).isoformat(),
-                        "timeMax": slot_end.astimezone(ZoneInfo("UTC")).isoformat(),
-                        "timeZone": timezone,
-                        "items": [{"id": "primary"}]
-                    }
-                    result = service.freebusy().query(body=body).execute()
-                    busy = result["calendars"]["primary"]["busy"]
-
-                    if not busy:
-                        alternatives.append({
-                            "formatted": f"{slot_start.strftime('%A, %B %d at %I:%M %p')} - {slot_end.strftime('%I:%M %p')}"
-                        })
-                        if len(alternatives) >= 5:
-                            break
-                if len(alternatives) >= 5:
-                    break
-            
-            print(f"✅ Found {len(alternatives)} alternatives")
-            return json.dumps({"alternatives": alternatives})
-        except Exception as e:
-            print(f"❌ Error: {str(e)}")
-            return json.dumps({"error": str(e), "alternatives": []})
-
-# Tool: Create Event
-class CreateCalendarEventTool(BaseTool):
-    name: str = "create_calendar_event"
-    description: str = """Creates a Google Calendar event."""
-    args_schema: type = CreateEventInput
-    token_file: str = Field(default="token.json", exclude=True)
-
-    def _run(self, summary: str, start_time: str, end_time: str,
-             description: str = "", attendees: str = "", timezone: str = "Africa/Tunis") -> str:
-        try:
-            print(f"📅 Creating event: {summary}")
-            creds = Credentials.from_authorized_user_file(self.token_file)
-            service = build("calendar", "v3", credentials=creds)
-            tz = ZoneInfo(timezone)
-            
-            start_dt = datetime.fromisoformat(start_time).replace(tzinfo=tz)
-            end_dt = datetime.fromisoformat(end_time).replace(tzinfo=tz)
-
-            event = {
-                "summary": summary,
-                "description": description,
-                "start": {"dateTime": start_dt.isoformat(), "timeZone": timezone},
-                "end": {"dateTime": end_dt.isoformat(), "timeZone": timezone}
-            }
-            
-            if attendees:
-                event["attendees"] = [{"email": email.strip()} for email in str(attendees).split(",")]
-
-            created = service.events().insert(calendarId="primary", body=event).execute()
-            print(f"✅ Event created!")
-            return json.dumps({"success": True, "message": "Event created successfully"})
-        except Exception as e:
-            print(f"❌ Failed: {str(e)}")
-            return json.dumps({"error": str(e), "success": False})
-
-# Tool: Send Email
-class SendEmailTool(BaseTool):
-    name: str = "send_email"
-    description: str = """Sends an email notification."""
-    args_schema: type = SendEmailInput
-    email_config: dict = Field(default_factory=dict, exclude=True)
-
-    def _run(self, recipient: str, subject: str, body: str, meeting_details: str = "") -> str:
-        try:
-            print(f"\n📧 Sending email to {recipient}...")
-            
-            msg = MIMEMultipart("alternative")
-            msg["From"] = f"{self.email_config['sender_name']} <{self.email_config['sender_email']}>"
-            msg["To"] = recipient
-            msg["Subject"] = subject
-            
-            formatted_details = meeting_details.replace('\\n', '\n').replace('\n', '<br>') if meeting_details else ""
-            
-            html_body = f"""
-            <html>
-              <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <p>{body.replace(chr(10), '<br>')}</p>
-                {f'<div style="margin-top: 20px; padding: 15px; background-color: #f5f5f5; border-left: 4px solid #4CAF50;">{formatted_details}</div>' if formatted_details else ''}
-                <p style="margin-top: 30px; font-size: 12px; color: #666;">
-                  This is an automated message from Calendar Assistant.
-                </p>
-              </body>
-            </html>
-            """
-            
-            msg.attach(MIMEText(html_body, "html"))
-            
-            with smtplib.SMTP(self.email_config["smtp_server"], self.email_config["smtp_port"]) as server:
-                server.starttls()
-                server.login(self.email_config["sender_email"], self.email_config["sender_password"])
-                server.send_message(msg)
-            
-            print(f"✅ Email sent!")
-            return json.dumps({"success": True, "message": f"Email sent to {recipient}"})
-        except Exception as e:
-            print(f"❌ Failed: {str(e)}")
-            return json.dumps({"success": False, "error": str(e)})
-
-def create_calendar_agent(token_file: str, email_config: dict, llm, email_only=False):
-    """Create the calendar scheduling agent"""
-    
-    if email_only:
-        # Agent spécialisé pour SEULEMENT envoyer des emails
-        tools = [SendEmailTool(email_config=email_config)]
-        role = "Email Sender"
-        goal = "Send professional email notifications"
-        backstory = "You write and send emails. You MUST use the send_email tool."
-    else:
-        # Agent normal avec tous les outils
-        tools = [
-            CalendarAvailabilityTool(token_file=token_file),
-            FindAlternativeSlotsTool(token_file=token_file),
-            CreateCalendarEventTool(token_file=token_file),
-            SendEmailTool(email_config=email_config)
-        ]
-        role = "Calendar Assistant"
-        goal = "Check availability, schedule meetings, and send emails"
-        backstory = "You are a helpful calendar assistant."
-    
-    return Agent(
-        role=role,
-        goal=goal,
-        backstory=backstory,
-        tools=tools,
-        llm=llm,
-        verbose=True,
-        allow_delegation=False,
-        max_iter=25
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from zoneinfo import ZoneInfo
+from pydantic import BaseModel, Field
+
+import utils.bootstrap  # noqa: F401
+from crewai import Agent
+from crewai.tools import BaseTool
+
+from utils.calendar_events import build_event, insert_event, insert_events
+from utils.calendar_slots import find_slots, parse_busy, search_window
+from utils.freebusy_cache import FREEBUSY_INDEX
+from utils.google_services import get_service
+from utils.notifications import render_message
+from utils.outbox import build_message, enqueue_email
+from utils.smtp_pool import get_smtp_pool
+from utils.tracing import span
+
+def get_calendar_service(token_file):
+    """Shared Google Calendar client for the token file"""
+    return get_service("calendar", "v3", token_file)
+
+# Calendars per freebusy request accepted by the API
+FREEBUSY_MAX_CALENDARS = 50
+
+def calendar_ids(attendees=""):
+    """The organiser's primary calendar plus any comma-separated attendee calendars"""
+    ids = ["primary"]
+    for attendee in str(attendees or "").split(","):
+        attendee = attendee.strip().lower()
+        if attendee and attendee not in ids:
+            ids.append(attendee)
+    return ids
+
+def busy_by_calendar(token_file, start_dt, end_dt, timezone, calendars=("primary",)):
+    """({calendar_id: busy intervals}, {calendar_id: error}) from one batched freebusy lookup"""
+    errors = {}
+
+    def fetch(keys, time_min, time_max):
+        service = get_calendar_service(token_file)
+        ids = [calendar_id for _, calendar_id in keys]
+        fetched = {}
+        for i in range(0, len(ids), FREEBUSY_MAX_CALENDARS):
+            body = {
+                "timeMin": time_min.astimezone(ZoneInfo("UTC")).isoformat(),
+                "timeMax": time_max.astimezone(ZoneInfo("UTC")).isoformat(),
+                "timeZone": timezone,
+                "items": [{"id": calendar_id} for calendar_id in ids[i:i + FREEBUSY_MAX_CALENDARS]]
+            }
+            with span("calendar.freebusy_query", calendars=len(body["items"])):
+                result = service.freebusy().query(body=body).execute()
+            for calendar_id, calendar in result["calendars"].items():
+                if calendar.get("errors"):
+                    errors[calendar_id] = calendar["errors"][0].get("reason", "unknown")
+                else:
+                    fetched[(token_file, calendar_id)] = parse_busy(calendar.get("busy", []))
+        return fetched
+
+    found = FREEBUSY_INDEX.busy_between([(token_file, c) for c in calendars], start_dt, end_dt, fetch)
+    return {calendar_id: busy for (_, calendar_id), busy in found.items()}, errors
+
+# Input schemas
+class AvailabilityCheckInput(BaseModel):
+    start_time: str = Field(..., description="Start time (YYYY-MM-DDTHH:MM:SS)")
+    end_time: str = Field(..., description="End time (YYYY-MM-DDTHH:MM:SS)")
+    timezone: str = Field(default="Africa/Tunis")
+    attendees: str = Field(default="", description="Comma-separated attendee emails or calendar IDs to check as well")
+
+class FindAlternativeInput(BaseModel):
+    start_date: str = Field(..., description="Start date (YYYY-MM-DDTHH:MM:SS)")
+    duration_hours: float = Field(default=1.0)
+    days_ahead: int = Field(default=7)
+    timezone: str = Field(default="Africa/Tunis")
+    buffer_minutes: int = Field(default=0, description="Free minutes required before and after the meeting")
+    max_results: int = Field(default=5)
+    attendees: str = Field(default="", description="Comma-separated attendee emails or calendar IDs that must all be free")
+
+class CreateEventInput(BaseModel):
+    summary: str = Field(..., description="Event title")
+    start_time: str = Field(..., description="Start time")
+    end_time: str = Field(..., description="End time")
+    description: str = Field(default="")
+    attendees: str = Field(default="", description="Comma-separated email addresses")
+    timezone: str = Field(default="Africa/Tunis")
+
+class SendEmailInput(BaseModel):
+    recipient: str = Field(..., description="Recipient email address")
+    subject: str = Field(..., description="Email subject")
+    body: str = Field(..., description="Email body content")
+    meeting_details: str = Field(default="", description="Meeting details to include")
+
+# Tool: Check Availability
+class CalendarAvailabilityTool(BaseTool):
+    name: str = "check_calendar_availability"
+    description: str = """Checks if a time slot is available in Google Calendar.
+    Input: start_time, end_time in format YYYY-MM-DDTHH:MM:SS, optional comma-separated attendees
+    Returns JSON with 'available' field (true/false)"""
+    args_schema: type = AvailabilityCheckInput
+    token_file: str = Field(default="token.json", exclude=True)
+
+    def _run(self, start_time: str, end_time: str, timezone: str = "Africa/Tunis", attendees: str = "") -> str:
+        try:
+            tz = ZoneInfo(timezone)
+            
+            start_dt = datetime.fromisoformat(start_time).replace(tzinfo=tz)
+            end_dt = datetime.fromisoformat(end_time).replace(tzinfo=tz)
+
+            busy, errors = busy_by_calendar(self.token_file, start_dt, end_dt, timezone, calendar_ids(attendees))
+            if "primary" in errors:
+                raise RuntimeError(f"freebusy failed: {errors['primary']}")
+
+            conflicts = {calendar_id: len(times) for calendar_id, times in busy.items() if times}
+            if conflicts:
+                print(f"❌ Time slot NOT available - {sum(conflicts.values())} conflict(s)")
+                return json.dumps({
+                    "available": False,
+                    "message": f"NOT AVAILABLE",
+                    "conflicts": conflicts,
+                    "unchecked": sorted(errors)
+                })
+            
+            print(f"✅ Time slot is available!")
+            return json.dumps({
+                "available": True,
+                "message": "AVAILABLE",
+                "unchecked": sorted(errors)
+            })
+        except Exception as e:
+            print(f"❌ Error: {str(e)}")
+            return json.dumps({"error": str(e), "available": False})
+
+# Tool: Find Alternatives
+class FindAlternativeSlotsTool(BaseTool):
+    name: str = "find_alternative_slots"
+    description: str = """Finds alternative available slots (Monday-Friday, 9 AM - 5 PM, 15-minute steps),
+    closest to the requested time first, where the organiser and all attendees are free.
+    Returns JSON with 'alternatives' array."""
+    args_schema: type = FindAlternativeInput
+    token_file: str = Field(default="token.json", exclude=True)
+
+    def _run(self, start_date: str, duration_hours: float = 1.0, days_ahead: int = 7,
+             timezone: str = "Africa/Tunis", buffer_minutes: int = 0, max_results: int = 5,
+             attendees: str = "") -> str:
+        try:
+            print(f"🔍 Finding alternatives...")
+            tz = ZoneInfo(timezone)
+            start_dt = datetime.fromisoformat(start_date).replace(tzinfo=tz)
+            time_min, time_max = search_window(start_dt, days_ahead)
+            # Events just outside working hours still count against the buffer
+            time_min -= timedelta(minutes=buffer_minutes)
+            time_max += timedelta(minutes=buffer_minutes)
+
+            # One freebusy lookup for every calendar over the whole window; the union of
+            # their busy intervals leaves exactly the time everyone has free
+            busy, errors = busy_by_calendar(self.token_file, time_min, time_max, timezone, calendar_ids(attendees))
+            if "primary" in errors:
+                raise RuntimeError(f"freebusy failed: {errors['primary']}")
+            all_busy = [interval for times in busy.values() for interval in times]
+
+            slots = find_slots(start_dt, duration_hours, all_busy, days_ahead=days_ahead, max_results=max_results,
+                               buffer_minutes=buffer_minutes, not_before=datetime.now(tz))
+            alternatives = [
+                {
+                    "start": slot_start.isoformat(),
+                    "end": slot_end.isoformat(),
+                    "formatted": f"{slot_start.strftime('%A, %B %d at %I:%M %p')} - {slot_end.strftime('%I:%M %p')}"
+                }
+                for slot_start, slot_end in slots
+            ]
+            
+            print(f"✅ Found {len(alternatives)} alternatives")
+            return json.dumps({"alternatives": alternatives, "unchecked": sorted(errors)})
+        except Exception as e:
+            print(f"❌ Error: {str(e)}")
+            return json.dumps({"error": str(e), "alternatives": []})
+
+# Tool: Create Event
+class CreateCalendarEventTool(BaseTool):
+    name: str = "create_calendar_event"
+    description: str = """Creates a Google Calendar event."""
+    args_schema: type = CreateEventInput
+    token_file: str = Field(default="token.json", exclude=True)
+    # The email the event is for, so a batched insert result can be found again
+    email_id: Optional[int] = Field(default=None, exclude=True)
+
+    def _run(self, summary: str, start_time: str, end_time: str,
+             description: str = "", attendees: str = "", timezone: str = "Africa/Tunis") -> str:
+        try:
+            print(f"📅 Creating event: {summary}")
+            service = get_calendar_service(self.token_file)
+            tz = ZoneInfo(timezone)
+            
+            start_dt = datetime.fromisoformat(start_time).replace(tzinfo=tz)
+            end_dt = datetime.fromisoformat(end_time).replace(tzinfo=tz)
+
+            event = build_event(summary, start_dt, end_dt, timezone, description, attendees)
+            meeting = {"summary": summary, "start_time": start_time, "end_time": end_time,
+                       "description": description, "attendees": attendees}
+            if EVENT_BATCH.queue(self.token_file, timezone, meeting, self.email_id):
+                # Backlog runs insert their events together once every email is processed
+                FREEBUSY_INDEX.add_busy((self.token_file, "primary"), start_dt, end_dt)
+                print(f"🗓️ Event queued for the batched insert")
+                return json.dumps({"success": True, "event_id": event["id"], "message": "Event queued for creation"})
+            result = insert_event(service, event)
+            FREEBUSY_INDEX.add_busy((self.token_file, "primary"), start_dt, end_dt)
+
+            if result["status"] == "exists":
+                print(f"♻️ Event already exists")
+                return json.dumps({"success": True, "event_id": result["event_id"], "message": "Event already exists"})
+            print(f"✅ Event created!")
+            return json.dumps({"success": True, "event_id": result["event_id"], "message": "Event created successfully"})
+        except Exception as e:
+            print(f"❌ Failed: {str(e)}")
+            return json.dumps({"error": str(e), "success": False})
+
+def schedule_events(token_file, meetings, timezone="Africa/Tunis"):
+    """Create many events through batched inserts (backlog runs, via EVENT_BATCH).
+
+    meetings: dicts with summary, start_time, end_time and optional description
+    and attendees, as accepted by create_calendar_event. Returns one
+    {"event_id", "status"} result per meeting; status is created, exists or failed.
+    """
+    tz = ZoneInfo(timezone)
+    events, windows = [], []
+    for meeting in meetings:
+        start_dt = datetime.fromisoformat(meeting["start_time"]).replace(tzinfo=tz)
+        end_dt = datetime.fromisoformat(meeting["end_time"]).replace(tzinfo=tz)
+        events.append(build_event(meeting["summary"], start_dt, end_dt, timezone,
+                                  meeting.get("description", ""), meeting.get("attendees", "")))
+        windows.append((start_dt, end_dt))
+
+    results = insert_events(get_calendar_service(token_file), events)
+    for (start_dt, end_dt), result in zip(windows, results):
+        if result["status"] != "failed":
+            FREEBUSY_INDEX.add_busy((token_file, "primary"), start_dt, end_dt)
+
+    created = sum(result["status"] == "created" for result in results)
+    print(f"📅 Scheduled {created} new event(s), {len(results) - created} skipped or failed")
+    return results
+
+class EventBatch:
+    """Events create_calendar_event queues instead of inserting while a batch is open (backlog runs)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def open(self):
+        with self._lock:
+            self._pending = []
+
+    def queue(self, token_file, timezone, meeting, email_id):
+        """Queue a meeting for flush(); False when no batch is open"""
+        with self._lock:
+            if self._pending is None:
+                return False
+            self._pending.append((token_file, timezone, meeting, email_id))
+            return True
+
+    def flush(self):
+        """Close the batch and insert its events with schedule_events(); {email_id: result}
+
+        An email with several queued events gets the result of a failed one, if any.
+        """
+        with self._lock:
+            pending, self._pending = self._pending or [], None
+        groups = defaultdict(list)
+        for token_file, timezone, meeting, email_id in pending:
+            groups[(token_file, timezone)].append((meeting, email_id))
+
+        results = {}
+        for (token_file, timezone), items in groups.items():
+            try:
+                inserted = schedule_events(token_file, [meeting for meeting, _ in items], timezone)
+            except Exception as e:
+                print(f"❌ Batched event insert failed: {e}")
+                inserted = [{"event_id": None, "status": "failed", "error": str(e)} for _ in items]
+            for (_, email_id), result in zip(items, inserted):
+                if results.get(email_id, {}).get("status") != "failed":
+                    results[email_id] = result
+        return results
+
+EVENT_BATCH = EventBatch()
+
+# Tool: Send Email
+class SendEmailTool(BaseTool):
+    name: str = "send_email"
+    description: str = """Sends an email notification."""
+    args_schema: type = SendEmailInput
+    email_config: dict = Field(default_factory=dict, exclude=True)
+    # With an engine the message goes to the outbox and is sent in the background
+    engine: Any = Field(default=None, exclude=True)
+    email_id: Optional[int] = Field(default=None, exclude=True)
+
+    def _run(self, recipient: str, subject: str, body: str, meeting_details: str = "") -> str:
+        try:
+            print(f"\n📧 Sending email to {recipient}...")
+            
+            _, text_body, html_body = render_message(subject, body, meeting_details)
+
+            if self.engine is not None:
+                enqueue_email(self.engine, recipient, subject, html_body, text_body=text_body, email_id=self.email_id)
+                return json.dumps({"success": True, "message": f"Email to {recipient} queued"})
+
+            msg = build_message(
+                {"recipient": recipient, "subject": subject, "text_body": text_body, "html_body": html_body},
+                self.email_config,
+            )
+            with span("smtp.send_message"):
+                get_smtp_pool(self.email_config).send(msg)
+            
+            print(f"✅ Email sent!")
+            return json.dumps({"success": True, "message": f"Email sent to {recipient}"})
+        except Exception as e:
+            print(f"❌ Failed: {str(e)}")
+            return json.dumps({"success": False, "error": str(e)})
+
+def create_calendar_agent(token_file: str, email_config: dict, llm, email_only=False, engine=None, email_id=None):
+    """Create the calendar scheduling agent (emails go through the outbox when an engine is given)"""
+    
+    send_email_tool = SendEmailTool(email_config=email_config, engine=engine, email_id=email_id)
+    if email_only:
+        # Agent spécialisé pour SEULEMENT envoyer des emails
+        tools = [send_email_tool]
+        role = "Email Sender"
+        goal = "Send professional email notifications"
+        backstory = "You write and send emails. You MUST use the send_email tool."
+    else:
+        # Agent normal avec tous les outils
+        tools = [
+            CalendarAvailabilityTool(token_file=token_file),
+            FindAlternativeSlotsTool(token_file=token_file),
+            CreateCalendarEventTool(token_file=token_file, email_id=email_id),
+            send_email_tool
+        ]
+        role = "Calendar Assistant"
+        goal = "Check availability, schedule meetings, and send emails"
+        backstory = "You are a helpful calendar assistant."
+    
+    return Agent(
+        role=role,
+        goal=goal,
+        backstory=backstory,
+        tools=tools,
+        llm=llm,
+        verbose=True,
+        allow_delegation=False,
+        max_iter=25
     )
\ No newline at end of file
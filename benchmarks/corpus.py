@@ -0,0 +1,104 @@
+"""
+Synthetic meeting-request emails and personnes rows for offline benchmarks.
+
+Every email carries the parsed JSON the pipeline is expected to extract, so the
+fake LLMs can answer deterministically.
+"""
+import random
+from datetime import date, timedelta
+
+FIRST_NAMES = ["Amira", "Youssef", "Sarra", "Mehdi", "Lina", "Karim", "Nour", "Omar", "Ines", "Rami"]
+LAST_NAMES = ["Ben Ali", "Trabelsi", "Gharbi", "Jaziri", "Mansour", "Haddad", "Chaabane", "Ayari"]
+COMPANIES = ["Tunisie Telecom", "Vermeg", "Sofrecom", "InstaDeep", "Poulina", "Expensya", "Talan"]
+SERVICES = ["Sales", "Procurement", "IT", "Finance", "R&D", "Operations"]
+ROLES = ["manager", "client", "supplier", "team_member"]
+RELATION_TYPES = ["meeting_client", "collaboration", "supplier_offer"]
+PROJECTS = [
+    "ERP Migration", "Mobile Banking App", "Data Platform", "Cloud Cost Review",
+    "Supplier Onboarding", "CRM Rollout", "Security Audit", "Role-Based Weighting",
+]
+TOPICS = [
+    "kick-off and scope alignment", "budget review", "delivery timeline",
+    "contract renewal", "technical architecture", "pilot results", "pricing proposal",
+]
+SUBJECTS = ["Meeting request: {project}", "Collaboration on {project}", "Client meeting - {project}"]
+URGENT_CUES = ["This is urgent, ", "ASAP please: ", ""]
+
+def generate_people(n_people, rng):
+    """personnes rows with unique emails"""
+    people = []
+    for i in range(n_people):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        company = rng.choice(COMPANIES)
+        domain = company.lower().replace(" ", "") + ".tn"
+        people.append({
+            "name": f"{first} {last}",
+            "email": f"{first.lower()}.{last.lower().replace(' ', '')}{i}@{domain}",
+            "role": rng.choice(ROLES),
+            "service": rng.choice(SERVICES),
+            "company": company,
+            "relation_type": rng.choice(RELATION_TYPES),
+            "project_title": rng.choice(PROJECTS),
+            "project_description": "Synthetic project used for benchmarking",
+            "latest_decision": rng.choice(["Approved phase 1", "Budget on hold", "Waiting for specs"]),
+        })
+    return people
+
+def _next_weekday(day):
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+def generate_emails(n_emails, people, rng, start_date=None, unknown_sender_ratio=0.1):
+    """Meeting-request emails with their expected parsed JSON"""
+    start_date = start_date or date.today() + timedelta(days=1)
+    emails = []
+
+    for i in range(n_emails):
+        person = rng.choice(people)
+        unknown = rng.random() < unknown_sender_ratio
+        sender_email = f"guest{i}@example.com" if unknown else person["email"]
+        sender_name = "Guest" if unknown else person["name"]
+
+        project = person["project_title"]
+        topic = rng.choice(TOPICS)
+        urgent_cue = rng.choice(URGENT_CUES)
+        meeting_day = _next_weekday(start_date + timedelta(days=rng.randint(0, 20)))
+        hour = rng.randint(9, 16)
+        duration = rng.choice([0.5, 1.0, 1.0, 1.5, 2.0])
+
+        body = (
+            f"Hello,\n\n{urgent_cue}I would like to schedule a meeting about {topic} "
+            f"for the {project} project on {meeting_day.isoformat()} at {hour:02d}:00 "
+            f"for {duration} hour(s). Please prepare the latest status report.\n\n"
+            f"Best regards,\n{sender_name} (ref {i})"
+        )
+
+        emails.append({
+            "sender_email": sender_email,
+            "sender_name": sender_name,
+            "subject": rng.choice(SUBJECTS).format(project=project),
+            "body": body,
+            "expected": {
+                "sender_role": person["role"],
+                "project_title": project,
+                "meeting_topic": topic,
+                "relation_type": person["relation_type"],
+                "meeting_date": meeting_day.isoformat(),
+                "meeting_time": f"{hour:02d}:00",
+                "duration": duration,
+                "urgent": bool(urgent_cue),
+                "tasks_requested": ["Prepare status report"],
+                "documents_to_prepare": ["Latest status report"],
+                "confirmation_status": "pending",
+            },
+        })
+
+    return emails
+
+def generate_corpus(n_emails=50, n_people=200, seed=42):
+    """Deterministic corpus: {"people": [...], "emails": [...]}"""
+    rng = random.Random(seed)
+    people = generate_people(n_people, rng)
+    return {"people": people, "emails": generate_emails(n_emails, people, rng)}
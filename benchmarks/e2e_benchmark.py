@@ -0,0 +1,338 @@
+"""
+End-to-end pipeline benchmark against local fakes.
+
+Generates a synthetic corpus, swaps Gmail, Google Calendar, SMTP, Postgres, the
+Groq client and the agent LLM for the in-process fakes, then drives
+run_orchestration() once per email. Reports emails/minute and p50/p95/p99 per
+traced stage, and saves the report as JSON for comparison across commits.
+
+    python -m benchmarks.e2e_benchmark --emails 20
+    python -m benchmarks.e2e_benchmark --emails 20 --compare benchmarks/results/<baseline>.json
+    python -m benchmarks.e2e_benchmark --emails 20 --record /tmp/e2e.cassette
+    python -m benchmarks.e2e_benchmark --emails 20 --replay /tmp/e2e.cassette --replay-speed 0
+    python -m benchmarks.e2e_benchmark --emails 6 --latency-scale 0 --round-trip
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.fakes import (
+    DEFAULT_LATENCIES,
+    FakeCalendarService,
+    FakeGmailService,
+    FakeGroqClient,
+    FakeSMTP,
+    create_fake_database,
+)
+from utils import tracing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+def seed_busy_slots(corpus, conflict_ratio, seed, timezone="Africa/Tunis"):
+    """Mark a share of the requested meeting slots as already busy"""
+    rng = random.Random(seed)
+    tz = ZoneInfo(timezone)
+    busy = []
+    for email in corpus["emails"]:
+        if rng.random() >= conflict_ratio:
+            continue
+        parsed = email["expected"]
+        start = datetime.fromisoformat(f"{parsed['meeting_date']}T{parsed['meeting_time']}:00").replace(tzinfo=tz)
+        busy.append((start.isoformat(), (start + timedelta(hours=1)).isoformat()))
+    return {"primary": busy}
+
+@contextmanager
+def install_fakes(corpus, latency_scale=1.0, conflict_ratio=0.3, seed=42, smtp_sink=False):
+    """Point every external dependency of the pipeline at an in-process fake
+
+    With smtp_sink, notifications go through the real smtplib client to a local
+    SMTPSink instead of FakeSMTP.
+    """
+    import orchestrator.main_orchestrator as orchestrator
+    import agents.calendar_agent as calendar_agent
+    import utils.database as database
+    import utils.llm as llm
+    import utils.smtp_pool as smtp_pool
+    import utils.history_index as history_index
+    from utils.freebusy_cache import FREEBUSY_INDEX
+    from benchmarks.fake_agent_llm import ScriptedAgentLLM
+
+    latency = {name: value * latency_scale for name, value in DEFAULT_LATENCIES.items()}
+    engine = create_fake_database(corpus["people"])
+    gmail = FakeGmailService(corpus["emails"], latency=latency["gmail"])
+    calendar = FakeCalendarService(seed_busy_slots(corpus, conflict_ratio, seed), latency=latency["calendar"])
+    groq = FakeGroqClient(corpus["emails"], latency=latency["llm"])
+    agent_llm = ScriptedAgentLLM(corpus=corpus, latency=latency["llm"] / 4)
+
+    FakeSMTP.sent = []
+    FREEBUSY_INDEX.invalidate()
+    smtp_pool.close_pools()
+    FakeSMTP.connect_latency = latency["smtp_connect"]
+    FakeSMTP.send_latency = latency["smtp_send"]
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(orchestrator, "setup_gmail", lambda: gmail))
+        stack.enter_context(mock.patch.object(orchestrator, "setup_database", lambda: engine))
+        stack.enter_context(mock.patch.object(database, "setup_database", lambda: engine))
+        stack.enter_context(mock.patch.object(orchestrator, "get_agent_llm", lambda stage="advice": agent_llm))
+        stack.enter_context(mock.patch.object(llm, "get_groq_client", lambda: groq))
+        stack.enter_context(mock.patch.object(calendar_agent, "get_calendar_service", lambda token_file: calendar))
+        history_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        history = history_index.HistoryIndex(history_dir, embedder=history_index.HashingEmbedder(), sync_every=0)
+        stack.enter_context(mock.patch.object(history_index, "HISTORY", history))
+        if smtp_sink:
+            sink = stack.enter_context(SMTPSink(latency=latency["smtp_send"]))
+            stack.enter_context(mock.patch.dict(orchestrator.EMAIL_CONFIG, sink.email_config()))
+        else:
+            sink = None
+            stack.enter_context(mock.patch.object(smtp_pool.smtplib, "SMTP", FakeSMTP))
+        stack.callback(smtp_pool.close_pools)
+        yield SimpleNamespace(
+            orchestrator=orchestrator,
+            engine=engine,
+            gmail=gmail,
+            calendar=calendar,
+            groq=groq,
+            agent_llm=agent_llm,
+            email_config=orchestrator.EMAIL_CONFIG,
+            sink=sink,
+        )
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summarize(durations_ms):
+    return {
+        "count": len(durations_ms),
+        "mean_ms": round(sum(durations_ms) / len(durations_ms), 3),
+        "p50_ms": round(percentile(durations_ms, 50), 3),
+        "p95_ms": round(percentile(durations_ms, 95), 3),
+        "p99_ms": round(percentile(durations_ms, 99), 3),
+    }
+
+def stage_statistics(spans):
+    """Latency percentiles per span name"""
+    by_name = {}
+    for finished in spans:
+        by_name.setdefault(finished.name, []).append(finished.duration_seconds * 1000)
+    return {name: summarize(durations) for name, durations in sorted(by_name.items())}
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_benchmark(n_emails=20, n_people=200, seed=42, latency_scale=0.1, conflict_ratio=0.3, verbose=False,
+                  smtp_sink=False, lazy_advice=False, cassette=None, replay_speed=1.0):
+    """Process n_emails synthetic emails end to end and return the report dict
+
+    cassette is an optional ("record" | "replay", path): the run's calls to the
+    fakes are recorded to, or served from, a utils.cassette file.
+    """
+    from utils.outbox import drain_outbox
+    from utils import cassette as cassettes
+
+    corpus = generate_corpus(n_emails=n_emails, n_people=n_people, seed=seed)
+    tracing.reset()
+    email_durations_ms = []
+    failures = 0
+    recording = None
+
+    with install_fakes(corpus, latency_scale, conflict_ratio, seed, smtp_sink) as env, \
+            mock.patch.dict(os.environ, {"LAZY_ADVICE": "1" if lazy_advice else ""}), ExitStack() as stack:
+        if cassette:
+            mode, path = cassette
+            recording = cassettes.install(path, mode, replay_speed, orchestrator=env.orchestrator)
+            stack.callback(cassettes.uninstall)
+        started = time.perf_counter()
+        for _ in range(n_emails):
+            email_started = time.perf_counter()
+            output = io.StringIO()
+            with redirect_stdout(sys.stdout if verbose else output):
+                result = env.orchestrator.run_orchestration()
+            if result is None:
+                failures += 1
+            email_durations_ms.append((time.perf_counter() - email_started) * 1000)
+        elapsed = time.perf_counter() - started
+
+        # The pipeline only queues notifications; deliver them as the background sender would
+        drain_started = time.perf_counter()
+        with redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            drain_outbox(env.orchestrator.setup_database(), env.email_config)
+        drain_elapsed = time.perf_counter() - drain_started
+        emails_sent = len(env.sink.messages) if env.sink else len(FakeSMTP.sent)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "emails": n_emails,
+            "people": n_people,
+            "seed": seed,
+            "latency_scale": latency_scale,
+            "conflict_ratio": conflict_ratio,
+            "smtp_sink": smtp_sink,
+            "lazy_advice": lazy_advice,
+            "cassette": cassette[0] if cassette else None,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "emails_per_minute": round(n_emails / elapsed * 60, 2) if elapsed else None,
+        "failures": failures,
+        "emails_sent": emails_sent,
+        "cassette_unused": recording.unused() if recording and recording.mode == "replay" else None,
+        "outbox_drain_s": round(drain_elapsed, 3),
+        "llm_calls": {"groq": env.groq.calls, "agent": env.agent_llm.calls},
+        "email_latency": summarize(email_durations_ms),
+        "stages": stage_statistics(tracing.finished_spans()),
+    }
+
+def check_round_trip(**options):
+    """Record a run to a cassette, replay it instantly and return what did not match"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "round-trip.cassette")
+        recorded = run_benchmark(cassette=("record", path), **options)
+        try:
+            replayed = run_benchmark(cassette=("replay", path), replay_speed=0, **options)
+        except Exception as e:
+            return recorded, None, [f"replay crashed: {type(e).__name__}: {e}"]
+
+    problems = []
+    if replayed["failures"] != recorded["failures"]:
+        problems.append(f"{replayed['failures']} failures on replay, {recorded['failures']} when recorded")
+    if replayed["cassette_unused"]:
+        problems.append(f"{replayed['cassette_unused']} recorded calls left unused")
+    return recorded, replayed, problems
+
+def save_report(report, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"e2e-{stamp}-{report['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def print_report(report):
+    print(f"\n📊 {report['config']['emails']} emails in {report['elapsed_s']} s "
+          f"-> {report['emails_per_minute']} emails/min "
+          f"({report['failures']} failed, {report['emails_sent']} notifications)")
+    print(f"{'stage':40} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    rows = [("email (end to end)", report["email_latency"])] + list(report["stages"].items())
+    for name, stats in rows:
+        print(f"{name:40} {stats['count']:>6} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} {stats['p99_ms']:>10.1f}")
+
+def compare_reports(baseline, current, threshold=0.10):
+    """Print p95 and throughput deltas; returns the list of regressions"""
+    regressions = []
+    print(f"\n🔍 Comparing against {baseline['commit']} ({baseline['timestamp']})")
+
+    old_rate, new_rate = baseline.get("emails_per_minute"), current.get("emails_per_minute")
+    if old_rate and new_rate:
+        change = (new_rate - old_rate) / old_rate
+        print(f"  throughput: {old_rate} -> {new_rate} emails/min ({change:+.1%})")
+        if change < -threshold:
+            regressions.append("emails_per_minute")
+
+    for name, stats in current["stages"].items():
+        old = baseline["stages"].get(name)
+        if not old or not old["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"]
+        marker = "❌" if change > threshold else "  "
+        print(f"{marker} {name:40} p95 {old['p95_ms']:>9.1f} -> {stats['p95_ms']:>9.1f} ms ({change:+.1%})")
+        if change > threshold:
+            regressions.append(name)
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark with fake external services")
+    parser.add_argument("--emails", type=int, default=20)
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-scale", type=float, default=0.1,
+                        help="Multiplier for the fake services' default latencies (0 disables sleeps)")
+    parser.add_argument("--conflict-ratio", type=float, default=0.3,
+                        help="Share of requested slots that are already busy")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/e2e-<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline and crew output")
+    parser.add_argument("--smtp-sink", action="store_true",
+                        help="Deliver notifications to a local SMTP sink with the real smtplib client")
+    parser.add_argument("--lazy-advice", action="store_true",
+                        help="Leave advice pending, as with LAZY_ADVICE=1")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="PATH", help="Record the run's external calls to a cassette")
+    cassette.add_argument("--replay", metavar="PATH", help="Serve the external calls from a recorded cassette")
+    cassette.add_argument("--round-trip", action="store_true",
+                          help="Record a run, replay it and fail if the replay diverges")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="Multiplier for the recorded latencies on replay (0 disables sleeps)")
+    args = parser.parse_args(argv)
+
+    if args.round_trip:
+        recorded, replayed, problems = check_round_trip(
+            n_emails=args.emails, n_people=args.people, seed=args.seed, latency_scale=args.latency_scale,
+            conflict_ratio=args.conflict_ratio, verbose=args.verbose, smtp_sink=args.smtp_sink,
+            lazy_advice=args.lazy_advice,
+        )
+        print_report(recorded)
+        if replayed:
+            print_report(replayed)
+        for problem in problems:
+            print(f"❌ Cassette round trip: {problem}")
+        if problems:
+            return 1
+        print("\n✅ Replay matched the recorded run")
+        return 0
+
+    report = run_benchmark(
+        n_emails=args.emails,
+        n_people=args.people,
+        seed=args.seed,
+        latency_scale=args.latency_scale,
+        conflict_ratio=args.conflict_ratio,
+        verbose=args.verbose,
+        smtp_sink=args.smtp_sink,
+        lazy_advice=args.lazy_advice,
+        cassette=("record", args.record) if args.record else ("replay", args.replay) if args.replay else None,
+        replay_speed=args.replay_speed,
+    )
+    print_report(report)
+    print(f"\n💾 Report saved to {save_report(report, args.output)}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_reports(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+        print("\n✅ No regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""
+In-process stand-ins for Gmail, Google Calendar, SMTP, the Groq client and Postgres.
+
+They mimic just enough of each client's call chain for the pipeline code to run
+unchanged; every call sleeps for a configurable latency so stage timings stay
+representative.
+"""
+import time
+import json
+import base64
+import random
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+# Default per-call latencies in seconds, scaled by the benchmark's --latency-scale
+DEFAULT_LATENCIES = {
+    "gmail": 0.08,
+    "calendar": 0.12,
+    "smtp_connect": 0.3,
+    "smtp_send": 0.1,
+    "llm": 0.6,
+}
+
+class _Request:
+    """Deferred call, mirrors googleapiclient's HttpRequest.execute()"""
+
+    def __init__(self, func, latency):
+        self._func = func
+        self._latency = latency
+
+    def execute(self, *args, **kwargs):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._func()
+
+class _Batch:
+    """Mirrors googleapiclient's BatchHttpRequest: one round trip, one callback per request"""
+
+    def __init__(self, callback, latency):
+        self._callback = callback
+        self._latency = latency
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        request_id = request_id if request_id is not None else str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, *args, **kwargs):
+        if self._latency:
+            time.sleep(self._latency)
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = request._func(), None
+            except Exception as e:
+                response, exception = None, e
+            if callback is not None:
+                callback(request_id, response, exception)
+
+def http_error(status, reason=""):
+    """googleapiclient HttpError with the given status"""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    return HttpError(httplib2.Response({"status": status}), json.dumps({"error": {"message": reason}}).encode())
+
+# ==================== Gmail ====================
+
+class FakeGmailService:
+    """users().messages().list/get over a fixed inbox; fetched messages leave the inbox"""
+
+    def __init__(self, emails, latency=0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._inbox = {}
+        for i, email in enumerate(emails):
+            message = MIMEText(email["body"])
+            message["Subject"] = email["subject"]
+            message["From"] = f'"{email["sender_name"]}" <{email["sender_email"]}>'
+            self._inbox[f"msg{i:06d}"] = base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, userId="me", maxResults=100, **kwargs):
+        def run():
+            with self._lock:
+                ids = list(self._inbox)[:maxResults]
+            return {"messages": [{"id": message_id} for message_id in ids]}
+        return _Request(run, self.latency)
+
+    def get(self, userId="me", id=None, format="raw", **kwargs):
+        def run():
+            with self._lock:
+                raw = self._inbox.pop(id)
+            return {"id": id, "raw": raw}
+        return _Request(run, self.latency)
+
+    @property
+    def remaining(self):
+        return len(self._inbox)
+
+# ==================== Google Calendar ====================
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def seed_calendar(n_events, start, days=365, seed=42, durations=(15, 30, 30, 45, 60, 90),
+                  work_start=8, work_end=18):
+    """Deterministic (start_iso, end_iso) events spread over the working hours of `days` days"""
+    rng = random.Random(seed)
+    events = []
+    first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(n_events):
+        day = first_day + timedelta(days=rng.randrange(days))
+        event_start = day.replace(hour=rng.randrange(work_start, work_end), minute=rng.choice([0, 15, 30, 45]))
+        event_end = event_start + timedelta(minutes=rng.choice(durations))
+        events.append((event_start.isoformat(), event_end.isoformat()))
+    return events
+
+class FakeCalendarService:
+    """freebusy().query, events().insert/list and batch requests over seeded calendars"""
+
+    def __init__(self, busy=None, latency=0.0, page_size=250):
+        self.latency = latency
+        self.page_size = page_size
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._events = {}
+        self._event_ids = set()
+        self._next_id = 0
+        for calendar_id, intervals in (busy or {}).items():
+            for start, end in intervals:
+                self._add(calendar_id, {
+                    "summary": "Busy",
+                    "start": {"dateTime": start},
+                    "end": {"dateTime": end},
+                })
+
+    @classmethod
+    def seeded(cls, n_events, start, days=365, calendars=("primary",), seed=42, latency=0.0):
+        """Service whose calendars each hold n_events random events"""
+        busy = {
+            calendar_id: seed_calendar(n_events, start, days=days, seed=seed + i)
+            for i, calendar_id in enumerate(calendars)
+        }
+        return cls(busy, latency=latency)
+
+    def _add(self, calendar_id, body):
+        """Store an event (caller holds the lock or is the constructor)"""
+        self._next_id += 1
+        event_id = body.get("id") or f"fake{self._next_id:08d}"
+        if event_id in self._event_ids:
+            raise http_error(409, "The requested identifier already exists.")
+        self._event_ids.add(event_id)
+        event = {**body, "id": event_id, "status": "confirmed"}
+        entry = (_parse_time(body["start"]["dateTime"]), _parse_time(body["end"]["dateTime"]), event_id, event)
+        insort(self._events.setdefault(calendar_id, []), entry, key=lambda item: (item[0], item[2]))
+        return event
+
+    def _overlapping(self, calendar_id, time_min, time_max):
+        events = self._events.get(calendar_id, [])
+        # Events are sorted by start; anything starting at or after time_max cannot overlap
+        stop = bisect_left(events, time_max, key=lambda item: item[0])
+        return [item for item in events[:stop] if item[1] > time_min]
+
+    def _request(self, func):
+        self.calls += 1
+        return _Request(func, self.latency)
+
+    def freebusy(self):
+        return SimpleNamespace(query=self._query)
+
+    def events(self):
+        return SimpleNamespace(insert=self._insert, list=self._list)
+
+    def new_batch_http_request(self, callback=None):
+        self.calls += 1
+        return _Batch(callback, self.latency)
+
+    def _query(self, body):
+        def run():
+            time_min = _parse_time(body["timeMin"])
+            time_max = _parse_time(body["timeMax"])
+            calendars = {}
+            with self._lock:
+                for item in body.get("items", []):
+                    # Like the API, busy periods are merged and clipped to the window
+                    busy = []
+                    for start, end, _, _ in self._overlapping(item["id"], time_min, time_max):
+                        start, end = max(start, time_min), min(end, time_max)
+                        if busy and start <= busy[-1][1]:
+                            busy[-1][1] = max(busy[-1][1], end)
+                        else:
+                            busy.append([start, end])
+                    calendars[item["id"]] = {
+                        "busy": [{"start": start.isoformat(), "end": end.isoformat()} for start, end in busy]
+                    }
+            return {"timeMin": body["timeMin"], "timeMax": body["timeMax"], "calendars": calendars}
+        return self._request(run)
+
+    def _insert(self, calendarId="primary", body=None, **kwargs):
+        def run():
+            with self._lock:
+                return self._add(calendarId, body)
+        return self._request(run)
+
+    def _list(self, calendarId="primary", timeMin=None, timeMax=None, pageToken=None, maxResults=None, **kwargs):
+        def run():
+            time_min = _parse_time(timeMin) if timeMin else datetime.min.replace(tzinfo=timezone.utc)
+            time_max = _parse_time(timeMax) if timeMax else datetime.max.replace(tzinfo=timezone.utc)
+            with self._lock:
+                items = [event for _, _, _, event in self._overlapping(calendarId, time_min, time_max)]
+            offset = int(pageToken or 0)
+            limit = min(maxResults or self.page_size, self.page_size)
+            page = {"kind": "calendar#events", "items": items[offset:offset + limit]}
+            if offset + limit < len(items):
+                page["nextPageToken"] = str(offset + limit)
+            return page
+        return self._request(run)
+
+    def event_count(self, calendar_id="primary"):
+        return len(self._events.get(calendar_id, []))
+
+# ==================== SMTP ====================
+
+class FakeSMTP:
+    """Drop-in for smtplib.SMTP that records messages in FakeSMTP.sent"""
+
+    sent = []
+    connect_latency = 0.0
+    send_latency = 0.0
+
+    def __init__(self, host="", port=0, *args, **kwargs):
+        self.host = host
+        self.port = port
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+
+    def starttls(self, *args, **kwargs):
+        return (220, b"ready")
+
+    def login(self, user, password):
+        return (235, b"ok")
+
+    def noop(self):
+        return (250, b"ok")
+
+    def send_message(self, msg, *args, **kwargs):
+        if self.send_latency:
+            time.sleep(self.send_latency)
+        FakeSMTP.sent.append({"to": msg["To"], "subject": msg["Subject"]})
+        return {}
+
+    def quit(self):
+        return (221, b"bye")
+
+    close = quit
+
+# ==================== Groq ====================
+
+ADVICE_OUTPUT = """TASKS:
+- Review the latest project status report
+- Prepare the budget figures
+- List open questions for the sender
+- Check dependencies with the delivery team
+- Draft an agenda
+
+ADVICE:
+- Open with the decision taken last time
+- Keep the discussion focused on the requested topic
+- Confirm owners and dates before closing
+- Flag risks early
+- Send a written summary after the meeting"""
+
+class FakeGroqClient:
+    """client.chat.completions.create() answering parse and advice prompts"""
+
+    def __init__(self, emails, latency=0.0):
+        self.latency = latency
+        self._expected_by_body = {email["body"]: email["expected"] for email in emails}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.calls = 0
+
+    def _create(self, model, messages, temperature=0.1, max_tokens=500, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+
+        prompt = "\n".join(message["content"] for message in messages)
+        if "TASKS:" in prompt:
+            content = ADVICE_OUTPUT
+        else:
+            expected = next(
+                (parsed for body, parsed in self._expected_by_body.items() if body in prompt),
+                {},
+            )
+            content = f"```json\n{json.dumps(expected)}\n```"
+
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=len(prompt) // 4,
+                completion_tokens=len(content) // 4,
+                total_tokens=(len(prompt) + len(content)) // 4,
+            ),
+        )
+
+# ==================== Postgres ====================
+
+SCHEMA = [
+    """
+    CREATE TABLE emails (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender_email TEXT, sender_name TEXT, subject TEXT, body TEXT, received_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE meetings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email_id INTEGER, sender_role TEXT, project_title TEXT, meeting_topic TEXT,
+        relation_type TEXT, meeting_date TEXT, meeting_time TEXT, duration TEXT,
+        urgent BOOLEAN, tasks_requested TEXT, documents_to_prepare TEXT,
+        confirmation_status TEXT, stored_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE personnes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT, email TEXT, role TEXT, service TEXT, company TEXT, relation_type TEXT,
+        project_title TEXT, project_description TEXT, latest_decision TEXT
+    )
+    """,
+    """
+    CREATE TABLE recommendations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email_id INTEGER, project_title TEXT, type TEXT, content TEXT,
+        completed BOOLEAN DEFAULT 0, created_at TIMESTAMP
+    )
+    """,
+]
+
+def create_fake_database(people):
+    """In-memory SQLite engine with the pipeline tables and seeded personnes"""
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        if people:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO personnes (name, email, role, service, company, relation_type,
+                                           project_title, project_description, latest_decision)
+                    VALUES (:name, :email, :role, :service, :company, :relation_type,
+                            :project_title, :project_description, :latest_decision)
+                    """
+                ),
+                people,
+            )
+    return engine
@@ -0,0 +1,89 @@
+"""
+Latency and recall of the advisor history index at hundreds of thousands of rows.
+
+Fills a temporary index with synthetic meeting and recommendation texts, then
+times search() for random meeting requests and compares each IVF result with an
+exhaustive scan of the same matrix. Recall counts returned rows scoring at least
+as high as the exhaustive k-th best, so ties between identical texts do not
+count as misses.
+
+    python -m benchmarks.history_benchmark --rows 300000 --queries 500
+"""
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.corpus import COMPANIES, PROJECTS, TOPICS
+from benchmarks.e2e_benchmark import summarize
+from utils.history_index import HashingEmbedder, HistoryIndex
+
+ADVICE_VERBS = ["Prepare", "Review", "Confirm", "Escalate", "Summarise", "Challenge", "Document", "Validate"]
+ADVICE_OBJECTS = [
+    "the budget assumptions", "delivery milestones", "open risks", "the vendor shortlist",
+    "pricing tiers", "integration dependencies", "staffing plan", "acceptance criteria",
+    "contract clauses", "pilot metrics", "security findings", "migration rollback plan",
+]
+
+def synthetic_rows(n_rows, rng):
+    rows = []
+    for i in range(n_rows):
+        project = f"{rng.choice(PROJECTS)} {rng.choice(COMPANIES)}"
+        if rng.random() < 0.2:
+            rows.append({"source": "meeting", "id": i, "email_id": i, "project_title": project,
+                         "text": f"Meeting on {project}: {rng.choice(TOPICS)}"})
+        else:
+            kind = rng.choice(["Task", "Advice"])
+            action = f"{rng.choice(ADVICE_VERBS)} {rng.choice(ADVICE_OBJECTS)} before the {rng.choice(TOPICS)}"
+            rows.append({"source": "recommendation", "id": i, "email_id": i // 10, "project_title": project,
+                         "text": f"{kind} for {project}: {action}"})
+    return rows
+
+def run_benchmark(n_rows=300000, n_queries=500, k=6, seed=42, directory=None):
+    rng = random.Random(seed)
+    rows = synthetic_rows(n_rows, rng)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        index = HistoryIndex(directory or scratch, embedder=HashingEmbedder())
+        started = time.perf_counter()
+        for chunk in range(0, n_rows, 10000):
+            index.add(rows[chunk:chunk + 10000])
+        build_s = time.perf_counter() - started
+
+        latencies, recall = [], []
+        for _ in range(n_queries):
+            project = f"{rng.choice(PROJECTS)} {rng.choice(COMPANIES)}"
+            query = f"{project} {rng.choice(TOPICS)} {rng.choice(ADVICE_OBJECTS)}"
+            started = time.perf_counter()
+            found = index.search(query, k=k, project_title=project)
+            latencies.append((time.perf_counter() - started) * 1000)
+            exact = index.search(query, k=k, project_title=project, probes=None)
+            threshold = exact[-1]["score"]
+            recall.append(sum(match["score"] >= threshold for match in found) / len(exact))
+
+    return {
+        "rows": n_rows,
+        "queries": n_queries,
+        "build_s": round(build_s, 3),
+        "latency": summarize(latencies),
+        "recall_at_k": round(sum(recall) / len(recall), 4),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Advisor history index benchmark")
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.rows, args.queries, args.k, args.seed)
+    stats = report["latency"]
+    print(f"\n📊 {report['rows']} rows indexed in {report['build_s']} s")
+    print(f"search: p50 {stats['p50_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms")
+    print(f"recall@{args.k} vs exhaustive scan: {report['recall_at_k']:.1%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
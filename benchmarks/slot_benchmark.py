@@ -0,0 +1,170 @@
+"""
+Offline benchmark and correctness check for the calendar slot tools.
+
+Seeds the fake Google Calendar with thousands of events per calendar, then runs
+find_alternative_slots and check_calendar_availability over random requests.
+Every returned slot is verified against the seeded events by brute force, and
+latency percentiles, API calls and free/busy cache hits are reported.
+
+    python -m benchmarks.slot_benchmark --events 3000 --days 365 --queries 200
+    python -m benchmarks.slot_benchmark --attendees 3 --cold
+"""
+import io
+import sys
+import json
+import time
+import random
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from benchmarks.e2e_benchmark import summarize
+from benchmarks.fakes import DEFAULT_LATENCIES, FakeCalendarService
+from utils import tracing
+
+def _next_monday(tz):
+    today = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=7 - today.weekday())
+
+def slot_violations(calendar, calendar_ids, slot, buffer_minutes, tz):
+    """Reasons a returned slot is wrong, checked directly against the stored events"""
+    start = datetime.fromisoformat(slot["start"])
+    end = datetime.fromisoformat(slot["end"])
+    local_start, local_end = start.astimezone(tz), end.astimezone(tz)
+    problems = []
+    if local_start.weekday() >= 5:
+        problems.append("weekend")
+    if local_start.hour < 9 or (local_end.hour, local_end.minute) > (17, 0) or local_end.date() != local_start.date():
+        problems.append("outside working hours")
+    padded_start = start - timedelta(minutes=buffer_minutes)
+    padded_end = end + timedelta(minutes=buffer_minutes)
+    for calendar_id in calendar_ids:
+        if calendar._overlapping(calendar_id, padded_start, padded_end):
+            problems.append(f"overlaps {calendar_id}")
+    return problems
+
+def run_benchmark(n_events=3000, days=365, n_queries=200, n_attendees=0, seed=42,
+                  latency_scale=0.0, buffer_minutes=0, cold=False):
+    """Run random slot searches and availability checks; returns the report dict"""
+    import agents.calendar_agent as calendar_agent
+    from utils.freebusy_cache import FREEBUSY_INDEX
+
+    tz = ZoneInfo("Africa/Tunis")
+    first_day = _next_monday(tz)
+    attendees = [f"attendee{i}@example.com" for i in range(n_attendees)]
+    calendar_ids = ["primary"] + attendees
+    calendar = FakeCalendarService.seeded(
+        n_events, first_day, days=days, calendars=calendar_ids, seed=seed,
+        latency=DEFAULT_LATENCIES["calendar"] * latency_scale,
+    )
+    rng = random.Random(seed)
+    tracing.reset()
+    FREEBUSY_INDEX.invalidate()
+
+    find_tool = calendar_agent.FindAlternativeSlotsTool(token_file="fake-token.json")
+    check_tool = calendar_agent.CalendarAvailabilityTool(token_file="fake-token.json")
+    find_ms, check_ms = [], []
+    slots_returned, violations, errors = 0, [], 0
+
+    with mock.patch.object(calendar_agent, "get_calendar_service", lambda token_file: calendar), \
+            redirect_stdout(io.StringIO()):
+        for _ in range(n_queries):
+            if cold:
+                FREEBUSY_INDEX.invalidate()
+            request_day = first_day + timedelta(days=rng.randrange(max(days - 7, 1)))
+            requested = request_day.replace(hour=rng.randrange(9, 17), minute=rng.choice([0, 15, 30, 45]))
+            duration = rng.choice([0.25, 0.5, 1.0, 1.5, 2.0])
+            attendee_list = ",".join(attendees)
+
+            started = time.perf_counter()
+            found = json.loads(find_tool._run(
+                start_date=requested.replace(tzinfo=None).isoformat(), duration_hours=duration,
+                days_ahead=7, timezone="Africa/Tunis", buffer_minutes=buffer_minutes,
+                attendees=attendee_list,
+            ))
+            find_ms.append((time.perf_counter() - started) * 1000)
+            errors += "error" in found
+
+            for slot in found.get("alternatives", []):
+                slots_returned += 1
+                problems = slot_violations(calendar, calendar_ids, slot, buffer_minutes, tz)
+                if problems:
+                    violations.append({"slot": slot, "problems": problems})
+
+            end = requested + timedelta(hours=duration)
+            started = time.perf_counter()
+            checked = json.loads(check_tool._run(
+                requested.replace(tzinfo=None).isoformat(), end.replace(tzinfo=None).isoformat(),
+                timezone="Africa/Tunis", attendees=attendee_list,
+            ))
+            check_ms.append((time.perf_counter() - started) * 1000)
+            errors += "error" in checked
+            expected = not any(calendar._overlapping(c, requested, end) for c in calendar_ids)
+            if checked.get("available") != expected:
+                violations.append({"check": [requested.isoformat(), end.isoformat()], "problems": ["wrong availability"]})
+
+    cache = {
+        labels[0][1]: value for (name, labels), value in tracing.counters().items()
+        if name == "freebusy_cache_requests_total"
+    }
+    return {
+        "config": {
+            "events_per_calendar": n_events, "days": days, "queries": n_queries,
+            "calendars": len(calendar_ids), "buffer_minutes": buffer_minutes,
+            "latency_scale": latency_scale, "cold": cold,
+        },
+        "find_alternative_slots": summarize(find_ms),
+        "check_calendar_availability": summarize(check_ms),
+        "api_calls": calendar.calls,
+        "cache": cache,
+        "slots_returned": slots_returned,
+        "errors": errors,
+        "violations": violations[:20],
+        "violation_count": len(violations),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Slot search benchmark against a seeded fake calendar")
+    parser.add_argument("--events", type=int, default=3000, help="Events per calendar")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--attendees", type=int, default=0, help="Attendee calendars besides primary")
+    parser.add_argument("--buffer-minutes", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="Multiplier for the fake calendar's default latency (0 disables sleeps)")
+    parser.add_argument("--cold", action="store_true", help="Clear the free/busy cache before every query")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        n_events=args.events, days=args.days, n_queries=args.queries, n_attendees=args.attendees,
+        seed=args.seed, latency_scale=args.latency_scale, buffer_minutes=args.buffer_minutes, cold=args.cold,
+    )
+
+    config = report["config"]
+    print(f"\n📊 {config['queries']} queries, {config['calendars']} calendar(s) x {config['events_per_calendar']} events "
+          f"over {config['days']} days ({'cold' if config['cold'] else 'warm'} cache)")
+    print(f"{'tool':32} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name in ("find_alternative_slots", "check_calendar_availability"):
+        stats = report[name]
+        print(f"{name:32} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
+    print(f"API calls: {report['api_calls']}  cache: {report['cache']}  slots: {report['slots_returned']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to {args.output}")
+
+    if report["errors"] or report["violation_count"]:
+        print(f"❌ {report['errors']} error(s), {report['violation_count']} incorrect result(s)")
+        for violation in report["violations"]:
+            print(f"   {violation}")
+        return 1
+    print("✅ All returned slots verified")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
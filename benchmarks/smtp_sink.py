@@ -0,0 +1,138 @@
+"""
+Local SMTP sink for exercising the outbox sender with the real smtplib client.
+
+Accepts EHLO, AUTH (any credentials), MAIL, RCPT, DATA, RSET, NOOP and QUIT on
+localhost and keeps every received message in memory. STARTTLS is not offered,
+so point the sender at it with "smtp_starttls": False.
+
+    python -m benchmarks.smtp_sink --port 1025
+"""
+import sys
+import time
+import argparse
+import threading
+import socketserver
+from email import message_from_bytes
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        if sink.latency:
+            time.sleep(sink.latency)
+        self._reply("220 smtp-sink ready")
+        sender, recipients = None, []
+
+        for raw in self.rfile:
+            command = raw.decode(errors="replace").rstrip("\r\n")
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                self._reply("250-smtp-sink")
+                self._reply("250-AUTH PLAIN LOGIN")
+                self._reply("250 8BITMIME")
+            elif verb == "HELO":
+                self._reply("250 smtp-sink")
+            elif verb == "AUTH":
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip().strip("<>"))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                sink.received(sender, recipients, b"".join(lines))
+                self._reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class SMTPSink:
+    """Threaded SMTP server on localhost; use as a context manager"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+
+    def received(self, sender, recipients, data):
+        message = message_from_bytes(data)
+        with self._lock:
+            self.messages.append({
+                "from": sender,
+                "to": recipients,
+                "subject": message["Subject"],
+                "message": message,
+            })
+
+    def email_config(self, **overrides):
+        """EMAIL_CONFIG-style dict pointing at this sink"""
+        return {
+            "smtp_server": self.host,
+            "smtp_port": self.port,
+            "smtp_starttls": False,
+            "sender_email": "assistant@example.com",
+            "sender_password": "sink",
+            "sender_name": "Calendar Assistant",
+            **overrides,
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args(argv)
+
+    with SMTPSink(args.host, args.port) as sink:
+        print(f"📭 SMTP sink listening on {sink.host}:{sink.port} (Ctrl+C to stop)")
+        seen = 0
+        try:
+            while True:
+                time.sleep(0.5)
+                for message in sink.messages[seen:]:
+                    print(f"📨 {message['from']} -> {', '.join(message['to'])}: {message['subject']}")
+                seen = len(sink.messages)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
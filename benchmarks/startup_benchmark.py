@@ -0,0 +1,119 @@
+"""
+Cold-start benchmark for the cron entry point and shared modules.
+
+Each module is imported in a fresh interpreter with ``python -X importtime``;
+the cumulative import time (minus interpreter startup) is compared with a budget.
+
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --module orchestrator.main_orchestrator --budget-ms 300
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import budgets in milliseconds. crewai, groq and the Google clients must stay
+# out of these paths; they are imported lazily when a stage actually needs them.
+STARTUP_BUDGETS_MS = {
+    "orchestrator.main_orchestrator": 400,
+    "utils.gmail_setup": 50,
+    "utils.database": 300,
+    "utils.pipeline_state": 300,
+    "utils.llm": 50,
+}
+
+def _importtime(code):
+    """Run code in a fresh interpreter and return the parsed -X importtime entries"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+        raise RuntimeError(last_line)
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented by two spaces per level after the separator
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append({
+            "name": name.strip(),
+            "depth": depth,
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+        })
+    return entries
+
+def measure_import(module, runs=3):
+    """Best-of-N import cost of a module, excluding modules loaded by interpreter startup"""
+    startup = {entry["name"] for entry in _importtime("pass")}
+    best = None
+
+    for _ in range(runs):
+        entries = _importtime(f"import {module}")
+        total_us = sum(
+            entry["cumulative_us"]
+            for entry in entries
+            if entry["depth"] == 0 and entry["name"] not in startup
+        )
+        if best is None or total_us < best["total_us"]:
+            heaviest = sorted(
+                (entry for entry in entries if entry["name"] not in startup),
+                key=lambda entry: entry["self_us"],
+                reverse=True,
+            )
+            best = {"total_us": total_us, "heaviest": heaviest}
+
+    return best
+
+def run_benchmark(budgets, runs=3, top=5):
+    """Measure every module against its budget; returns True when all fit"""
+    all_ok = True
+
+    for module, budget_ms in budgets.items():
+        try:
+            result = measure_import(module, runs=runs)
+        except RuntimeError as e:
+            print(f"❌ {module}: import failed ({e})")
+            all_ok = False
+            continue
+
+        total_ms = result["total_us"] / 1000
+        within = total_ms <= budget_ms
+        all_ok = all_ok and within
+        status = "✅" if within else "❌"
+        print(f"{status} {module}: {total_ms:.1f} ms (budget {budget_ms} ms)")
+
+        for entry in result["heaviest"][:top]:
+            print(f"    {entry['self_us'] / 1000:8.1f} ms  {entry['name']}")
+
+    return all_ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time startup benchmark")
+    parser.add_argument("--module", action="append", help="Module to measure (repeatable)")
+    parser.add_argument("--budget-ms", type=float, help="Budget applied to every --module")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per module (best is kept)")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest imports to list per module")
+    args = parser.parse_args(argv)
+
+    if args.module:
+        budgets = {
+            module: args.budget_ms if args.budget_ms is not None else STARTUP_BUDGETS_MS.get(module, 100)
+            for module in args.module
+        }
+    else:
+        budgets = STARTUP_BUDGETS_MS
+
+    ok = run_benchmark(budgets, runs=args.runs, top=args.top)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
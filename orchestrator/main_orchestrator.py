@@ -1,315 +1,549 @@
-
-import os
-import signal
-import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
-from typing import Dict
-from pydantic import BaseModel, Field
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Windows compatibility
-if os.name == "nt":
-    unix_signals = ["SIGHUP", "SIGTSTP", "SIGQUIT", "SIGCONT"]
-    for sig_name in unix_signals:
-        if not hasattr(signal, sig_name):
-            setattr(signal, sig_name, signal.SIGTERM)
-
-os.environ["CREWAI_DISABLE_TRACING"] = "true"
-import os
-import signal
-from datetime import datetime
-from dotenv import load_dotenv
-from crewai import Task, Crew, Process, LLM
-
-from agents.email_parser_agent import create_email_parser_agent
-from agents.advisor_agent import create_advisor_agent  # NEW IMPORT
-from agents.calendar_agent import create_calendar_agent
-from utils.gmail_setup import setup_gmail, fetch_one_email
-from utils.database import setup_database, store_email
-
-# Email configuration
-EMAIL_CONFIG = {
-    "smtp_server": "smtp.gmail.com",
-    "smtp_port": 587,
-    "sender_email": os.getenv("SENDER_EMAIL"),
-    "sender_password": os.getenv("EMAIL_APP_PASSWORD"),
-    "sender_name": "Calendar Assistant"
-}
-
-def get_llm():
-    """Get LLM with rate limit handling"""
-    os.environ["GROQ_API_KEY"] = "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"
-    llm = LLM(
-        model="groq/llama-3.1-8b-instant",
-        temperature=0.1,
-        max_tokens=500,
-    )
-    return llm
-
-def process_incoming_email():
-    """Fetch and store one email from Gmail"""
-    gmail_service = setup_gmail()
-    engine = setup_database()
-
-    email = fetch_one_email(gmail_service)
-    if email is None:
-        return None
-
-    email_id = store_email(engine, email)
-    return {
-        "email_id": email_id,
-        "body": email["body"],
-        "sender_email": email["sender_email"]
-    }
-
-def run_orchestration():
-    """Main orchestration: Email Parser -> Advisor -> Calendar Agent"""
-    
-    print("\n" + "="*70)
-    print("STARTING EMAIL-TO-CALENDAR ORCHESTRATION WITH ADVISOR")
-    print("="*70 + "\n")
-    
-    # Step 1: Fetch incoming email
-    print("📧 Step 1: Fetching incoming email...")
-    email_data = process_incoming_email()
-    
-    if not email_data:
-        print("⏳ No email to process")
-        return None
-    
-    print(f"✅ Email received (ID: {email_data['email_id']})")
-    print(f"📌 From: {email_data['sender_email']}")
-    print(f"📄 Body preview: {email_data['body'][:200]}...\n")
-    
-    # Initialize LLM
-    def get_llm():
-        return LLM(
-            model="ollama/qwen2.5:14b",  
-            temperature=0.1,
-            max_tokens=4000,
-            provider="ollama"
-        )
-
-    llm = get_llm()
-    print("✅ LLM initialized\n")
-    
-    # Create agents
-    email_parser_agent = create_email_parser_agent(llm)
-    advisor_agent = create_advisor_agent(llm)  
-    
-    calendar_agent = create_calendar_agent(
-        token_file="token.json",
-        email_config=EMAIL_CONFIG,
-        llm=llm,
-        email_only=False
-    )
-    
-    email_sender_agent = create_calendar_agent(
-        token_file="token.json",
-        email_config=EMAIL_CONFIG,
-        llm=llm,
-        email_only=True
-    )
-    
-    print("✅ Agents created\n")
-    
-    # TASK 1: Parse email and store structured data
-    task1 = Task(
-        description=f"""
-Parse and store email ID {email_data['email_id']}.
-
-Steps you MUST follow:
-1. Call parse_email_tool with the email content: {email_data['body']}
-2. You will receive a JSON object with fields like:
-   - sender_role
-   - project_title
-   - meeting_topic
-   - meeting_date
-   - meeting_time
-   - duration
-   - etc.
-3. Call store_parsed_email with:
-   - email_id = {email_data['email_id']}
-   - parsed_data = EXACT JSON from step 1
-4. Return the parsed JSON EXACTLY as received from parse_email_tool.
-
-IMPORTANT: Return the complete parsed JSON object, not just a confirmation message.
-""",
-        agent=email_parser_agent,
-        expected_output="Complete parsed JSON with meeting details"
-    )
-    
-    # TASK 2: Generate advice and tasks 
-    task2 = Task(
-        description=f"""
-Generate personalized advice and tasks for the upcoming meeting.
-
-Sender email: {email_data['sender_email']}
-
-Steps you MUST follow:
-1. Call fetch_person_context with sender_email: "{email_data['sender_email']}"
-   This will return person information including name, role, project details, etc.
-
-2. Look at the parsed email data from the previous task (task1)
-
-3. Call generate_advice with:
-   - parsed_email: the complete JSON from task1
-   - person_context: the data from step 1
-   
-   This will return a dict with 'tasks' (list of 5 items) and 'advice' (list of 5 items)
-
-4. Extract project_title from the parsed email JSON (from task1)
-
-5. Call store_advice with:
-   - email_id: {email_data['email_id']}
-   - project_title: [extracted from task1]
-   - tasks: [the tasks list from step 3]
-   - advice: [the advice list from step 3]
-
-6. Return: "ADVICE GENERATED AND STORED"
-
-IMPORTANT: Follow all steps in order. Use the exact tools mentioned.
-""",
-        agent=advisor_agent,
-        expected_output="'ADVICE GENERATED AND STORED'",
-        context=[task1]
-    )
-    
-    # TASK 3: Check availability (RENUMBERED, NO OTHER CHANGES)
-    task3 = Task(
-        description=f"""
-Look at the parsed meeting data from task 1.
-
-Extract these fields from the parsed data:
-- meeting_date (format: YYYY-MM-DD)
-- meeting_time (format: HH:MM)
-- duration (in hours, default to 1.0 if not specified)
-
-Construct start_time and end_time:
-- start_time = meeting_date + "T" + meeting_time + ":00"
-- end_time = start_time + duration hours
-
-Example: If meeting_date="2025-12-20", meeting_time="10:00", duration=1
-Then: start_time="2025-12-20T10:00:00", end_time="2025-12-20T11:00:00"
-
-Use check_calendar_availability with:
-- start_time: [calculated start_time]
-- end_time: [calculated end_time]
-- timezone: Africa/Tunis
-
-Return ONLY: "AVAILABLE" or "NOT AVAILABLE" based on the result.
-""",
-        agent=calendar_agent,
-        expected_output="Either 'AVAILABLE' or 'NOT AVAILABLE'",
-        context=[task1]
-    )
-    
-    # TASK 4: Create event OR find alternatives (RENUMBERED, NO OTHER CHANGES)
-    task4 = Task(
-        description=f"""
-Look at the previous task result and the parsed meeting data from task 1.
-
-If availability check says "AVAILABLE":
-  Extract from parsed data:
-  - project_title (use as summary)
-  - meeting_topic (use as description)
-  - meeting_date and meeting_time (to construct start_time)
-  - duration (to calculate end_time)
-  - sender_email: {email_data['sender_email']} (use as attendees)
-  
-  Use create_calendar_event with these values:
-  * summary: [project_title]
-  * start_time: [meeting_date + "T" + meeting_time + ":00"]
-  * end_time: [start_time + duration hours]
-  * description: [meeting_topic]
-  * attendees: {email_data['sender_email']}
-  * timezone: Africa/Tunis
-  
-  After creating, return: "EVENT CREATED"
-
-If availability check says "NOT AVAILABLE":
-  Use find_alternative_slots with:
-  * start_date: [meeting_date + "T" + meeting_time + ":00"]
-  * duration_hours: [parsed duration or 1.0]
-  * days_ahead: 7
-  * timezone: Africa/Tunis
-  
-  Return: "ALTERNATIVES FOUND: " followed by the list of alternatives
-""",
-        agent=calendar_agent,
-        expected_output="'EVENT CREATED' or 'ALTERNATIVES FOUND: [list]'",
-        context=[task1, task3]
-    )
-    
-    # TASK 5: Send email notification (RENUMBERED, NO OTHER CHANGES)
-   # TASK 5: Send email notification (FIXED VERSION)
-    task5 = Task(
-        description=f"""
-    The previous task said "EVENT CREATED" which means the meeting was successfully scheduled.
-
-    You MUST now send a confirmation email.
-
-    Use send_email tool with these EXACT parameters:
-    - recipient: {email_data['sender_email']}
-    - subject: ✅ Meeting Confirmed: Role-Based Weighting Discussion
-    - body: Hello,
-
-    Your meeting has been successfully scheduled for Monday, December 23, 2025 at 01:00 PM - 02:00 PM (Africa/Tunis timezone).
-
-    Topic: Introducing role-based weighting to improve decision quality
-
-    Please let me know if you need any changes.
-
-    Kind regards,
-    Ichaoui Chaima
-    - meeting_details: Meeting: Role-Based Weighting Discussion
-    Time: Monday, December 23, 2025 at 01:00 PM - 02:00 PM
-    Description: Introducing role-based weighting to improve decision quality
-
-    After calling send_email, return EXACTLY: "EMAIL SENT"
-
-    DO NOT extract data. DO NOT analyze. JUST CALL send_email with the parameters above.
-    """,
-        agent=email_sender_agent,
-        expected_output="'EMAIL SENT'",
-        context=[task1, task3, task4]
-    ) 
-    # Create unified crew with ALL agents
-    crew = Crew(
-        agents=[email_parser_agent, advisor_agent, calendar_agent, email_sender_agent],
-        tasks=[task1, task2, task3, task4, task5],  # NOW 5 TASKS
-        process=Process.sequential,
-        verbose=True
-    )
-    
-    print("🚀 Starting orchestration...\n")
-    result = crew.kickoff()
-    
-    print("\n" + "="*70)
-    print("✅ ORCHESTRATION COMPLETED")
-    print("="*70)
-    print(f"\n{result}\n")
-    print("📬 Check:")
-    print("  - Email inbox for confirmation")
-    print("  - Google Calendar for event")
-    print("  - Database 'recommendations' table for advice and tasks")
-    print("="*70 + "\n")
-    
-    return result
-
-if __name__ == "__main__":
-    if not EMAIL_CONFIG["sender_email"] or not EMAIL_CONFIG["sender_password"]:
-        print("\n❌ ERROR: Missing email credentials in .env file!")
-        print("Please set SENDER_EMAIL and EMAIL_APP_PASSWORD")
-        exit(1)
-    
-    print(f"\n✅ Email configured: {EMAIL_CONFIG['sender_email']}")
-    
-
-    result = run_orchestration()
+import os
+import sys
+import time
+
+import utils.bootstrap  # noqa: F401
+from utils.gmail_setup import setup_gmail, fetch_one_email, fetch_relevant_emails
+from utils.email_priority import build_queue
+from utils.database import setup_database, store_email, load_email, ensure_gmail_id_column, stored_gmail_ids
+from utils.outbox import ensure_outbox_table, drain_outbox, start_outbox_sender
+from utils.notifications import parse_event_output, queue_meeting_notification
+from utils.lazy_advice import ADVICE_STORED, lazy_advice_enabled, mark_advice_pending, generate_due_advice
+from utils.ollama_keeper import start_ollama_keeper
+from utils.usage_ledger import LEDGER, agent_usage_baseline, usage_scope
+from utils.llm_router import ROUTER
+from utils.tracing import span, record_span, write_traces, write_metrics, start_metrics_server
+from utils.pipeline_state import (
+    PIPELINE_STAGES,
+    ensure_pipeline_state_table,
+    save_stage,
+    clear_stage,
+    record_failure,
+    load_pipeline_state,
+    first_incomplete_stage,
+    find_incomplete_runs,
+)
+
+# Email configuration
+EMAIL_CONFIG = {
+    "smtp_server": "smtp.gmail.com",
+    "smtp_port": 587,
+    "sender_email": os.getenv("SENDER_EMAIL"),
+    "sender_password": os.getenv("EMAIL_APP_PASSWORD"),
+    "sender_name": "Calendar Assistant"
+}
+
+# Labels used when injecting stored stage outputs into resumed tasks
+STAGE_LABELS = {
+    "parsed": "Task 1 result (parsed meeting data)",
+    "advice": "Task 2 result (advice)",
+    "availability": "Task 3 result (availability check)",
+    "event": "Task 4 result (event creation)",
+}
+
+# Stages run by the crew; the notification (email_sent) is rendered and queued directly
+CREW_STAGES = [stage for stage in PIPELINE_STAGES if stage != "email_sent"]
+
+def get_llm():
+    """Get LLM with rate limit handling"""
+    from crewai import LLM
+
+    os.environ["GROQ_API_KEY"] = "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"
+    llm = LLM(
+        model="groq/llama-3.1-8b-instant",
+        temperature=0.1,
+        max_tokens=500,
+    )
+    return llm
+
+def get_agent_llm(stage="advice"):
+    """Get the local LLM that drives an agent's reasoning, per the stage's routing policy"""
+    from crewai import LLM
+    from utils.llm_router import agent_model
+
+    return LLM(
+        model=agent_model(stage),
+        temperature=0.1,
+        max_tokens=4000,
+        provider="ollama"
+    )
+
+def process_incoming_email():
+    """Fetch and store one email from Gmail"""
+    gmail_service = setup_gmail()
+    engine = setup_database()
+    ensure_gmail_id_column(engine)
+
+    email = fetch_one_email(gmail_service, skip_ids=lambda ids: stored_gmail_ids(engine, ids))
+    if email is None:
+        return None
+
+    email_id = store_email(engine, email)
+    if email_id is None:
+        return None
+    return {
+        "email_id": email_id,
+        "body": email["body"],
+        "sender_email": email["sender_email"],
+        "sender_name": email["sender_name"]
+    }
+
+def checkpoint(engine, email_id, stage, clock, agent_llm=None, agent_usage=None, marker=None):
+    """Build a task callback that persists the task output as a stage checkpoint
+
+    clock["last_ns"] holds the end of the previous stage, so each callback can also
+    record a "stage.<name>" span covering the whole task. With agent_llm, the tokens
+    the agent used for the task go to the usage ledger (agent_usage holds the
+    counters already recorded, shared by the tasks of one run). With marker, that
+    fixed value is saved instead of the task output: the advice checkpoint is a
+    status (see utils.lazy_advice), and the tasks and advice themselves live in
+    the recommendations rows that store_advice wrote, which is what a resumed run
+    and the dashboard read.
+    """
+    def callback(output):
+        record_span(f"stage.{stage}", clock["last_ns"], email_id=email_id)
+        if agent_llm is not None:
+            with usage_scope(email_id=email_id):
+                LEDGER.record_agent_step(agent_llm, stage, agent_usage)
+        clock["last_ns"] = time.time_ns()
+        save_stage(engine, email_id, stage, marker if marker is not None else getattr(output, "raw", output))
+    return callback
+
+def notify(engine, email_id, event_output, clock):
+    """email_sent stage: render the notification from stored meeting data and queue it"""
+    message_id = queue_meeting_notification(engine, email_id, event_output)
+    record_span("stage.email_sent", clock["last_ns"], email_id=email_id)
+    clock["last_ns"] = time.time_ns()
+    save_stage(engine, email_id, "email_sent", f"EMAIL QUEUED: {message_id}")
+    return message_id
+
+def notify_after_batch(engine, email_id, event_output, clock, inserted):
+    """email_sent stage of a backlog run, once its batched event insert is known; False on failure
+
+    inserted is EVENT_BATCH.flush()'s {email_id: result}: a confirmed event is only
+    announced when the batch actually created it for this email.
+    """
+    try:
+        kind, _ = parse_event_output(event_output)
+        result = inserted.get(email_id) if kind == "confirmed" else None
+        if kind == "confirmed" and (result is None or result["status"] == "failed"):
+            # The event was never created: a resume has to run the event stage again
+            clear_stage(engine, email_id, "event")
+            error = result.get("error") if result else "no event was queued for this email"
+            raise RuntimeError(f"Calendar event insert failed: {error}")
+        notify(engine, email_id, event_output, clock)
+    except Exception as e:
+        record_failure(engine, email_id, e)
+        print(f"❌ Email {email_id} not notified: {str(e)}")
+        print(f"🔁 Resume later with: python -m orchestrator.main_orchestrator --resume {email_id}")
+        return False
+    return True
+
+def run_orchestration():
+    """Main orchestration: Email Parser -> Advisor -> Calendar Agent"""
+    
+    print("\n" + "="*70)
+    print("STARTING EMAIL-TO-CALENDAR ORCHESTRATION WITH ADVISOR")
+    print("="*70 + "\n")
+    
+    # Step 1: Fetch incoming email
+    print("📧 Step 1: Fetching incoming email...")
+    email_data = process_incoming_email()
+    
+    if not email_data:
+        print("⏳ No email to process")
+        return None
+    
+    print(f"✅ Email received (ID: {email_data['email_id']})")
+    print(f"📌 From: {email_data['sender_email']}")
+    print(f"📄 Body preview: {email_data['body'][:200]}...\n")
+    
+    return run_pipeline(email_data)
+
+def run_backlog(max_emails=50, max_queue=20):
+    """Fetch a batch of emails and process them in priority order
+
+    The calendar events of the whole backlog are inserted together in batched
+    requests once every email went through the crew; the notifications follow.
+    """
+    from agents.calendar_agent import EVENT_BATCH
+
+    print("\n" + "="*70)
+    print("PROCESSING EMAIL BACKLOG BY PRIORITY")
+    print("="*70 + "\n")
+
+    gmail_service = setup_gmail()
+    engine = setup_database()
+    ensure_gmail_id_column(engine)
+
+    # Messages stored by an earlier run are not fetched, queued or processed again
+    emails = fetch_relevant_emails(
+        gmail_service, max_results=max_emails, skip_ids=lambda ids: stored_gmail_ids(engine, ids)
+    )
+    queue = build_queue(engine, emails, max_size=max_queue)
+
+    results, positions, pending = [], {}, []
+    EVENT_BATCH.open()
+    try:
+        while len(queue):
+            email, priority, reasons = queue.pop()
+            print(f"▶️ Priority {priority:.1f} ({', '.join(reasons) or 'normal'}): {email['subject']}")
+
+            email_id = store_email(engine, email)
+            if email_id is None:
+                # Stored by a concurrent run since the fetch
+                continue
+            positions[email_id] = len(results)
+            results.append(run_pipeline({
+                "email_id": email_id,
+                "body": email["body"],
+                "sender_email": email["sender_email"],
+                "sender_name": email["sender_name"]
+            }, deferred=pending))
+    finally:
+        inserted = EVENT_BATCH.flush()
+
+    for email_id, event_output, clock in pending:
+        if not notify_after_batch(engine, email_id, event_output, clock, inserted):
+            results[positions[email_id]] = None
+
+    print(f"✅ Backlog done: {len(results)} processed, {len(queue.deferred)} deferred")
+    return results
+
+def resume_orchestration(email_id=None):
+    """Resume unfinished runs from their first incomplete stage"""
+    engine = setup_database()
+    ensure_pipeline_state_table(engine)
+
+    email_ids = [email_id] if email_id is not None else find_incomplete_runs(engine)
+    if not email_ids:
+        print("✅ No unfinished pipeline runs")
+        return []
+
+    results = []
+    for pending_id in email_ids:
+        email_data = load_email(engine, pending_id)
+        if not email_data:
+            print(f"⚠️ Email {pending_id} not found, skipping")
+            continue
+
+        state = load_pipeline_state(engine, pending_id)
+        stage = first_incomplete_stage(state)
+        if stage is None:
+            print(f"✅ Email {pending_id} already fully processed")
+            continue
+
+        print(f"🔁 Resuming email {pending_id} from stage '{stage}'")
+        results.append(run_pipeline(email_data, state=state))
+
+    return results
+
+def run_pipeline(email_data, state=None, deferred=None):
+    """Run the crew for one stored email, skipping stages already checkpointed
+
+    With a deferred list, the notification is not queued: (email_id, event
+    output, clock) is appended for the caller to notify later (run_backlog).
+    """
+    engine = setup_database()
+    ensure_pipeline_state_table(engine)
+    ensure_outbox_table(engine)
+    LEDGER.bind(engine)
+    email_id = email_data["email_id"]
+    done = {stage for stage in PIPELINE_STAGES if state and state.get(stage) is not None}
+    if "email_sent" in done:
+        print(f"✅ Email {email_id} already fully processed")
+        return None
+    with usage_scope(email_id=email_id):
+        over_budget = "downgrade" in LEDGER.budget_actions("advice")
+    if "advice" not in done and (lazy_advice_enabled() or over_budget):
+        # Generated when the meeting is opened in the dashboard or its date gets close
+        if over_budget:
+            print("💸 LLM budget exceeded, deferring advice generation")
+        mark_advice_pending(engine, email_id)
+        done.add("advice")
+
+    # CrewAI and the agents are heavy to import; only pay for them when there is work to do
+    from crewai import Task, Crew, Process
+    from agents.email_parser_agent import create_email_parser_agent
+    from agents.advisor_agent import create_advisor_agent
+    from agents.calendar_agent import create_calendar_agent
+
+    # Create agents, each on the model its stage is routed to
+    email_parser_agent = create_email_parser_agent(get_agent_llm("parsed"))
+    advisor_agent = create_advisor_agent(get_agent_llm("advice"))
+    
+    calendar_agent = create_calendar_agent(
+        token_file="token.json",
+        email_config=EMAIL_CONFIG,
+        llm=get_agent_llm("calendar"),
+        email_only=False,
+        engine=engine,
+        email_id=email_id
+    )
+    
+    print("✅ Agents created\n")
+
+    tasks = {}
+    clock = {"last_ns": time.time_ns()}
+    agent_usage = agent_usage_baseline(agent.llm for agent in (email_parser_agent, advisor_agent, calendar_agent))
+
+    def context(*stages):
+        """Context tasks for the stages that still have to run"""
+        return [tasks[stage] for stage in stages if stage not in done]
+
+    def stored(*stages):
+        """Outputs of already completed stages, injected when resuming"""
+        return "".join(
+            f"\n{STAGE_LABELS[stage]} (stored from a previous run):\n{state[stage]}\n"
+            for stage in stages if stage in done
+        )
+    
+    # TASK 1: Parse email and store structured data
+    task1 = Task(
+        description=f"""
+Parse and store email ID {email_data['email_id']}.
+
+Steps you MUST follow:
+1. Call parse_email_tool with the email content: {email_data['body']}
+2. You will receive a JSON object with fields like:
+   - sender_role
+   - project_title
+   - meeting_topic
+   - meeting_date
+   - meeting_time
+   - duration
+   - etc.
+3. Call store_parsed_email with:
+   - email_id = {email_data['email_id']}
+   - parsed_data = EXACT JSON from step 1
+4. Return the parsed JSON EXACTLY as received from parse_email_tool.
+
+IMPORTANT: Return the complete parsed JSON object, not just a confirmation message.
+""",
+        agent=email_parser_agent,
+        expected_output="Complete parsed JSON with meeting details",
+        callback=checkpoint(engine, email_id, "parsed", clock, email_parser_agent.llm, agent_usage)
+    )
+    tasks["parsed"] = task1
+    
+    # TASK 2: Generate advice and tasks 
+    task2 = Task(
+        description=f"""{stored("parsed")}
+Generate personalized advice and tasks for the upcoming meeting.
+
+Sender email: {email_data['sender_email']}
+
+Steps you MUST follow:
+1. Call fetch_person_context with sender_email: "{email_data['sender_email']}" and sender_name: "{email_data.get('sender_name') or ''}"
+   This will return person information including name, role, project details, etc.
+
+2. Look at the parsed email data from the previous task (task1)
+
+3. Call generate_advice with:
+   - parsed_email: the complete JSON from task1
+   - person_context: the data from step 1
+   - email_id: {email_data['email_id']}
+   
+   This will return a dict with 'tasks' (list of 5 items) and 'advice' (list of 5 items)
+
+4. Extract project_title from the parsed email JSON (from task1)
+
+5. Call store_advice with:
+   - email_id: {email_data['email_id']}
+   - project_title: [extracted from task1]
+   - tasks: [the tasks list from step 3]
+   - advice: [the advice list from step 3]
+
+6. Return: "ADVICE GENERATED AND STORED"
+
+IMPORTANT: Follow all steps in order. Use the exact tools mentioned.
+""",
+        agent=advisor_agent,
+        expected_output="'ADVICE GENERATED AND STORED'",
+        context=context("parsed"),
+        # No later stage reads the advice output: resuming past it relies on the recommendations rows
+        callback=checkpoint(engine, email_id, "advice", clock, advisor_agent.llm, agent_usage, ADVICE_STORED)
+    )
+    tasks["advice"] = task2
+    
+    # TASK 3: Check availability (RENUMBERED, NO OTHER CHANGES)
+    task3 = Task(
+        description=f"""{stored("parsed")}
+Look at the parsed meeting data from task 1.
+
+Extract these fields from the parsed data:
+- meeting_date (format: YYYY-MM-DD)
+- meeting_time (format: HH:MM)
+- duration (in hours, default to 1.0 if not specified)
+
+Construct start_time and end_time:
+- start_time = meeting_date + "T" + meeting_time + ":00"
+- end_time = start_time + duration hours
+
+Example: If meeting_date="2025-12-20", meeting_time="10:00", duration=1
+Then: start_time="2025-12-20T10:00:00", end_time="2025-12-20T11:00:00"
+
+Use check_calendar_availability with:
+- start_time: [calculated start_time]
+- end_time: [calculated end_time]
+- timezone: Africa/Tunis
+
+Return ONLY: "AVAILABLE" or "NOT AVAILABLE" based on the result.
+""",
+        agent=calendar_agent,
+        expected_output="Either 'AVAILABLE' or 'NOT AVAILABLE'",
+        context=context("parsed"),
+        callback=checkpoint(engine, email_id, "availability", clock, calendar_agent.llm, agent_usage)
+    )
+    tasks["availability"] = task3
+    
+    # TASK 4: Create event OR find alternatives (RENUMBERED, NO OTHER CHANGES)
+    task4 = Task(
+        description=f"""{stored("parsed", "availability")}
+Look at the previous task result and the parsed meeting data from task 1.
+
+If availability check says "AVAILABLE":
+  Extract from parsed data:
+  - project_title (use as summary)
+  - meeting_topic (use as description)
+  - meeting_date and meeting_time (to construct start_time)
+  - duration (to calculate end_time)
+  - sender_email: {email_data['sender_email']} (use as attendees)
+  
+  Use create_calendar_event with these values:
+  * summary: [project_title]
+  * start_time: [meeting_date + "T" + meeting_time + ":00"]
+  * end_time: [start_time + duration hours]
+  * description: [meeting_topic]
+  * attendees: {email_data['sender_email']}
+  * timezone: Africa/Tunis
+  
+  After creating, return: "EVENT CREATED: " followed by the event_id returned by the tool
+
+If availability check says "NOT AVAILABLE":
+  Use find_alternative_slots with:
+  * start_date: [meeting_date + "T" + meeting_time + ":00"]
+  * duration_hours: [parsed duration or 1.0]
+  * days_ahead: 7
+  * timezone: Africa/Tunis
+  
+  Return: "ALTERNATIVES FOUND: " followed by the list of alternatives
+""",
+        agent=calendar_agent,
+        expected_output="'EVENT CREATED: [event_id]' or 'ALTERNATIVES FOUND: [list]'",
+        context=context("parsed", "availability"),
+        callback=checkpoint(engine, email_id, "event", clock, calendar_agent.llm, agent_usage)
+    )
+    tasks["event"] = task4
+    
+    remaining = [tasks[stage] for stage in CREW_STAGES if stage not in done]
+    result = state["event"] if state and not remaining else None
+
+    # Create unified crew with ALL agents
+    all_agents = [email_parser_agent, advisor_agent, calendar_agent]
+    crew = Crew(
+        agents=[agent for agent in all_agents if any(task.agent is agent for task in remaining)],
+        tasks=remaining,  # Only the stages without a checkpoint
+        process=Process.sequential,
+        verbose=True
+    ) if remaining else None
+    
+    print("🚀 Starting orchestration...\n")
+    try:
+        with usage_scope(email_id=email_id), span("pipeline.run", email_id=email_id, stages=len(remaining) + 1):
+            clock["last_ns"] = time.time_ns()
+            if remaining:
+                # The agents always run on Ollama: fail fast (and stay resumable) while its breaker is open
+                with ROUTER.guard("ollama"):
+                    result = crew.kickoff()
+            event_output = state["event"] if "event" in done else tasks["event"].output.raw
+            if deferred is not None:
+                # An unrecognised output fails here, as notify() would
+                parse_event_output(event_output)
+                deferred.append((email_id, event_output, clock))
+            else:
+                # No agent needed: the confirmation is a template filled from the stored meeting
+                notify(engine, email_id, event_output, clock)
+    except Exception as e:
+        record_failure(engine, email_id, e)
+        print(f"❌ Orchestration failed: {str(e)}")
+        print(f"🔁 Resume later with: python -m orchestrator.main_orchestrator --resume {email_id}")
+        return None
+    
+    print("\n" + "="*70)
+    print("✅ ORCHESTRATION COMPLETED")
+    print("="*70)
+    print(f"\n{result}\n")
+    print("📬 Check:")
+    print("  - Email inbox for confirmation")
+    print("  - Google Calendar for event")
+    print("  - Database 'recommendations' table for advice and tasks")
+    print("="*70 + "\n")
+    
+    return result
+
+def flag_number(flag, default):
+    """The number following a command-line flag, or default when another flag (or nothing) follows"""
+    args = sys.argv[sys.argv.index(flag) + 1:]
+    return int(args[0]) if args and args[0].isdigit() else default
+
+if __name__ == "__main__":
+    # --record PATH captures every external call of the run; --replay PATH serves them back offline
+    cassette = None
+    if "--record" in sys.argv or "--replay" in sys.argv:
+        from utils import cassette as cassettes
+
+        mode = "record" if "--record" in sys.argv else "replay"
+        speed = float(sys.argv[sys.argv.index("--replay-speed") + 1]) if "--replay-speed" in sys.argv else 1.0
+        cassette = cassettes.install(
+            sys.argv[sys.argv.index(f"--{mode}") + 1], mode, speed, orchestrator=sys.modules[__name__]
+        )
+    replaying = cassette is not None and cassette.mode == "replay"
+
+    if not replaying and (not EMAIL_CONFIG["sender_email"] or not EMAIL_CONFIG["sender_password"]):
+        print("\n❌ ERROR: Missing email credentials in .env file!")
+        print("Please set SENDER_EMAIL and EMAIL_APP_PASSWORD")
+        exit(1)
+    
+    print(f"\n✅ Email configured: {EMAIL_CONFIG['sender_email']}")
+    
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server()
+
+    if "--send-outbox" in sys.argv:
+        sent, failed = drain_outbox(setup_database(), EMAIL_CONFIG)
+        if cassette:
+            cassettes.uninstall()
+        sys.exit(1 if failed else 0)
+
+    if "--advice-due" in sys.argv:
+        generate_due_advice(setup_database())
+        if cassette:
+            cassettes.uninstall()
+        sys.exit(0)
+
+    if "--lazy-advice" in sys.argv:
+        os.environ["LAZY_ADVICE"] = "1"
+
+    # Notifications are queued by the pipeline and sent by this background thread
+    outbox_sender = start_outbox_sender(setup_database(), EMAIL_CONFIG)
+    # Local models stay loaded, with their prompt prefixes cached, while the pipeline runs
+    ollama_keeper = None if replaying else start_ollama_keeper()
+
+    if "--resume" in sys.argv:
+        result = resume_orchestration(flag_number("--resume", None))
+    elif "--backlog" in sys.argv:
+        result = run_backlog(flag_number("--backlog", 50))
+    else:
+        result = run_orchestration()
+
+    outbox_sender.stop(flush=True)
+    if ollama_keeper:
+        ollama_keeper.stop()
+    if cassette:
+        cassettes.uninstall()
+
+    if os.getenv("TRACE_EXPORT_PATH"):
+        write_traces(os.getenv("TRACE_EXPORT_PATH"))
+    if os.getenv("METRICS_TEXTFILE"):
+        write_metrics(os.getenv("METRICS_TEXTFILE"))
@@ -0,0 +1,17 @@
+import os
+import signal
+from dotenv import load_dotenv
+
+# Shared process setup, executed once on first import:
+#   import utils.bootstrap  # noqa: F401
+
+load_dotenv()
+
+# Windows compatibility
+if os.name == "nt":
+    unix_signals = ["SIGHUP", "SIGTSTP", "SIGQUIT", "SIGCONT"]
+    for sig_name in unix_signals:
+        if not hasattr(signal, sig_name):
+            setattr(signal, sig_name, signal.SIGTERM)
+
+os.environ["CREWAI_DISABLE_TRACING"] = "true"
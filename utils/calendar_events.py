@@ -0,0 +1,110 @@
+"""
+Calendar event creation with deterministic ids and batched inserts.
+
+Each event gets an id derived from its calendar, summary, times and attendees,
+so inserting the same meeting twice returns 409 from the API instead of
+creating a duplicate; that case is reported as "exists". insert_events() sends
+the inserts as Google batch HTTP requests and retries the items that failed with
+a rate-limit or server error.
+"""
+import time
+import hashlib
+
+from utils.tracing import increment, span
+
+BATCH_SIZE = 50  # Calendar API limit per batch request
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+RETRYABLE_STATUSES = {403, 429, 500, 502, 503, 504}
+
+def event_id(summary, start_dt, end_dt, attendees=(), calendar_id="primary"):
+    """Deterministic event id (lowercase hex, valid for the base32hex id alphabet)"""
+    key = "|".join([
+        calendar_id,
+        (summary or "").strip().lower(),
+        start_dt.isoformat(),
+        end_dt.isoformat(),
+        ",".join(sorted(attendee.strip().lower() for attendee in attendees if attendee.strip())),
+    ])
+    return "am" + hashlib.sha256(key.encode()).hexdigest()[:40]
+
+def build_event(summary, start_dt, end_dt, timezone, description="", attendees="", calendar_id="primary"):
+    """Event body with its deterministic id"""
+    emails = [email.strip() for email in str(attendees or "").split(",") if email.strip()]
+    event = {
+        "id": event_id(summary, start_dt, end_dt, emails, calendar_id),
+        "summary": summary,
+        "description": description,
+        "start": {"dateTime": start_dt.isoformat(), "timeZone": timezone},
+        "end": {"dateTime": end_dt.isoformat(), "timeZone": timezone}
+    }
+    if emails:
+        event["attendees"] = [{"email": email} for email in emails]
+    return event
+
+def _status(exception):
+    resp = getattr(exception, "resp", None)
+    return getattr(resp, "status", None)
+
+def classify(exception):
+    """'exists', 'retry' or 'failed' for an insert error"""
+    status = _status(exception)
+    if status == 409:
+        return "exists"
+    if status in RETRYABLE_STATUSES:
+        return "retry"
+    return "failed"
+
+def insert_event(service, event, calendar_id="primary"):
+    """Insert one event; returns a result dict like insert_events() items"""
+    try:
+        with span("calendar.events_insert"):
+            created = service.events().insert(calendarId=calendar_id, body=event).execute()
+        return {"event_id": created.get("id", event["id"]), "status": "created"}
+    except Exception as e:
+        if classify(e) == "exists":
+            return {"event_id": event["id"], "status": "exists"}
+        raise
+
+def insert_events(service, events, calendar_id="primary", batch_size=BATCH_SIZE,
+                  max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF_SECONDS):
+    """Insert events through batch requests; returns one result dict per event, in order"""
+    results = [None] * len(events)
+    pending = list(range(len(events)))
+
+    for attempt in range(max_retries + 1):
+        retry = []
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is None:
+                results[index] = {"event_id": response.get("id"), "status": "created"}
+                return
+            outcome = classify(exception)
+            if outcome == "retry" and attempt < max_retries:
+                retry.append(index)
+                return
+            results[index] = {
+                "event_id": events[index]["id"],
+                "status": "exists" if outcome == "exists" else "failed",
+                **({} if outcome == "exists" else {"error": str(exception)}),
+            }
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(service.events().insert(calendarId=calendar_id, body=events[index]),
+                          request_id=str(index))
+            with span("calendar.events_batch_insert", events=len(chunk), attempt=attempt):
+                batch.execute()
+
+        if not retry:
+            break
+        increment("calendar_insert_retries_total", len(retry))
+        pending = sorted(retry)
+        time.sleep(backoff * 2 ** attempt)
+
+    for result in results:
+        increment("calendar_events_inserted_total", status=result["status"])
+    return results
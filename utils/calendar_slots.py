@@ -0,0 +1,111 @@
+"""
+Free-slot search over busy intervals.
+
+The engine lays the search horizon out as one minute-resolution array per day,
+marks busy minutes (plus optional buffers) with a difference array, and tests
+every candidate start on a 15-minute grid at once with prefix sums. Free
+candidates are ranked by distance from the requested time.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+WORK_START_HOUR = 9
+WORK_END_HOUR = 17
+SLOT_STEP_MINUTES = 15
+MINUTES_PER_DAY = 24 * 60
+
+def parse_busy(busy):
+    """Convert freebusy 'busy' entries into (start, end) datetimes"""
+    return [
+        (
+            datetime.fromisoformat(period["start"].replace("Z", "+00:00")),
+            datetime.fromisoformat(period["end"].replace("Z", "+00:00")),
+        )
+        for period in busy
+    ]
+
+def merge_intervals(intervals):
+    """Sort and merge overlapping or touching (start, end) intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def search_window(start_dt, days_ahead=7, work_start=WORK_START_HOUR, work_end=WORK_END_HOUR):
+    """(time_min, time_max) covering the working hours of every searched day"""
+    time_min = start_dt.replace(hour=work_start, minute=0, second=0, microsecond=0)
+    last_day = start_dt + timedelta(days=max(days_ahead - 1, 0))
+    time_max = last_day.replace(hour=work_end, minute=0, second=0, microsecond=0)
+    return time_min, time_max
+
+def busy_minute_grid(busy, first_day, n_days, tz, buffer_minutes=0):
+    """(n_days, 1440) boolean array of busy local minutes, starting at first_day midnight"""
+    horizon = n_days * MINUTES_PER_DAY
+    starts, ends = [], []
+    for busy_start, busy_end in busy:
+        local_start = busy_start.astimezone(tz)
+        local_end = busy_end.astimezone(tz)
+        starts.append((local_start.date() - first_day).days * MINUTES_PER_DAY
+                      + local_start.hour * 60 + local_start.minute - buffer_minutes)
+        # Round partial minutes up so a busy second still blocks its minute
+        end_seconds = local_end.second + local_end.microsecond / 1e6
+        ends.append((local_end.date() - first_day).days * MINUTES_PER_DAY
+                    + local_end.hour * 60 + local_end.minute + int(end_seconds > 0) + buffer_minutes)
+
+    delta = np.zeros(horizon + 1, dtype=np.int32)
+    if starts:
+        starts = np.clip(np.array(starts), 0, horizon)
+        ends = np.clip(np.array(ends), 0, horizon)
+        keep = ends > starts
+        np.add.at(delta, starts[keep], 1)
+        np.add.at(delta, ends[keep], -1)
+    return (np.cumsum(delta[:-1]) > 0).reshape(n_days, MINUTES_PER_DAY)
+
+def find_slots(start_dt, duration_hours, busy, days_ahead=7, max_results=5,
+               buffer_minutes=0, step_minutes=SLOT_STEP_MINUTES, not_before=None,
+               work_start=WORK_START_HOUR, work_end=WORK_END_HOUR):
+    """Free (start, end) slots on weekdays, closest to start_dt first"""
+    tz = start_dt.tzinfo
+    duration = int(round(duration_hours * 60))
+    window_start, window_end = work_start * 60, work_end * 60
+    if duration <= 0 or duration > window_end - window_start or days_ahead <= 0:
+        return []
+
+    first_day = start_dt.date()
+    grid = busy_minute_grid(busy, first_day, days_ahead, tz, buffer_minutes)
+    working = grid[:, window_start:window_end]
+
+    # busy_before[d, m] = busy minutes in the first m minutes of day d's window
+    busy_before = np.zeros((days_ahead, working.shape[1] + 1), dtype=np.int32)
+    np.cumsum(working, axis=1, out=busy_before[:, 1:])
+    offsets = np.arange(0, working.shape[1] - duration + 1, step_minutes)
+    fits = (busy_before[:, offsets + duration] - busy_before[:, offsets]) == 0
+
+    weekdays = np.array([(first_day + timedelta(days=d)).weekday() < 5 for d in range(days_ahead)])
+    fits &= weekdays[:, None]
+
+    day_index, offset_index = np.nonzero(fits)
+    if day_index.size == 0:
+        return []
+    minutes = day_index * MINUTES_PER_DAY + window_start + offsets[offset_index]
+
+    if not_before is not None:
+        local = not_before.astimezone(tz)
+        earliest = (local.date() - first_day).days * MINUTES_PER_DAY + local.hour * 60 + local.minute
+        minutes = minutes[minutes >= earliest]
+
+    requested = start_dt.hour * 60 + start_dt.minute
+    order = np.argsort(np.abs(minutes - requested), kind="stable")[:max_results]
+
+    midnight = datetime(first_day.year, first_day.month, first_day.day, tzinfo=tz)
+    slots = []
+    for minute in minutes[order]:
+        day, minute_of_day = divmod(int(minute), MINUTES_PER_DAY)
+        slot_start = (midnight + timedelta(days=day)).replace(hour=minute_of_day // 60, minute=minute_of_day % 60)
+        slots.append((slot_start, slot_start + timedelta(minutes=duration)))
+    return slots
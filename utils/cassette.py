@@ -0,0 +1,643 @@
+"""
+Record and replay every external call of a pipeline run.
+
+In record mode the seams the pipeline reaches the outside world through (the
+Gmail and Calendar clients, SMTP, the Postgres engine, the routed Groq/Ollama
+backends and the CrewAI agent LLM) are wrapped so each request is written with
+its response, or error, and latency to a gzipped JSON-lines cassette. In
+replay mode the same seams serve the recorded responses without touching the
+network or the database, sleeping the recorded latency times `speed` (1 keeps
+the original timing, 0 answers instantly).
+
+A replayed request is matched to an unused recording of the same request; if
+its parameters changed (timestamps, generated ids) it takes the next unused
+recording of the same operation instead, and only an operation that was never
+recorded raises CassetteMiss. Replay with the configuration the run was recorded
+with (SMTP settings, LAZY_ADVICE, ...) so the pipeline makes the same calls.
+The Ollama keeper's warm-ups are not part of a run and are not recorded.
+
+    python -m orchestrator.main_orchestrator --record runs/slow.cassette
+    python -m orchestrator.main_orchestrator --replay runs/slow.cassette --replay-speed 0
+    python -m utils.cassette runs/slow.cassette        # what the run spent its time on
+"""
+import sys
+import gzip
+import json
+import time
+import base64
+import argparse
+import importlib
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from crewai.llms.base_llm import BaseLLM
+
+FORMAT_VERSION = 1
+# Exceptions rebuilt as their own class on replay, so except clauses still match
+REPLAYABLE_MODULES = {"builtins", "smtplib", "socket", "ssl", "urllib.error", "http.client"}
+# Library exceptions whose constructors need live objects: rebuilt as a subclass of
+# the real class, with the attributes their handlers and __repr__ read
+REBUILT_MODULES = {
+    "sqlalchemy.exc": {"statement": None, "params": None, "orig": None, "ismulti": None,
+                       "hide_parameters": False, "connection_invalidated": False, "detail": [], "code": None},
+    "googleapiclient.errors": {"content": b"", "uri": None, "error_details": "", "reason": ""},
+}
+_rebuilt = {}
+
+class CassetteMiss(Exception):
+    """A replayed run made a call the recording never made"""
+
+class ReplayedError(Exception):
+    """A recorded failure, raised again on replay"""
+
+# ==================== Encoding ====================
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dtime):
+        return {"$time": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return {"$repr": repr(value)}
+
+_DECODERS = {
+    "$datetime": datetime.fromisoformat,
+    "$date": date.fromisoformat,
+    "$time": dtime.fromisoformat,
+    "$decimal": Decimal,
+    "$bytes": base64.b64decode,
+    "$repr": str,
+}
+
+def _object_hook(value):
+    if len(value) == 1:
+        key = next(iter(value))
+        if key in _DECODERS:
+            return _DECODERS[key](value[key])
+    return value
+
+def _dumps(value):
+    return json.dumps(value, default=_default, separators=(",", ":"), sort_keys=True)
+
+def _loads(line):
+    return json.loads(line, object_hook=_object_hook)
+
+def _normalize(value):
+    """The request as it will read back from the cassette, so recorded and live requests compare equal"""
+    return _loads(_dumps(value))
+
+def _encode_error(error):
+    return {
+        "type": type(error).__name__,
+        "module": type(error).__module__,
+        "message": str(error),
+        "status": getattr(error, "status_code", None)
+        or getattr(getattr(error, "resp", None), "status", None)
+        or (error.code if isinstance(getattr(error, "code", None), int) else None),
+        "timeout": isinstance(error, TimeoutError),
+    }
+
+def _error_class(module, name):
+    """A library exception class, or None when it cannot be imported"""
+    try:
+        cls = getattr(importlib.import_module(module), name, None)
+    except ImportError:
+        return None
+    return cls if isinstance(cls, type) and issubclass(cls, BaseException) else None
+
+def _rebuilt_class(module, name):
+    """A ReplayedError subclass of the library's own exception class, shown with the recorded message"""
+    key = (module, name)
+    if key not in _rebuilt:
+        real = _error_class(module, name)
+        _rebuilt[key] = real and type(name, (real, ReplayedError), {
+            **REBUILT_MODULES[module], "__str__": Exception.__str__, "__repr__": Exception.__repr__,
+        })
+    return _rebuilt[key]
+
+def _decode_error(recorded):
+    """The recorded exception class when it is a standard one, else a ReplayedError of the same name"""
+    cls = None
+    if recorded["module"] in REPLAYABLE_MODULES:
+        cls = _error_class(recorded["module"], recorded["type"])
+    elif recorded["module"] in REBUILT_MODULES:
+        cls = _rebuilt_class(recorded["module"], recorded["type"])
+    if cls is None:
+        bases = (ReplayedError, TimeoutError) if recorded["timeout"] else (ReplayedError,)
+        cls = type(recorded["type"], bases, {})
+    error = cls.__new__(cls)
+    Exception.__init__(error, recorded["message"])
+    if recorded["status"] is not None:
+        error.resp = SimpleNamespace(status=recorded["status"], reason=recorded["message"])
+        if not isinstance(getattr(cls, "status_code", None), property):
+            # HttpError derives status_code from resp
+            error.status_code = recorded["status"]
+    return error
+
+# ==================== Cassette ====================
+
+class Cassette:
+    """The recorded calls of one run, written as they happen (record) or served back (replay)"""
+
+    def __init__(self, path, mode, speed=1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self.header = {}
+        if mode == "record":
+            self.header = {"version": FORMAT_VERSION, "recorded_at": datetime.now().isoformat(), "argv": sys.argv}
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+            self._file.write(_dumps(self.header) + "\n")
+            self.recorded = 0
+        else:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                self.header = _loads(file.readline())
+                self._entries = [_loads(line) for line in file if line.strip()]
+            self._unused = defaultdict(list)
+            for position, entry in enumerate(self._entries):
+                if entry["kind"] != "meta":
+                    self._unused[(entry["kind"], entry["op"])].append(position)
+            self.loose_matches = 0
+
+    def note(self, **values):
+        """Add run metadata (database URL, ...) to the header; recorded after the fact as a meta entry"""
+        self.header.update(values)
+        if self.mode == "record":
+            self._write({"kind": "meta", "op": "header", "req": values, "res": None, "err": None, "ms": 0})
+
+    def _write(self, entry):
+        line = _dumps(entry)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.recorded += 1
+
+    def call(self, kind, op, request, func):
+        """Run func and record it (record), or serve the recording of this request (replay)"""
+        if self.mode == "replay":
+            return self._replay(kind, op, request)
+        started = time.perf_counter()
+        try:
+            response = func()
+        except Exception as e:
+            self._write({"kind": kind, "op": op, "req": request, "res": None, "err": _encode_error(e),
+                         "ms": round((time.perf_counter() - started) * 1000, 3)})
+            raise
+        self._write({"kind": kind, "op": op, "req": request, "res": response, "err": None,
+                     "ms": round((time.perf_counter() - started) * 1000, 3)})
+        return response
+
+    def _take(self, kind, op, request):
+        request = _normalize(request)
+        with self._lock:
+            positions = self._unused.get((kind, op))
+            if not positions:
+                raise CassetteMiss(f"No recorded {kind} call left for {op}")
+            position = next((p for p in positions if self._entries[p]["req"] == request), None)
+            if position is None:
+                position = positions[0]
+                self.loose_matches += 1
+            positions.remove(position)
+        return self._entries[position]
+
+    def _replay(self, kind, op, request):
+        entry = self._take(kind, op, request)
+        if self.speed and entry["ms"]:
+            time.sleep(entry["ms"] / 1000 * self.speed)
+        if entry["err"] is not None:
+            raise _decode_error(entry["err"])
+        return entry["res"]
+
+    def meta(self, key, default=None):
+        if self.mode == "replay":
+            for entry in self._entries:
+                if entry["kind"] == "meta" and key in entry["req"]:
+                    return entry["req"][key]
+        return self.header.get(key, default)
+
+    def close(self):
+        if self.mode == "record":
+            with self._lock:
+                if not self._file.closed:
+                    self._file.close()
+                    print(f"📼 {self.recorded} external calls recorded to {self.path}")
+        else:
+            print(f"📼 Replay finished: {self.unused()} recorded calls unused, {self.loose_matches} matched by order")
+
+    def unused(self):
+        """Recorded calls the replay has not served (yet)"""
+        with self._lock:
+            return sum(len(positions) for positions in self._unused.values())
+
+# ==================== Google APIs ====================
+
+class _GoogleProxy:
+    """Stands in for a googleapiclient resource; execute() goes through the cassette"""
+
+    def __init__(self, cassette, api, real=None, path=(), kwargs=None):
+        self._cassette = cassette
+        self._api = api
+        self._real = real
+        self._path = path
+        self._kwargs = kwargs or {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        real = getattr(self._real, name) if self._real is not None else None
+        return _GoogleProxy(self._cassette, self._api, real, self._path + (name,))
+
+    def __call__(self, *args, **kwargs):
+        real = self._real(*args, **kwargs) if self._real is not None else None
+        return _GoogleProxy(self._cassette, self._api, real, self._path, kwargs)
+
+    @property
+    def _op(self):
+        return f"{self._api}.{'.'.join(self._path)}"
+
+    def execute(self, *args, **kwargs):
+        return self._cassette.call("google", self._op, self._kwargs, lambda: self._real.execute(*args, **kwargs))
+
+    def new_batch_http_request(self, callback=None):
+        return _GoogleBatch(self, callback)
+
+class _GoogleBatch:
+    """Batch of proxied requests, recorded as one call; callbacks run per request as usual"""
+
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self._requests.append((str(request_id if request_id is not None else len(self._requests)), request, callback))
+
+    def execute(self):
+        cassette = self._service._cassette
+        described = [{"id": request_id, "op": request._op, "kwargs": request._kwargs}
+                     for request_id, request, _ in self._requests]
+        errors = {}
+
+        def run():
+            outcomes = []
+
+            def collect(request_id, response, exception):
+                errors[request_id] = exception
+                outcomes.append({"id": request_id, "response": response,
+                                 "error": _encode_error(exception) if exception is not None else None})
+
+            batch = self._service._real.new_batch_http_request(callback=collect)
+            for request_id, request, _ in self._requests:
+                batch.add(request._real, request_id=request_id)
+            batch.execute()
+            return outcomes
+
+        outcomes = cassette.call("google", f"{self._service._api}.batch", described, run)
+        callbacks = {request_id: callback for request_id, _, callback in self._requests}
+        for outcome in outcomes:
+            error = outcome["error"]
+            if error is not None:
+                # The live exception object when recording, a rebuilt one on replay
+                error = errors.get(outcome["id"]) or _decode_error(error)
+            callback = callbacks.get(outcome["id"]) or self._callback
+            if callback is not None:
+                callback(outcome["id"], outcome["response"], error)
+
+# ==================== SMTP ====================
+
+def _smtp_request(name, args, kwargs):
+    """What identifies an SMTP call, without credentials or message bodies"""
+    if name == "login":
+        return {"user": args[0] if args else kwargs.get("user")}
+    if name == "send_message":
+        msg = args[0] if args else kwargs.get("msg")
+        return {"to": msg["To"], "subject": msg["Subject"]}
+    return {}
+
+def _smtp_class(cassette, real_class):
+    class CassetteSMTP:
+        """smtplib.SMTP whose connection and commands go through the cassette"""
+
+        def __init__(self, host="", port=0, *args, **kwargs):
+            self._real = None
+
+            def connect():
+                if real_class is not None:
+                    self._real = real_class(host, port, *args, **kwargs)
+
+            cassette.call("smtp", "connect", {"host": host, "port": port}, connect)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.quit()
+
+        def __getattr__(self, name):
+            if name.startswith("_"):
+                raise AttributeError(name)
+
+            def method(*args, **kwargs):
+                return cassette.call(
+                    "smtp", name, _smtp_request(name, args, kwargs),
+                    lambda: getattr(self._real, name)(*args, **kwargs),
+                )
+            return method
+
+    return CassetteSMTP
+
+# ==================== Database ====================
+
+class _Row(tuple):
+    """Tuple row that also answers row.column and row._mapping"""
+
+    def __new__(cls, values, keys):
+        row = super().__new__(cls, values)
+        row._keys = keys
+        return row
+
+    @property
+    def _mapping(self):
+        return dict(zip(self._keys, self))
+
+    def __getattr__(self, name):
+        try:
+            return self[self._keys.index(name)]
+        except ValueError:
+            raise AttributeError(name) from None
+
+class _Mappings:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return [row._mapping for row in self._rows]
+
+    all = fetchall
+
+    def fetchone(self):
+        return self._rows[0]._mapping if self._rows else None
+
+    first = fetchone
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+class _Result:
+    """A fully read result: the rows, keys and rowcount of one statement"""
+
+    def __init__(self, keys, rows, rowcount):
+        self._keys = keys
+        self._rows = [_Row(row, keys) for row in rows]
+        self._position = 0
+        self.rowcount = rowcount
+        self.returns_rows = bool(keys)
+
+    def keys(self):
+        return list(self._keys)
+
+    def fetchall(self):
+        rows, self._position = self._rows[self._position:], len(self._rows)
+        return rows
+
+    all = fetchall
+
+    def fetchone(self):
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def first(self):
+        return self._rows[0] if self._rows else None
+
+    def scalar(self):
+        row = self.first()
+        return row[0] if row else None
+
+    def mappings(self):
+        return _Mappings(self._rows[self._position:])
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+def _sql(statement):
+    return " ".join(str(statement).split())
+
+class _CassetteConnection:
+    def __init__(self, cassette, real=None):
+        self._cassette = cassette
+        self._real = real
+
+    def execute(self, statement, parameters=None):
+        def run():
+            result = self._real.execute(statement, parameters)
+            keys = list(result.keys()) if result.returns_rows else []
+            rows = [list(row) for row in result.fetchall()] if keys else []
+            return {"keys": keys, "rows": rows, "rowcount": result.rowcount}
+
+        response = self._cassette.call("db", _sql(statement), {"params": parameters}, run)
+        return _Result(response["keys"], response["rows"], response["rowcount"])
+
+class CassetteEngine:
+    """The connect()/begin() surface of an Engine, recorded through the cassette or replayed from it"""
+
+    def __init__(self, cassette, real=None):
+        from sqlalchemy.engine import make_url
+
+        self._cassette = cassette
+        self._real = real
+        if real is not None:
+            cassette.note(database=real.url.render_as_string(hide_password=True))
+            self.url = real.url
+        else:
+            self.url = make_url(cassette.meta("database") or "postgresql://replay/cassette")
+
+    @contextmanager
+    def connect(self):
+        if self._real is None:
+            yield _CassetteConnection(self._cassette)
+            return
+        with self._real.connect() as conn:
+            yield _CassetteConnection(self._cassette, conn)
+
+    @contextmanager
+    def begin(self):
+        if self._real is None:
+            yield _CassetteConnection(self._cassette)
+            return
+        with self._real.begin() as conn:
+            yield _CassetteConnection(self._cassette, conn)
+
+# ==================== LLMs ====================
+
+def _backend(cassette, name, func):
+    def call(model, prompt, max_tokens, temperature, timeout):
+        request = {"model": model, "prompt": prompt, "max_tokens": max_tokens, "temperature": temperature}
+        text, tokens = cassette.call(
+            "llm", name, request, lambda: list(func(model, prompt, max_tokens, temperature, timeout))
+        )
+        return text, tuple(tokens) if tokens is not None else None
+    return call
+
+def _usage(llm):
+    usage = llm.get_token_usage_summary()
+    return [usage.prompt_tokens, usage.completion_tokens, usage.successful_requests]
+
+class CassetteAgentLLM(BaseLLM):
+    """Agent LLM whose answers come from (and go to) the cassette"""
+
+    cassette: object = None
+    inner: object = None
+    stage: str = "advice"
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        request = {"messages": [{"role": m.get("role"), "content": m.get("content")} for m in messages]
+                   if not isinstance(messages, str) else messages}
+
+        def run():
+            before = _usage(self.inner)
+            answer = self.inner.call(messages, tools=tools, callbacks=callbacks,
+                                     available_functions=available_functions, from_task=from_task,
+                                     from_agent=from_agent, response_model=response_model)
+            after = _usage(self.inner)
+            return {"answer": answer, "usage": [now - was for now, was in zip(after, before)]}
+
+        response = self.cassette.call("agent", self.stage, request, run)
+        prompt_tokens, completion_tokens, calls = response["usage"]
+        if calls:
+            self._track_token_usage_internal({
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            })
+        return response["answer"]
+
+# ==================== Installation ====================
+
+_installed = {"cassette": None, "restore": []}
+
+def _patch(target, name, value):
+    _installed["restore"].append((target, name, getattr(target, name)))
+    setattr(target, name, value)
+
+def install(path, mode, speed=1.0, orchestrator=None):
+    """Route the pipeline's external calls through a cassette; returns it
+
+    orchestrator is the module whose setup_gmail/setup_database/get_agent_llm
+    are patched, for when it runs as __main__.
+    """
+    if orchestrator is None:
+        import orchestrator.main_orchestrator as orchestrator
+    import agents.calendar_agent as calendar_agent
+    import utils.database as database
+    import utils.llm_router as llm_router
+    import utils.smtp_pool as smtp_pool
+
+    if _installed["cassette"] is not None:
+        raise RuntimeError("A cassette is already installed")
+    cassette = Cassette(path, mode, speed)
+    replay = mode == "replay"
+
+    real_setup_gmail = orchestrator.setup_gmail
+    real_calendar_service = calendar_agent.get_calendar_service
+    real_setup_database = database.setup_database
+    real_agent_llm = orchestrator.get_agent_llm
+    engines = {}
+
+    def setup_gmail():
+        return _GoogleProxy(cassette, "gmail", None if replay else real_setup_gmail())
+
+    def get_calendar_service(token_file):
+        return _GoogleProxy(cassette, "calendar", None if replay else real_calendar_service(token_file))
+
+    def setup_database():
+        real = None if replay else real_setup_database()
+        if id(real) not in engines:
+            engines[id(real)] = CassetteEngine(cassette, real)
+        return engines[id(real)]
+
+    def get_agent_llm(stage="advice"):
+        if replay:
+            return CassetteAgentLLM(model=f"replay/{stage}", cassette=cassette, stage=stage)
+        inner = real_agent_llm(stage)
+        return CassetteAgentLLM(model=inner.model, cassette=cassette, inner=inner, stage=stage)
+
+    _patch(orchestrator, "setup_gmail", setup_gmail)
+    _patch(calendar_agent, "get_calendar_service", get_calendar_service)
+    _patch(orchestrator, "setup_database", setup_database)
+    _patch(database, "setup_database", setup_database)
+    _patch(orchestrator, "get_agent_llm", get_agent_llm)
+    _patch(smtp_pool.smtplib, "SMTP", _smtp_class(cassette, None if replay else smtp_pool.smtplib.SMTP))
+    for name, func in list(llm_router.BACKENDS.items()):
+        _patch_item(llm_router.BACKENDS, name, _backend(cassette, name, func))
+    smtp_pool.close_pools()
+
+    _installed["cassette"] = cassette
+    print(f"📼 {'Replaying' if replay else 'Recording'} external calls {'from' if replay else 'to'} {path}")
+    return cassette
+
+def _patch_item(mapping, key, value):
+    _installed["restore"].append((mapping, key, mapping[key]))
+    mapping[key] = value
+
+def uninstall():
+    """Close the cassette and put the real seams back"""
+    import utils.smtp_pool as smtp_pool
+
+    cassette = _installed["cassette"]
+    if cassette is None:
+        return
+    smtp_pool.close_pools()
+    for target, name, value in reversed(_installed["restore"]):
+        if isinstance(target, dict):
+            target[name] = value
+        else:
+            setattr(target, name, value)
+    _installed.update(cassette=None, restore=[])
+    cassette.close()
+
+def summarize(path):
+    """{kind: {op: (calls, errors, total ms)}} of a cassette, slowest operations first"""
+    cassette = Cassette(path, "replay")
+    summary = defaultdict(lambda: defaultdict(lambda: [0, 0, 0.0]))
+    for entry in cassette._entries:
+        if entry["kind"] == "meta":
+            continue
+        totals = summary[entry["kind"]][entry["op"]]
+        totals[0] += 1
+        totals[1] += entry["err"] is not None
+        totals[2] += entry["ms"]
+    return {
+        kind: dict(sorted(((op, tuple(totals)) for op, totals in ops.items()), key=lambda item: -item[1][2]))
+        for kind, ops in summary.items()
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise the external calls recorded in a cassette")
+    parser.add_argument("path")
+    parser.add_argument("--top", type=int, default=10, help="Operations shown per kind")
+    args = parser.parse_args()
+
+    for kind, ops in summarize(args.path).items():
+        calls = sum(totals[0] for totals in ops.values())
+        total_ms = sum(totals[2] for totals in ops.values())
+        print(f"\n📼 {kind}: {calls} calls, {total_ms / 1000:.2f} s")
+        for op, (count, errors, ms) in list(ops.items())[:args.top]:
+            label = op if len(op) <= 80 else op[:77] + "..."
+            print(f"  {ms:10.1f} ms  {count:5d} calls  {errors:3d} errors  {label}")
+    sys.exit(0)
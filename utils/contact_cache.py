@@ -0,0 +1,162 @@
+"""
+In-process cache of the personnes table, keyed by normalised email.
+
+The whole table is loaded on first use and reloaded when the TTL expires, when
+the fingerprint query shows the table changed, or when invalidate() is called
+after a write. personnes is edited outside the pipeline, so the fingerprint
+covers in-place updates too: row count, max id and an md5 over the cached
+columns of every row, computed by Postgres (or, on databases without md5,
+from the rows themselves). Lookups, including misses for unknown senders, are
+answered from memory and counted in contact_cache_lookups_total.
+"""
+import os
+import time
+import hashlib
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from utils.tracing import counters, increment, span
+
+CONTACT_CACHE_TTL_SECONDS = float(os.getenv("CONTACT_CACHE_TTL", "900"))
+FINGERPRINT_CHECK_SECONDS = 60
+
+PERSON_COLUMNS = [
+    "id", "name", "email", "role", "service", "company", "relation_type",
+    "project_title", "project_description", "latest_decision",
+]
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+FINGERPRINT_SQL = f"""
+    SELECT COUNT(*), MAX(id), md5(string_agg(md5(ROW({', '.join(PERSON_COLUMNS)})::text), '' ORDER BY id))
+    FROM personnes
+"""
+
+def _fingerprint(conn):
+    """(row count, max id, hash of every row), changed by inserts, deletes and updates alike"""
+    try:
+        return tuple(conn.execute(text(FINGERPRINT_SQL)).fetchone())
+    except DBAPIError:
+        rows = conn.execute(text(f"SELECT {', '.join(PERSON_COLUMNS)} FROM personnes ORDER BY id")).fetchall()
+        digest = hashlib.md5(repr([tuple(row) for row in rows]).encode()).hexdigest()
+        return len(rows), rows[-1][0] if rows else None, digest
+
+class ContactCache:
+    """Preloaded personnes rows with TTL and change detection"""
+
+    def __init__(self, ttl=CONTACT_CACHE_TTL_SECONDS, check_every=FINGERPRINT_CHECK_SECONDS, clock=time.monotonic):
+        self.ttl = ttl
+        self.check_every = check_every
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._engine = None
+        self._by_email = {}
+        self._rows = []
+        self._fingerprint = None
+        self._loaded_at = None
+        self._checked_at = None
+        self._listeners = []
+
+    def _load(self, engine):
+        with span("db.load_contacts"), engine.connect() as conn:
+            fingerprint = _fingerprint(conn)
+            rows = conn.execute(text(f"SELECT {', '.join(PERSON_COLUMNS)} FROM personnes ORDER BY id")).fetchall()
+
+        self._rows = [dict(zip(PERSON_COLUMNS, row)) for row in rows]
+        # First row wins for duplicated addresses, like the old LIMIT 1 lookup
+        by_email = {}
+        for person in self._rows:
+            by_email.setdefault(normalize_email(person["email"]), person)
+        self._by_email = by_email
+        self._engine = engine
+        self._fingerprint = fingerprint
+        self._loaded_at = self._checked_at = self._clock()
+        increment("contact_cache_reloads_total")
+        print(f"📇 Contact cache loaded: {len(self._rows)} people")
+        for listener in self._listeners:
+            listener(self._rows)
+
+    def _ensure_fresh(self, engine):
+        now = self._clock()
+        if self._engine is not engine or self._loaded_at is None or now - self._loaded_at > self.ttl:
+            self._load(engine)
+            return
+        if now - self._checked_at > self.check_every:
+            with engine.connect() as conn:
+                changed = _fingerprint(conn) != self._fingerprint
+            self._checked_at = now
+            if changed:
+                self._load(engine)
+
+    def get(self, engine, email):
+        """personnes row (as a dict) for an email, or None"""
+        with self._lock:
+            self._ensure_fresh(engine)
+            person = self._by_email.get(normalize_email(email))
+        increment("contact_cache_lookups_total", result="hit" if person else "miss")
+        return person
+
+    def refresh(self, engine):
+        """Reload now if the cache is missing, expired or stale"""
+        with self._lock:
+            self._ensure_fresh(engine)
+
+    def all(self, engine):
+        """Every cached personnes row"""
+        with self._lock:
+            self._ensure_fresh(engine)
+            return list(self._rows)
+
+    def on_reload(self, listener):
+        """Call listener(rows) after every (re)load, e.g. to rebuild a derived index"""
+        self._listeners.append(listener)
+
+    def invalidate(self):
+        """Drop the cache; the next lookup reloads personnes"""
+        with self._lock:
+            self._loaded_at = None
+
+    def hit_rate(self):
+        """Share of lookups answered with a person since the metrics were last reset"""
+        totals = {
+            dict(labels).get("result"): value
+            for (name, labels), value in counters().items()
+            if name == "contact_cache_lookups_total"
+        }
+        lookups = sum(totals.values())
+        return totals.get("hit", 0) / lookups if lookups else None
+
+CONTACTS = ContactCache()
+
+def save_person(engine, person):
+    """Insert or update a personnes row by email, then invalidate the cache"""
+    values = {column: person.get(column) for column in PERSON_COLUMNS if column != "id"}
+    with engine.begin() as conn:
+        updated = conn.execute(
+            text(
+                """
+                UPDATE personnes
+                SET name = :name, role = :role, service = :service, company = :company,
+                    relation_type = :relation_type, project_title = :project_title,
+                    project_description = :project_description, latest_decision = :latest_decision
+                WHERE LOWER(email) = LOWER(:email)
+                """
+            ),
+            values,
+        ).rowcount
+        if not updated:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO personnes (name, email, role, service, company, relation_type,
+                                           project_title, project_description, latest_decision)
+                    VALUES (:name, :email, :role, :service, :company, :relation_type,
+                            :project_title, :project_description, :latest_decision)
+                    """
+                ),
+                values,
+            )
+    CONTACTS.invalidate()
@@ -1,32 +1,106 @@
-from datetime import datetime
-from sqlalchemy import create_engine, text
-
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,
-        connect_args={"sslmode": "require"},
-    )
-
-    with engine.connect():
-        print("✅ Connected to Supabase Postgres\n")
-
-    return engine
-
-def store_email(engine, email):
-    """Store email in database"""
-    with engine.begin() as conn:
-        result = conn.execute(
-            text(
-                """
-                INSERT INTO emails (sender_email, sender_name, subject, body, received_at)
-                VALUES (:sender_email, :sender_name, :subject, :body, :received_at)
-                RETURNING id
-                """
-            ),
-            {**email, "received_at": datetime.utcnow()},
-        )
-        email_id = result.fetchone()[0]
-
-    print(f"💾 Stored email ID {email_id}")
-
-    return email_id
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import bindparam, create_engine, text
+
+from utils.tracing import traced
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def setup_database():
+    """Setup database connection (one pooled engine per DATABASE_URL, reused across calls)"""
+    url = os.getenv("DATABASE_URL")
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(
+                url,
+                pool_pre_ping=True,
+                connect_args={"sslmode": "require"},
+            )
+
+            with engine.connect():
+                print("✅ Connected to Supabase Postgres\n")
+
+            _engines[url] = engine
+
+    return engine
+
+def ensure_gmail_id_column(engine):
+    """Add emails.gmail_id, with a unique index, if it does not exist
+
+    On Postgres ADD COLUMN IF NOT EXISTS keeps processes starting together from
+    racing; SQLite (the benchmark fakes) lacks it, so the column is looked up first.
+    """
+    with engine.begin() as conn:
+        if engine.url.get_backend_name() == "sqlite":
+            missing = conn.execute(
+                text("SELECT 1 FROM pragma_table_info('emails') WHERE name = 'gmail_id'")
+            ).fetchone() is None
+            if missing:
+                conn.execute(text("ALTER TABLE emails ADD COLUMN gmail_id TEXT"))
+        else:
+            conn.execute(text("ALTER TABLE emails ADD COLUMN IF NOT EXISTS gmail_id TEXT"))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_gmail_id ON emails (gmail_id)"))
+
+def stored_gmail_ids(engine, gmail_ids):
+    """The Gmail message ids among gmail_ids that already have an emails row"""
+    if not gmail_ids:
+        return set()
+    statement = text("SELECT gmail_id FROM emails WHERE gmail_id IN :ids").bindparams(
+        bindparam("ids", expanding=True)
+    )
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(statement, {"ids": list(gmail_ids)})}
+
+@traced("db.store_email")
+def store_email(engine, email):
+    """Store email in database; None when its Gmail message is already stored"""
+    with engine.begin() as conn:
+        result = conn.execute(
+            text(
+                """
+                INSERT INTO emails (sender_email, sender_name, subject, body, received_at, gmail_id)
+                VALUES (:sender_email, :sender_name, :subject, :body, :received_at, :gmail_id)
+                ON CONFLICT (gmail_id) DO NOTHING
+                RETURNING id
+                """
+            ),
+            {"gmail_id": None, **email, "received_at": datetime.utcnow()},
+        )
+        row = result.fetchone()
+
+    if row is None:
+        print(f"⏭️ Gmail message {email.get('gmail_id')} already stored")
+        return None
+
+    email_id = row[0]
+    print(f"💾 Stored email ID {email_id}")
+
+    return email_id
+
+def load_email(engine, email_id):
+    """Load a stored email by id"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                """
+                SELECT id, sender_email, sender_name, subject, body
+                FROM emails
+                WHERE id = :email_id
+                """
+            ),
+            {"email_id": email_id},
+        ).fetchone()
+
+    if not row:
+        return None
+
+    return {
+        "email_id": row[0],
+        "sender_email": row[1],
+        "sender_name": row[2],
+        "subject": row[3],
+        "body": row[4],
+    }
@@ -0,0 +1,160 @@
+"""
+Cheap pre-classification and priority scheduling of incoming emails.
+
+Scores come from subject/body cues, the meeting date mentioned in the body and the
+sender's relation_type in personnes (read from the contact cache); no LLM call is
+involved. Higher scores are processed first, and when the queue is full the
+lowest-priority (or stale) emails are deferred to a later run.
+"""
+import re
+import heapq
+import itertools
+from datetime import date, datetime, timedelta, timezone
+
+from utils.contact_cache import CONTACTS
+
+URGENT_PATTERN = re.compile(
+    r"\b(urgent|asap|as soon as possible|immediately|urgence|au plus vite|today|aujourd'hui)\b",
+    re.I,
+)
+SOON_PATTERN = re.compile(r"\b(tomorrow|demain|this week|cette semaine)\b", re.I)
+ISO_DATE_PATTERN = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+EU_DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+
+RELATION_WEIGHTS = {
+    "meeting_client": 2.0,
+    "client": 2.0,
+    "collaboration": 1.0,
+    "collaborator": 1.0,
+    "supplier_offer": 0.5,
+    "supplier": 0.5,
+}
+
+URGENT_WEIGHT = 3.0
+SOON_WEIGHT = 1.5
+STALE_PENALTY = 3.0
+STALE_AFTER = timedelta(days=3)
+
+def extract_meeting_date(body):
+    """First explicit date found in the body (YYYY-MM-DD or DD/MM/YYYY), or None"""
+    for pattern, order in ((ISO_DATE_PATTERN, (0, 1, 2)), (EU_DATE_PATTERN, (2, 1, 0))):
+        for match in pattern.finditer(body or ""):
+            parts = [int(group) for group in match.groups()]
+            try:
+                return date(parts[order[0]], parts[order[1]], parts[order[2]])
+            except ValueError:
+                continue
+    return None
+
+def date_proximity_weight(meeting_date, today):
+    """Boost requests whose meeting date is close; past dates get nothing"""
+    if meeting_date is None:
+        return 0.0
+    days = (meeting_date - today).days
+    if days < 0:
+        return 0.0
+    if days <= 1:
+        return 3.0
+    if days <= 3:
+        return 2.0
+    if days <= 7:
+        return 1.0
+    return 0.0
+
+def score_email(email, relation_type=None, now=None):
+    """Return (priority, reasons) for an email dict from the Gmail fetcher"""
+    now = now or datetime.now(timezone.utc)
+    text_to_scan = f"{email.get('subject', '')}\n{email.get('body', '')}"
+    priority = 1.0
+    reasons = []
+
+    if URGENT_PATTERN.search(text_to_scan):
+        priority += URGENT_WEIGHT
+        reasons.append("urgent cue")
+    elif SOON_PATTERN.search(text_to_scan):
+        priority += SOON_WEIGHT
+        reasons.append("soon cue")
+
+    proximity = date_proximity_weight(extract_meeting_date(email.get("body")), now.date())
+    if proximity:
+        priority += proximity
+        reasons.append("near date")
+
+    relation_weight = RELATION_WEIGHTS.get((relation_type or "").lower(), 0.0)
+    if relation_weight:
+        priority += relation_weight
+        reasons.append(f"relation {relation_type}")
+
+    received_at = email.get("received_at")
+    if received_at is not None and now - received_at > STALE_AFTER:
+        priority -= STALE_PENALTY
+        reasons.append("stale")
+
+    return priority, reasons
+
+def lookup_relation_types(engine, sender_emails):
+    """Map sender email -> relation_type from the in-memory contact cache"""
+    relations = {}
+    for email in {email.lower() for email in sender_emails if email}:
+        person = CONTACTS.get(engine, email)
+        if person:
+            relations[email] = person["relation_type"]
+    return relations
+
+class EmailPriorityQueue:
+    """Bounded max-priority queue; overflow and stale emails are deferred"""
+
+    def __init__(self, max_size=20):
+        self.max_size = max_size
+        self.deferred = []
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, email, priority, reasons=()):
+        """Queue an email; returns False when it was deferred instead"""
+        entry = (-priority, next(self._counter), email, list(reasons))
+
+        if "stale" in reasons and len(self._heap) >= self.max_size // 2:
+            self.deferred.append((email, priority))
+            return False
+
+        if len(self._heap) < self.max_size:
+            heapq.heappush(self._heap, entry)
+            return True
+
+        # Full: keep whichever of the new email and the current lowest priority wins
+        lowest = max(self._heap)
+        if entry < lowest:
+            self._heap.remove(lowest)
+            heapq.heapify(self._heap)
+            heapq.heappush(self._heap, entry)
+            self.deferred.append((lowest[2], -lowest[0]))
+            return True
+
+        self.deferred.append((email, priority))
+        return False
+
+    def pop(self):
+        """Highest-priority email as (email, priority, reasons), or None when empty"""
+        if not self._heap:
+            return None
+        negative_priority, _, email, reasons = heapq.heappop(self._heap)
+        return email, -negative_priority, reasons
+
+def build_queue(engine, emails, max_size=20, now=None):
+    """Score a batch of fetched emails and load them into a priority queue"""
+    relations = lookup_relation_types(engine, [email["sender_email"] for email in emails])
+    queue = EmailPriorityQueue(max_size=max_size)
+
+    for email in emails:
+        relation_type = relations.get(email["sender_email"].lower())
+        priority, reasons = score_email(email, relation_type=relation_type, now=now)
+        queue.push(email, priority, reasons)
+
+    for email, priority in queue.deferred:
+        print(f"⏸️ Deferred (priority {priority:.1f}): {email['subject']}")
+
+    return queue
@@ -0,0 +1,124 @@
+"""
+In-memory free/busy index shared by the calendar tools.
+
+Each (token_file, calendar_id) key keeps the windows already fetched from the
+freebusy API and the busy intervals seen inside them. A query fully covered by
+unexpired windows is answered locally; otherwise one freebusy call for all the
+calendars and the span that are missing refreshes the index. Events created through the tools are written
+through so the index stays consistent until the TTL expires.
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+
+from utils.calendar_slots import merge_intervals
+from utils.tracing import increment
+
+FREEBUSY_TTL_SECONDS = float(os.getenv("FREEBUSY_CACHE_TTL", "300"))
+
+def _subtract(intervals, start, end):
+    """Pieces of the intervals lying outside [start, end)"""
+    pieces = []
+    for busy_start, busy_end in intervals:
+        if busy_end <= start or busy_start >= end:
+            pieces.append((busy_start, busy_end))
+            continue
+        if busy_start < start:
+            pieces.append((busy_start, start))
+        if busy_end > end:
+            pieces.append((end, busy_end))
+    return pieces
+
+class _CalendarEntry:
+    def __init__(self):
+        self.windows = []  # (start, end, fetched_at)
+        self.busy = []     # merged, sorted (start, end)
+
+    def drop_expired(self, now, ttl):
+        self.windows = [window for window in self.windows if now - window[2] < ttl]
+
+    def missing(self, start, end):
+        """(start, end) span not covered by fetched windows, or None when fully covered"""
+        gaps = [(start, end)]
+        for window_start, window_end, _ in self.windows:
+            gaps = _subtract(gaps, window_start, window_end)
+            if not gaps:
+                return None
+        return gaps[0][0], gaps[-1][1]
+
+    def store(self, start, end, busy, now):
+        self.busy = merge_intervals(_subtract(self.busy, start, end) + list(busy))
+        self.windows.append((start, end, now))
+
+    def overlapping(self, start, end):
+        index = max(bisect_left(self.busy, (start,)) - 1, 0)
+        found = []
+        for busy_start, busy_end in self.busy[index:]:
+            if busy_start >= end:
+                break
+            if busy_end > start:
+                found.append((busy_start, busy_end))
+        return found
+
+class FreeBusyIndex:
+    """Per-calendar cache of busy intervals with a TTL on fetched windows"""
+
+    def __init__(self, ttl=FREEBUSY_TTL_SECONDS, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def busy_between(self, keys, start, end, fetch):
+        """{key: busy intervals overlapping [start, end)} for several calendars at once.
+
+        fetch(missing_keys, time_min, time_max) is called once for every key that
+        is not fully cached and returns {key: intervals}; keys it leaves out (e.g.
+        calendars the API reported errors for) are not cached.
+        """
+        found, missing_keys, span_start, span_end = {}, [], None, None
+        with self._lock:
+            now = self._clock()
+            for key in keys:
+                entry = self._entries.setdefault(key, _CalendarEntry())
+                entry.drop_expired(now, self.ttl)
+                missing = entry.missing(start, end)
+                if missing is None:
+                    found[key] = entry.overlapping(start, end)
+                    continue
+                missing_keys.append(key)
+                span_start = missing[0] if span_start is None else min(span_start, missing[0])
+                span_end = missing[1] if span_end is None else max(span_end, missing[1])
+
+        if found:
+            increment("freebusy_cache_requests_total", len(found), result="hit")
+        if not missing_keys:
+            return found
+
+        increment("freebusy_cache_requests_total", len(missing_keys), result="miss")
+        fetched = fetch(missing_keys, span_start, span_end)
+
+        with self._lock:
+            now = self._clock()
+            for key, busy in fetched.items():
+                entry = self._entries.setdefault(key, _CalendarEntry())
+                entry.store(span_start, span_end, busy, now)
+                found[key] = entry.overlapping(start, end)
+        return found
+
+    def add_busy(self, key, start, end):
+        """Write-through for an event just created on the calendar"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.busy = merge_intervals(entry.busy + [(start, end)])
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+FREEBUSY_INDEX = FreeBusyIndex()
@@ -1,81 +1,122 @@
-import os
-import base64
-from email import message_from_bytes
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-
-SUBJECT_KEYWORDS = ["meet", "meeting", "collaboration", "client", "partenaria"]
-MAX_BODY_LENGTH = 2000
-
-def setup_gmail():
-    """Setup Gmail API connection"""
-    print("🔐 Setting up Gmail...")
-    
-    SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
-    creds = None
-    
-    if os.path.exists("credentials/token.json"):
-        creds = Credentials.from_authorized_user_file("credentials/token.json", SCOPES)
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open("credentials/token.json", "w") as token:
-            token.write(creds.to_json())
-
-    print("✅ Gmail connected\n")
-    return build("gmail", "v1", credentials=creds)
-
-def is_relevant_subject(subject: str) -> bool:
-    """Check if email subject contains relevant keywords"""
-    return any(keyword in subject.lower() for keyword in SUBJECT_KEYWORDS)
-
-def fetch_one_email(gmail_service):
-    """Fetch one relevant email from Gmail"""
-    results = gmail_service.users().messages().list(userId="me", maxResults=10).execute()
-    messages = results.get("messages", [])
-
-    for msg in messages:
-        raw_msg = gmail_service.users().messages().get(userId="me", id=msg["id"], format="raw").execute()
-        decoded = base64.urlsafe_b64decode(raw_msg["raw"])
-        mime_msg = message_from_bytes(decoded)
-
-        subject = mime_msg.get("Subject", "No Subject")
-        if not is_relevant_subject(subject):
-            continue
-
-        # Extract body
-        body = ""
-        if mime_msg.is_multipart():
-            for part in mime_msg.walk():
-                if part.get_content_type() == "text/plain":
-                    body = part.get_payload(decode=True).decode(errors="ignore")
-                    break
-        else:
-            body = mime_msg.get_payload(decode=True).decode(errors="ignore")
-
-        from_header = mime_msg.get("From", "")
-        if "<" in from_header:
-            sender_name = from_header.split("<")[0].strip().strip('"')
-            sender_email = from_header.split("<")[1].split(">")[0]
-        else:
-            sender_name = from_header
-            sender_email = from_header
-
-        email = {
-            "sender_email": sender_email,
-            "sender_name": sender_name,
-            "subject": subject,
-            "body": body[:MAX_BODY_LENGTH],
-        }
-
-        print(f"✅ Relevant email found: {subject}")
-        return email
-
-    print("⏳ No relevant email found")
-    return None
\ No newline at end of file
+import os
+import base64
+from datetime import datetime, timezone
+from email import message_from_bytes
+from email.utils import parsedate_to_datetime
+
+from utils.google_services import forget, get_service
+from utils.tracing import traced
+
+SUBJECT_KEYWORDS = ["meet", "meeting", "collaboration", "client", "partenaria"]
+MAX_BODY_LENGTH = 2000
+
+def setup_gmail():
+    """Setup Gmail API connection"""
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    print("🔐 Setting up Gmail...")
+    
+    SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+    TOKEN_FILE = "credentials/token.json"
+    
+    creds = None
+    if os.path.exists(TOKEN_FILE):
+        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+
+    # Interactive consent only when there is no token that can be refreshed
+    if not creds or not (creds.valid or creds.refresh_token):
+        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+        creds = flow.run_local_server(port=0)
+        with open(TOKEN_FILE, "w") as token:
+            token.write(creds.to_json())
+        forget(TOKEN_FILE)
+
+    service = get_service("gmail", "v1", TOKEN_FILE, SCOPES)
+    print("✅ Gmail connected\n")
+    return service
+
+def is_relevant_subject(subject: str) -> bool:
+    """Check if email subject contains relevant keywords"""
+    return any(keyword in subject.lower() for keyword in SUBJECT_KEYWORDS)
+
+def parse_gmail_message(raw_msg):
+    """Turn a raw Gmail message into an email dict, or None if the subject is not relevant"""
+    decoded = base64.urlsafe_b64decode(raw_msg["raw"])
+    mime_msg = message_from_bytes(decoded)
+
+    subject = mime_msg.get("Subject", "No Subject")
+    if not is_relevant_subject(subject):
+        return None
+
+    # Extract body
+    body = ""
+    if mime_msg.is_multipart():
+        for part in mime_msg.walk():
+            if part.get_content_type() == "text/plain":
+                body = part.get_payload(decode=True).decode(errors="ignore")
+                break
+    else:
+        body = mime_msg.get_payload(decode=True).decode(errors="ignore")
+
+    from_header = mime_msg.get("From", "")
+    if "<" in from_header:
+        sender_name = from_header.split("<")[0].strip().strip('"')
+        sender_email = from_header.split("<")[1].split(">")[0]
+    else:
+        sender_name = from_header
+        sender_email = from_header
+
+    # Gmail's internalDate (ms since epoch) is authoritative; fall back to the Date header
+    received_at = None
+    if raw_msg.get("internalDate"):
+        received_at = datetime.fromtimestamp(int(raw_msg["internalDate"]) / 1000, tz=timezone.utc)
+    elif mime_msg.get("Date"):
+        try:
+            received_at = parsedate_to_datetime(mime_msg["Date"])
+        except (TypeError, ValueError):
+            received_at = None
+
+    return {
+        "sender_email": sender_email,
+        "sender_name": sender_name,
+        "subject": subject,
+        "body": body[:MAX_BODY_LENGTH],
+        "gmail_id": raw_msg.get("id"),
+        "received_at": received_at,
+    }
+
+def iter_relevant_emails(gmail_service, max_results=10, skip_ids=None):
+    """Yield relevant emails among the latest max_results messages, fetching them lazily
+
+    skip_ids(message ids) returns the ids not to fetch (e.g. the ones already
+    stored), so processed messages cost no further API call.
+    """
+    results = gmail_service.users().messages().list(userId="me", maxResults=max_results).execute()
+    messages = results.get("messages", [])
+    if skip_ids is not None and messages:
+        skipped = skip_ids([msg["id"] for msg in messages])
+        messages = [msg for msg in messages if msg["id"] not in skipped]
+
+    for msg in messages:
+        raw_msg = gmail_service.users().messages().get(userId="me", id=msg["id"], format="raw").execute()
+        email = parse_gmail_message(raw_msg)
+        if email is not None:
+            yield email
+
+@traced("gmail.fetch_one_email")
+def fetch_one_email(gmail_service, skip_ids=None):
+    """Fetch one relevant email from Gmail"""
+    for email in iter_relevant_emails(gmail_service, skip_ids=skip_ids):
+        print(f"✅ Relevant email found: {email['subject']}")
+        return email
+
+    print("⏳ No relevant email found")
+    return None
+
+@traced("gmail.fetch_relevant_emails")
+def fetch_relevant_emails(gmail_service, max_results=50, skip_ids=None):
+    """Fetch every relevant email among the latest max_results messages"""
+    emails = list(iter_relevant_emails(gmail_service, max_results=max_results, skip_ids=skip_ids))
+    print(f"📥 {len(emails)} relevant email(s) fetched")
+    return emails
@@ -0,0 +1,72 @@
+"""
+Shared Google API clients.
+
+Credentials are loaded once per token file and refreshed shortly before they
+expire, and the refreshed token is written back to disk. Built service objects
+are cached per thread, because their httplib2 transport is not thread-safe. Each
+thread therefore reuses its own connection and skips rebuilding the client.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+
+REFRESH_MARGIN = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_credentials = {}
+_local = threading.local()
+
+def _needs_refresh(creds):
+    if not creds.valid:
+        return True
+    return creds.expiry is not None and creds.expiry - datetime.utcnow() < REFRESH_MARGIN
+
+def get_credentials(token_file, scopes=None):
+    """Credentials for token_file, refreshed proactively when close to expiry"""
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
+
+    with _lock:
+        creds = _credentials.get(token_file)
+        if creds is None:
+            creds = Credentials.from_authorized_user_file(token_file, scopes)
+            _credentials[token_file] = creds
+
+        if _needs_refresh(creds) and creds.refresh_token:
+            print(f"🔄 Refreshing Google credentials ({os.path.basename(token_file)})")
+            creds.refresh(Request())
+            with open(token_file, "w") as token:
+                token.write(creds.to_json())
+        return creds
+
+def get_service(api, version, token_file, scopes=None):
+    """Cached googleapiclient service for this thread, with credentials kept fresh"""
+    creds = get_credentials(token_file, scopes)
+
+    services = getattr(_local, "services", None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (api, version, token_file)
+    service = services.get(key)
+    if service is None:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build
+
+        # The refreshed credentials object is shared, so cached clients see new tokens
+        http = AuthorizedHttp(creds, http=httplib2.Http())
+        service = services[key] = build(api, version, http=http, cache_discovery=False)
+    return service
+
+def forget(token_file=None):
+    """Drop cached credentials (all, or one token file), e.g. after re-authorization"""
+    with _lock:
+        if token_file is None:
+            _credentials.clear()
+        else:
+            _credentials.pop(token_file, None)
+    services = getattr(_local, "services", None)
+    if services is not None:
+        for key in [key for key in services if token_file is None or key[2] == token_file]:
+            del services[key]
@@ -0,0 +1,500 @@
+"""
+Vector index over past meetings and recommendations, used as advisor context.
+
+Every meetings row (project and topic) and recommendations row (task or advice)
+is embedded once on the CPU and appended to a float32 matrix memory-mapped from
+HISTORY_INDEX_DIR. sync() only reads rows with ids above the stored high-water
+marks, so updates are incremental across runs.
+
+Search is exact below IVF_MIN_ROWS. Above it, rows are bucketed by a spherical
+k-means coarse quantiser (retrained when the index has doubled), and a query
+only scores the IVF_PROBES closest buckets plus the rows appended since the
+buckets were last rebuilt, which keeps it in the low milliseconds at hundreds of
+thousands of rows.
+
+The embedder is a sentence-transformers model when the package is installed
+(HISTORY_EMBED_MODEL), otherwise signed feature hashing of words and word pairs.
+
+The pipeline and the dashboard may share HISTORY_INDEX_DIR, so sync(), add()
+and remove() hold an exclusive lock on index.lock and reload the index when
+another process changed it. Rows deleted from the database (compact_recommendations)
+are recorded with remove() and left out of search results.
+"""
+import os
+import json
+import time
+import zlib
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+    fcntl = None
+
+import numpy as np
+from sqlalchemy import text
+
+from utils.contact_resolver import normalize_name
+from utils.tracing import increment, span
+
+HISTORY_INDEX_DIR = os.getenv("HISTORY_INDEX_DIR", "data/history_index")
+HISTORY_EMBED_MODEL = os.getenv("HISTORY_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HISTORY_SYNC_SECONDS = 30
+HISTORY_TOP_K = 6
+
+HASHING_DIM = 128
+IVF_MIN_ROWS = 20000
+IVF_PROBES = 12
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE = 20000
+# Rows appended after the buckets were built are scanned exhaustively up to this many
+MAX_TAIL_ROWS = 2000
+
+# Same-project and same-sender history ranks above an equally similar stranger's
+PROJECT_BOOST = 0.1
+SENDER_BOOST = 0.05
+SYNC_BATCH = 1000
+
+class HashingEmbedder:
+    """Signed feature hashing of normalised words and word pairs; needs no model"""
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    @lru_cache(maxsize=65536)
+    def _feature(self, token):
+        digest = zlib.crc32(token.encode())
+        return digest % self.dim, 1.0 if digest & 0x80000000 else -1.0
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, value in enumerate(texts):
+            words = normalize_name(value).split()
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                column, sign = self._feature(token)
+                vectors[row, column] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-9)
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model pinned to the CPU"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+def get_embedder(model_name=HISTORY_EMBED_MODEL):
+    """sentence-transformers model if available, else the hashing embedder"""
+    if model_name and model_name != "hashing":
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            print("⚠️ sentence-transformers not installed, using hashed word features for history search")
+    return HashingEmbedder()
+
+def _spherical_kmeans(vectors, n_clusters, rng):
+    """Unit-norm centroids maximising cosine similarity to their members"""
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-9)
+    return centroids.astype(np.float32)
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on path, held by one process at a time (blocks until free)"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class HistoryIndex:
+    """Memory-mapped embedding matrix with row metadata and an IVF search structure"""
+
+    def __init__(self, directory=HISTORY_INDEX_DIR, embedder=None, sync_every=HISTORY_SYNC_SECONDS,
+                 clock=time.monotonic):
+        self.directory = directory
+        self.sync_every = sync_every
+        self._embedder = embedder
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._opened = False
+        self._synced_at = None
+        self._state_stamp = None
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    # ---- storage ------------------------------------------------------------
+
+    def _reset(self, database=None):
+        self.state = {
+            "embedder": self.embedder.name,
+            "dim": self.embedder.dim,
+            "database": database,
+            "count": 0,
+            "last_ids": {"meeting": 0, "recommendation": 0},
+            "trained_rows": 0,
+            "removed": {},
+        }
+        for name in ("vectors.f32", "rows.jsonl", "assignment.npy", "centroids.npy"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._capacity = 0
+        self._vectors = np.zeros((0, self.state["dim"]), dtype=np.float32)
+        self._rows = []
+        self._projects, self._senders, self._email_ids = [], [], []
+        self._codes = {}
+        self._positions = {}
+        self._assignment = np.zeros(0, dtype=np.int32)
+        self._centroids = None
+        self._buckets = None
+        self._columns = None
+
+    def _open(self):
+        if self._opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        state = None
+        if os.path.exists(self._path("state.json")):
+            with open(self._path("state.json")) as f:
+                state = json.load(f)
+        if not state or state["embedder"] != self.embedder.name:
+            self._reset()
+        else:
+            self.state = state
+            self.state.setdefault("removed", {})
+            self._capacity = 0
+            self._vectors = np.zeros((0, state["dim"]), dtype=np.float32)
+            self._reserve(state["count"])
+            self._rows, self._projects, self._senders, self._email_ids = [], [], [], []
+            self._codes = {}
+            self._positions = {}
+            with open(self._path("rows.jsonl"), "a+b") as f:
+                f.seek(0)
+                for _ in range(state["count"]):
+                    line = f.readline()
+                    if not line:
+                        break
+                    self._remember(json.loads(line))
+                # Rows appended by a process that died before saving the state have no vectors
+                f.truncate(f.tell())
+            self._centroids = np.load(self._path("centroids.npy")) if state["trained_rows"] else None
+            self._assignment = np.load(self._path("assignment.npy")) if self._centroids is not None else None
+            self._buckets = None
+            self._columns = None
+            if self._assignment is not None and len(self._assignment) < state["count"]:
+                self._assign_tail()
+        self._state_stamp = self._stamp()
+        self._opened = True
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self._path("state.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @contextmanager
+    def _exclusive(self):
+        """Thread and process lock for writes; reloads the index if another process saved it meanwhile"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with _file_lock(self._path("index.lock")):
+                if self._opened and self._stamp() != self._state_stamp:
+                    self._opened = False
+                self._open()
+                yield
+
+    def _reserve(self, rows):
+        """Grow the memory-mapped matrix (doubling) so it holds at least rows vectors"""
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, 2 * self._capacity, 1024)
+        with open(self._path("vectors.f32"), "a+b") as f:
+            f.truncate(capacity * self.state["dim"] * 4)
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.state["dim"]))
+        self._capacity = capacity
+
+    def _code(self, value):
+        return self._codes.setdefault(normalize_name(value), len(self._codes) + 1) if value else 0
+
+    def _remember(self, row):
+        self._positions[(row.get("source"), row.get("id"))] = len(self._rows)
+        self._rows.append(row)
+        self._projects.append(self._code(row.get("project_title")))
+        self._senders.append(self._code(row.get("sender_email")))
+        self._email_ids.append(row.get("email_id") or 0)
+        self._columns = None
+
+    def _metadata(self):
+        """(project codes, sender codes, email ids, removed row positions) as arrays"""
+        if self._columns is None:
+            removed = [
+                self._positions[(source, row_id)]
+                for source, ids in self.state["removed"].items()
+                for row_id in ids
+                if (source, row_id) in self._positions
+            ]
+            self._columns = (
+                np.array(self._projects),
+                np.array(self._senders),
+                np.array(self._email_ids),
+                np.array(removed, dtype=np.int64),
+            )
+        return self._columns
+
+    def _save_state(self):
+        temporary = self._path("state.json.tmp")
+        with open(temporary, "w") as f:
+            json.dump(self.state, f)
+        os.replace(temporary, self._path("state.json"))
+        self._state_stamp = self._stamp()
+
+    # ---- updates --------------------------------------------------------------
+
+    def add(self, rows):
+        """Embed and append rows (dicts with at least 'text'); returns how many were added"""
+        with self._exclusive():
+            return self._add(rows)
+
+    def _add(self, rows):
+        if not rows:
+            return 0
+        vectors = self.embedder.embed([row["text"] for row in rows])
+        start = self.state["count"]
+        self._reserve(start + len(rows))
+        self._vectors[start:start + len(rows)] = vectors
+        self._vectors.flush()
+        with open(self._path("rows.jsonl"), "a") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + "\n")
+                self._remember(row)
+        self.state["count"] += len(rows)
+        for row in rows:
+            source = row.get("source")
+            if source in self.state["last_ids"]:
+                self.state["last_ids"][source] = max(self.state["last_ids"][source], row["id"])
+
+        count = self.state["count"]
+        if count >= IVF_MIN_ROWS and (self._centroids is None or count > 2 * self.state["trained_rows"]):
+            self._train()
+        elif self._centroids is not None:
+            self._assign_tail()
+        self._save_state()
+        increment("history_index_rows_added_total", len(rows))
+        return len(rows)
+
+    def _train(self):
+        count = self.state["count"]
+        with span("history.train_ivf", rows=count):
+            rng = np.random.default_rng(count)
+            sample = self._vectors[np.sort(rng.choice(count, min(count, KMEANS_SAMPLE), replace=False))]
+            self._centroids = _spherical_kmeans(np.asarray(sample), int(np.sqrt(count)), rng)
+            self._assignment = np.zeros(0, dtype=np.int32)
+            self._assign_tail()
+        self._buckets = None
+        self.state["trained_rows"] = count
+        np.save(self._path("centroids.npy"), self._centroids)
+        print(f"🧭 History index bucketed: {count} rows into {len(self._centroids)} lists")
+
+    def _assign_tail(self):
+        """Bucket the rows appended since the last assignment"""
+        start, count = len(self._assignment), self.state["count"]
+        parts = [self._assignment]
+        for chunk in range(start, count, 50000):
+            block = np.asarray(self._vectors[chunk:min(chunk + 50000, count)])
+            parts.append(np.argmax(block @ self._centroids.T, axis=1).astype(np.int32))
+        self._assignment = np.concatenate(parts)
+        np.save(self._path("assignment.npy"), self._assignment)
+
+    def _bucket_rows(self):
+        """(order, starts, indexed) with rows of bucket b at order[starts[b]:starts[b + 1]]"""
+        count = self.state["count"]
+        if self._buckets is None or count - self._buckets[2] > MAX_TAIL_ROWS:
+            indexed = len(self._assignment)
+            order = np.argsort(self._assignment, kind="stable").astype(np.int32)
+            starts = np.searchsorted(self._assignment[order], np.arange(len(self._centroids) + 1))
+            self._buckets = (order, starts, indexed)
+        return self._buckets
+
+    def remove(self, source, ids):
+        """Leave rows deleted from the database out of search results; returns how many were new"""
+        with self._exclusive():
+            removed = self.state["removed"].setdefault(source, [])
+            new = sorted(set(ids) - set(removed))
+            if new:
+                removed.extend(new)
+                self._columns = None
+                self._save_state()
+            return len(new)
+
+    def sync(self, engine, force=False):
+        """Index meetings and recommendations rows newer than the stored high-water marks"""
+        with self._lock:
+            now = self._clock()
+            if not force and self._synced_at is not None and now - self._synced_at < self.sync_every:
+                return 0
+            with self._exclusive():
+                return self._sync(engine, now)
+
+    def _sync(self, engine, now):
+        database = engine.url.render_as_string(hide_password=True)
+        if self.state["database"] != database:
+            if self.state["database"] is not None:
+                print("♻️ History index belongs to another database, rebuilding")
+            self._reset(database)
+            self._save_state()
+
+        added = 0
+        with span("history.sync"), engine.connect() as conn:
+            for source, query in (("meeting", MEETINGS_QUERY), ("recommendation", RECOMMENDATIONS_QUERY)):
+                while True:
+                    rows = conn.execute(
+                        text(query), {"after": self.state["last_ids"][source], "limit": SYNC_BATCH}
+                    ).mappings().fetchall()
+                    if not rows:
+                        break
+                    added += self._add([history_row(source, row) for row in rows])
+        self._synced_at = now
+        if added:
+            print(f"🗂️ History index: +{added} rows ({self.state['count']} total)")
+        return added
+
+    # ---- search ---------------------------------------------------------------
+
+    def _candidates(self, vector, probes):
+        count = self.state["count"]
+        if self._centroids is None or probes is None:
+            return np.arange(count)
+        order, starts, indexed = self._bucket_rows()
+        closest = np.argpartition(-(self._centroids @ vector), probes - 1)[:probes]
+        parts = [order[starts[b]:starts[b + 1]] for b in closest]
+        parts.append(np.arange(indexed, count, dtype=np.int32))
+        return np.concatenate(parts)
+
+    def search(self, query, k=HISTORY_TOP_K, project_title=None, sender_email=None, exclude_email_id=None,
+               probes=IVF_PROBES):
+        """Top-k rows most similar to query, each a row dict with a 'score'; probes=None scans everything"""
+        with self._lock:
+            self._open()
+            if not self.state["count"]:
+                return []
+            vector = self.embedder.embed([query])[0]
+            if self._centroids is None:
+                probes = None
+            elif probes:
+                probes = min(probes, len(self._centroids))
+            with span("history.search", rows=self.state["count"]):
+                candidates = self._candidates(vector, probes)
+                scores = np.asarray(self._vectors[candidates]) @ vector
+                projects, senders, email_ids, removed = self._metadata()
+                if project_title:
+                    scores += PROJECT_BOOST * (projects[candidates] == self._code(project_title))
+                if sender_email:
+                    scores += SENDER_BOOST * (senders[candidates] == self._code(sender_email))
+                if exclude_email_id:
+                    scores[email_ids[candidates] == exclude_email_id] = -np.inf
+                if len(removed):
+                    scores[np.isin(candidates, removed)] = -np.inf
+                k = min(k, len(candidates))
+                if not k:
+                    return []
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                return [{**self._rows[candidates[i]], "score": round(float(scores[i]), 3)}
+                        for i in top if np.isfinite(scores[i])]
+
+MEETINGS_QUERY = """
+    SELECT m.id, m.email_id, m.project_title, m.meeting_topic, m.meeting_date, e.sender_email
+    FROM meetings m
+    LEFT JOIN emails e ON e.id = m.email_id
+    WHERE m.id > :after
+    ORDER BY m.id
+    LIMIT :limit
+"""
+
+RECOMMENDATIONS_QUERY = """
+    SELECT r.id, r.email_id, r.project_title, r.type, r.content, r.created_at, e.sender_email
+    FROM recommendations r
+    LEFT JOIN emails e ON e.id = r.email_id
+    WHERE r.id > :after
+    ORDER BY r.id
+    LIMIT :limit
+"""
+
+def history_row(source, row):
+    """Index metadata (and the text that gets embedded) for a meetings or recommendations row"""
+    project = row["project_title"] or "Unknown project"
+    if source == "meeting":
+        when, text_value = row["meeting_date"], f"Meeting on {project}: {row['meeting_topic']}"
+    else:
+        when, text_value = row["created_at"], f"{(row['type'] or 'note').capitalize()} for {project}: {row['content']}"
+    return {
+        "source": source,
+        "id": row["id"],
+        "email_id": row["email_id"],
+        "project_title": row["project_title"],
+        "sender_email": row["sender_email"],
+        "date": str(when)[:10] if when else None,
+        "text": text_value,
+    }
+
+HISTORY = HistoryIndex()
+
+def related_history(engine, parsed_email, person_context, email_id=None, k=HISTORY_TOP_K):
+    """Bullet lines of past meetings/recommendations related to this request, for the advisor prompt"""
+    try:
+        tasks = parsed_email.get("tasks_requested") or []
+        query = " ".join(str(value) for value in (
+            parsed_email.get("project_title"),
+            parsed_email.get("meeting_topic"),
+            tasks if isinstance(tasks, str) else " ".join(str(task) for task in tasks),
+        ) if value)
+        HISTORY.sync(engine)
+        matches = HISTORY.search(
+            query,
+            k=k,
+            project_title=parsed_email.get("project_title"),
+            sender_email=person_context.get("email"),
+            exclude_email_id=email_id,
+        )
+    except Exception as e:
+        print(f"⚠️ History search failed: {e}")
+        return "No related history available"
+    if not matches:
+        return "No related history recorded"
+    return "\n".join(f"- [{match['date'] or 'undated'}] {match['text']}" for match in matches)
@@ -0,0 +1,190 @@
+"""
+Deferred advice generation.
+
+With LAZY_ADVICE=1 (or `--lazy-advice`), the pipeline skips the advisor and
+stores ADVICE_PENDING as the advice checkpoint. Advice is generated the first
+time it is needed: when the meeting is opened in the dashboard, or when
+`python -m utils.lazy_advice` (run from cron) finds a pending meeting whose date
+is close. Generation calls the advisor tools directly, without an agent loop,
+and the result is memoized in recommendations; the checkpoint doubles as a
+claim so two viewers never generate the same advice twice.
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from utils.notifications import parse_meeting_day
+from utils.pipeline_state import record_failure, save_stage
+from utils.tracing import increment, span
+from utils.usage_ledger import LEDGER, usage_scope
+
+ADVICE_PENDING = "ADVICE PENDING"
+ADVICE_GENERATING = "ADVICE GENERATING"
+ADVICE_STORED = "ADVICE GENERATED AND STORED"
+CLAIM_TIMEOUT = timedelta(minutes=10)
+DUE_WITHIN_DAYS = 2
+
+def lazy_advice_enabled():
+    return os.getenv("LAZY_ADVICE", "").lower() in {"1", "true", "yes"}
+
+def mark_advice_pending(engine, email_id):
+    """Advice checkpoint for a pipeline run that leaves generation for later"""
+    save_stage(engine, email_id, "advice", ADVICE_PENDING)
+
+def load_recommendations(engine, email_id):
+    """Stored tasks and advice for an email, tasks first"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                """
+                SELECT id, type, content, completed, created_at
+                FROM recommendations
+                WHERE email_id = :email_id
+                ORDER BY type DESC, created_at DESC
+                """
+            ),
+            {"email_id": email_id},
+        ).mappings().fetchall()
+    return [dict(row) for row in rows]
+
+def advice_status(engine, email_id):
+    """The advice checkpoint of an email (None when the pipeline never reached it)"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT advice FROM pipeline_state WHERE email_id = :email_id"),
+            {"email_id": email_id},
+        ).fetchone()
+    return row[0] if row else None
+
+def _claim(engine, email_id):
+    """Move a pending (or abandoned) checkpoint to ADVICE_GENERATING; True if this caller won"""
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        claimed = conn.execute(
+            text(
+                """
+                UPDATE pipeline_state
+                SET advice = :generating, updated_at = :now
+                WHERE email_id = :email_id
+                  AND (advice = :pending OR (advice = :generating AND updated_at < :stale_before))
+                """
+            ),
+            {
+                "email_id": email_id,
+                "pending": ADVICE_PENDING,
+                "generating": ADVICE_GENERATING,
+                "now": now,
+                "stale_before": now - CLAIM_TIMEOUT,
+            },
+        ).rowcount
+    return claimed == 1
+
+def load_parsed_meeting(engine, email_id):
+    """The stored meetings row of an email, shaped like the parser output, plus the sender"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                """
+                SELECT e.sender_email, e.sender_name, m.sender_role, m.project_title, m.meeting_topic,
+                       m.relation_type, m.meeting_date, m.meeting_time, m.duration, m.urgent,
+                       m.tasks_requested, m.documents_to_prepare, m.confirmation_status
+                FROM emails e
+                JOIN meetings m ON m.email_id = e.id
+                WHERE e.id = :email_id
+                ORDER BY m.id DESC
+                LIMIT 1
+                """
+            ),
+            {"email_id": email_id},
+        ).mappings().fetchone()
+    if not row:
+        return None
+
+    meeting = dict(row)
+    for field in ("tasks_requested", "documents_to_prepare"):
+        try:
+            meeting[field] = json.loads(meeting[field] or "[]")
+        except (TypeError, ValueError):
+            meeting[field] = [meeting[field]]
+    return meeting
+
+def generate_stored_advice(engine, email_id):
+    """Run fetch_person_context -> generate_advice -> store_advice for a stored meeting"""
+    from agents.advisor_agent import fetch_person_context, generate_advice, store_advice
+
+    meeting = load_parsed_meeting(engine, email_id)
+    if meeting is None:
+        raise ValueError(f"No parsed meeting stored for email {email_id}")
+    sender_email = meeting.pop("sender_email")
+    sender_name = meeting.pop("sender_name") or ""
+
+    LEDGER.bind(engine)
+    with usage_scope(email_id=email_id), span("advice.generate_lazy", email_id=email_id):
+        person = fetch_person_context.func(sender_email, sender_name)
+        advice = generate_advice.func(meeting, person, email_id)
+        store_advice.func(email_id, meeting["project_title"], advice["tasks"], advice["advice"])
+
+def ensure_advice(engine, email_id):
+    """Recommendations for an email, generating them first if its advice is still pending"""
+    recommendations = load_recommendations(engine, email_id)
+    if recommendations or not _claim(engine, email_id):
+        increment("lazy_advice_requests_total", result="memoized" if recommendations else "skipped")
+        return recommendations
+
+    print(f"🧠 Generating deferred advice for email {email_id}...")
+    try:
+        generate_stored_advice(engine, email_id)
+    except Exception as e:
+        # Hand the claim back so the next view or cron run can retry
+        mark_advice_pending(engine, email_id)
+        record_failure(engine, email_id, e)
+        increment("lazy_advice_requests_total", result="failed")
+        print(f"❌ Deferred advice failed for email {email_id}: {e}")
+        return []
+
+    save_stage(engine, email_id, "advice", ADVICE_STORED)
+    increment("lazy_advice_requests_total", result="generated")
+    return load_recommendations(engine, email_id)
+
+def generate_due_advice(engine, within_days=DUE_WITHIN_DAYS, today=None):
+    """Generate pending advice for meetings within the next within_days days; returns how many"""
+    today = today or date.today()
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                """
+                SELECT ps.email_id, m.meeting_date
+                FROM pipeline_state ps
+                JOIN meetings m ON m.email_id = ps.email_id
+                WHERE ps.advice = :pending
+                """
+            ),
+            {"pending": ADVICE_PENDING},
+        ).fetchall()
+
+    due = []
+    for email_id, meeting_date in rows:
+        day = parse_meeting_day(meeting_date)
+        if day is not None and today <= day <= today + timedelta(days=within_days):
+            due.append(email_id)
+
+    print(f"⏰ {len(due)} pending advice request(s) due within {within_days} day(s)")
+    generated = 0
+    for email_id in sorted(set(due)):
+        ensure_advice(engine, email_id)
+        generated += advice_status(engine, email_id) == ADVICE_STORED
+    return generated
+
+if __name__ == "__main__":
+    import utils.bootstrap  # noqa: F401
+    from utils.database import setup_database
+
+    parser = argparse.ArgumentParser(description="Generate deferred advice for meetings that are coming up")
+    parser.add_argument("--days", type=int, default=DUE_WITHIN_DAYS, help="How far ahead a meeting counts as due")
+    args = parser.parse_args()
+    generate_due_advice(setup_database(), within_days=args.days)
+    sys.exit(0)
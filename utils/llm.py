@@ -0,0 +1,24 @@
+import os
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def get_groq_client():
+    """Build the Groq client on first use instead of at import time"""
+    from groq import Client
+
+    # No SDK-level retries: the router falls back to another tier instead of waiting out a 429
+    return Client(
+        api_key=os.getenv("GROQ_API_KEY", "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"),
+        max_retries=0,
+    )
+
+def generate(prompt, max_tokens=500, temperature=0.1, stage="default", validate=None, prompt_id=None):
+    """Generate text with the model the router picks for this pipeline stage
+
+    prompt is a string or a list of chat messages (see utils.prompts).
+    """
+    from utils.llm_router import ROUTER
+
+    return ROUTER.generate(
+        prompt, stage=stage, max_tokens=max_tokens, temperature=temperature, validate=validate, prompt_id=prompt_id,
+    )
@@ -0,0 +1,499 @@
+"""
+Per-stage model routing with fallback tiers.
+
+Each pipeline stage has an ordered list of models (small and fast for parsing,
+larger for advice) and a latency SLO. A call goes to the first model that is not
+cooling down; a rate limit, timeout or backend error moves it to the next tier
+and cools the failing model down, and so does a model whose latency breaks the
+SLO on consecutive calls. An optional validator (valid JSON, expected sections)
+counts as quality: an invalid answer is retried on the next tier.
+
+Per-model latency, errors, fallbacks and invalid answers feed the Prometheus
+counters in utils.tracing, and model_stats() summarises them in process. Token
+usage goes to the ledger in utils.usage_ledger, whose budgets can move a call to
+the cheapest tiers or space calls out.
+Stage tiers can be overridden with LLM_ROUTES='{"advice": ["groq-8b"]}'.
+
+Prompts may be chat message lists with the static instructions first (see
+utils.prompts); Ollama calls ask the server to keep the model loaded for
+OLLAMA_KEEP_ALIVE and count the calls that still paid for loading it.
+
+Tail latency: when a call outlives the p95 latency of its model (the SLO until
+enough calls have been seen), a hedged request goes to the next tier and the
+first valid answer wins; hedges are capped at HEDGE_BUDGET of all calls. Each
+backend has a circuit breaker: BREAKER_FAILURES consecutive errors or timeouts
+open it, its tiers are then skipped without a call for BREAKER_OPEN_SECONDS,
+and a single probe call decides whether it closes again. A stage whose tiers
+are all behind open breakers fails fast with BackendUnavailable. The CrewAI
+agent loops run behind the same breakers through ROUTER.guard(backend).
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+import urllib.error
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+
+from utils.tracing import increment, span
+from utils.usage_ledger import LEDGER, model_price
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# load_duration above this means the call loaded the model instead of finding it warm
+COLD_START_NS = 1_000_000_000
+
+# Routing name -> (backend, backend model id)
+MODELS = {
+    "groq-8b": ("groq", "llama-3.1-8b-instant"),
+    "groq-70b": ("groq", "llama-3.3-70b-versatile"),
+    "ollama-7b": ("ollama", "qwen2.5:7b"),
+    "ollama-14b": ("ollama", "qwen2.5:14b"),
+}
+
+# Tool generations: stage -> (tiers in preference order, latency SLO in seconds)
+STAGE_POLICIES = {
+    "parse": (["groq-8b", "ollama-7b"], 3.0),
+    "advice": (["groq-70b", "groq-8b", "ollama-14b"], 10.0),
+    "default": (["groq-8b", "ollama-7b"], 5.0),
+}
+
+# Agent reasoning (CrewAI, local only): pipeline stage -> tiers
+AGENT_POLICIES = {
+    "parsed": ["ollama-7b", "ollama-14b"],
+    "advice": ["ollama-14b", "ollama-7b"],
+    "calendar": ["ollama-7b", "ollama-14b"],
+}
+
+# A call on a tier that has a fallback is abandoned after this many SLOs
+TIMEOUT_FACTOR = 3
+LAST_TIER_TIMEOUT = 120
+SLOW_STREAK = 2
+SLOW_COOLDOWN = 60
+ERROR_COOLDOWN = 15
+RATE_LIMIT_COOLDOWN = 30
+INSTALLED_MODELS_TTL = 60
+HEDGE_MIN_SAMPLES = 20
+# At most this share of calls may send a hedged request
+HEDGE_BUDGET = 0.1
+BREAKER_FAILURES = 5
+BREAKER_OPEN_SECONDS = 30
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-call")
+
+for stage, tiers in json.loads(os.getenv("LLM_ROUTES", "{}")).items():
+    slo = STAGE_POLICIES.get(stage, STAGE_POLICIES["default"])[1]
+    STAGE_POLICIES[stage] = (tiers, slo)
+
+class RateLimited(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.retry_after = retry_after
+
+class BackendUnavailable(Exception):
+    """Every tier of a stage is behind an open circuit breaker"""
+
+def _messages(prompt):
+    """Chat messages for a plain string prompt or an already rendered message list"""
+    return [{"role": "user", "content": prompt}] if isinstance(prompt, str) else list(prompt)
+
+def _call_groq(model, prompt, max_tokens, temperature, timeout):
+    from utils import llm
+
+    response = llm.get_groq_client().chat.completions.create(
+        model=model,
+        messages=_messages(prompt),
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout,
+    )
+    usage = getattr(response, "usage", None)
+    tokens = (usage.prompt_tokens, usage.completion_tokens) if usage is not None else None
+    return response.choices[0].message.content, tokens
+
+def _call_ollama(model, prompt, max_tokens, temperature, timeout):
+    payload = {
+        "model": model,
+        "messages": _messages(prompt),
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"temperature": temperature, "num_predict": max_tokens},
+    }
+    request = urllib.request.Request(
+        f"{OLLAMA_HOST}/api/chat",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = json.load(response)
+    if body.get("load_duration", 0) > COLD_START_NS:
+        increment("ollama_cold_starts_total", model=model)
+    return body["message"]["content"], (body.get("prompt_eval_count", 0), body.get("eval_count", 0))
+
+BACKENDS = {"groq": _call_groq, "ollama": _call_ollama}
+
+def failure_reason(error):
+    """'rate_limited', 'timeout' or 'error' for an exception raised by a backend"""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(error, RateLimited) or status == 429:
+        return "rate_limited"
+    if isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower():
+        return "timeout"
+    if isinstance(error, urllib.error.URLError) and isinstance(error.reason, TimeoutError):
+        return "timeout"
+    return "error"
+
+def backend_failed(error):
+    """Whether an exception out of an agent loop means the model server failed (not a tool or parsing error)"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        name = type(error).__name__
+        if isinstance(error, OSError) or any(
+            marker in name for marker in ("Connection", "Timeout", "ServiceUnavailable", "InternalServerError")
+        ):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def _retry_after(error):
+    if isinstance(error, RateLimited):
+        return error.retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+class _ModelHealth:
+    def __init__(self):
+        self.latencies = deque(maxlen=100)
+        self.requests = 0
+        self.failures = 0
+        self.invalid = 0
+        self.slow_streak = 0
+        self.cooldown_until = 0.0
+
+class _Breaker:
+    """closed -> open after BREAKER_FAILURES consecutive failures -> half_open (one probe) -> closed or open"""
+
+    def __init__(self):
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+class LLMRouter:
+    """Chooses a model per call from the stage policy and the recent health of each model"""
+
+    def __init__(self, policies=None, backends=None, clock=time.monotonic):
+        self.policies = policies if policies is not None else STAGE_POLICIES
+        self.backends = backends if backends is not None else BACKENDS
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._health = {}
+        self._breakers = {}
+        self._calls = 0
+        self._hedges = 0
+
+    def _model_health(self, name):
+        return self._health.setdefault(name, _ModelHealth())
+
+    def _cool_down(self, name, seconds):
+        health = self._model_health(name)
+        health.cooldown_until = max(health.cooldown_until, self._clock() + seconds)
+
+    def _breaker(self, backend):
+        return self._breakers.setdefault(backend, _Breaker())
+
+    def _set_breaker(self, backend, breaker, state):
+        breaker.state = state
+        increment("llm_breaker_transitions_total", backend=backend, state=state)
+
+    def _allow(self, backend, probe=True):
+        """Whether a call may go to backend; with probe, an expired open breaker lets one call through"""
+        with self._lock:
+            breaker = self._breaker(backend)
+            if breaker.state == "closed":
+                return True
+            if breaker.state == "open" and probe and self._clock() - breaker.opened_at >= BREAKER_OPEN_SECONDS:
+                self._set_breaker(backend, breaker, "half_open")
+                return True
+            return False
+
+    def _breaker_result(self, backend, failed, rate_limited=False):
+        with self._lock:
+            breaker = self._breaker(backend)
+            if rate_limited:
+                # The provider pacing us is not the backend failing; a probe that hit it just waits again
+                if breaker.state == "half_open":
+                    breaker.opened_at = self._clock()
+                    self._set_breaker(backend, breaker, "open")
+                return
+            if not failed:
+                breaker.failures = 0
+                if breaker.state != "closed":
+                    self._set_breaker(backend, breaker, "closed")
+                    print(f"🔌 {backend} answered again, circuit closed")
+                return
+            breaker.failures += 1
+            if breaker.state == "half_open" or (breaker.state == "closed" and breaker.failures >= BREAKER_FAILURES):
+                breaker.opened_at = self._clock()
+                self._set_breaker(backend, breaker, "open")
+                print(f"⛔ {backend} circuit open after {breaker.failures} failures, skipping it for {BREAKER_OPEN_SECONDS}s")
+
+    def candidates(self, stage):
+        """Tiers for a stage, models cooling down moved to the back (soonest available first)"""
+        tiers, _ = self.policies.get(stage, self.policies["default"])
+        now = self._clock()
+        with self._lock:
+            ready = [name for name in tiers if self._model_health(name).cooldown_until <= now]
+            cooling = sorted(
+                (name for name in tiers if name not in ready),
+                key=lambda name: self._model_health(name).cooldown_until,
+            )
+        return ready + cooling
+
+    def _record(self, name, stage, seconds, slo, result):
+        increment("llm_requests_total", model=name, stage=stage, result=result)
+        increment("llm_latency_seconds_total", seconds, model=name, stage=stage)
+        with self._lock:
+            health = self._model_health(name)
+            health.requests += 1
+            health.latencies.append(seconds)
+            if result in ("error", "timeout", "rate_limited"):
+                health.failures += 1
+            elif result == "invalid":
+                health.invalid += 1
+            if result == "ok" or result == "invalid":
+                if seconds > slo:
+                    health.slow_streak += 1
+                    increment("llm_slo_breaches_total", model=name, stage=stage)
+                else:
+                    health.slow_streak = 0
+                if health.slow_streak >= SLOW_STREAK:
+                    health.slow_streak = 0
+                    health.cooldown_until = max(health.cooldown_until, self._clock() + SLOW_COOLDOWN)
+                    print(f"🐢 {name} over its {slo:g}s SLO for {stage}, routing around it for {SLOW_COOLDOWN}s")
+
+    def _attempt(self, name, request, stage, slo, timeout):
+        """One call to one tier; returns (result, output, error) and never raises
+
+        result is 'ok', 'invalid' or the failure reason. Health, the breaker of
+        the backend, token counters and the usage ledger are updated here, so a
+        hedged call that loses still gets accounted when it finishes.
+        """
+        prompt, max_tokens, temperature, validate, prompt_id = request
+        backend, model = MODELS[name]
+        started = time.perf_counter()
+        try:
+            with span("llm.generate", model=model, backend=backend, stage=stage, max_tokens=max_tokens) as current:
+                if prompt_id:
+                    current.set_attribute("llm.prompt_id", prompt_id)
+                output, tokens = self.backends[backend](model, prompt, max_tokens, temperature, timeout)
+                if tokens is not None:
+                    current.set_attribute("llm.prompt_tokens", tokens[0])
+                    current.set_attribute("llm.completion_tokens", tokens[1])
+                    increment("llm_tokens_total", tokens[0], model=model, kind="prompt")
+                    increment("llm_tokens_total", tokens[1], model=model, kind="completion")
+                    LEDGER.record(
+                        model, tokens[0], tokens[1], (time.perf_counter() - started) * 1000,
+                        stage=stage, prompt_id=prompt_id,
+                    )
+            valid = validate is None or validate(output)
+        except Exception as e:
+            reason = failure_reason(e)
+            self._record(name, stage, time.perf_counter() - started, slo, reason)
+            cooldown = RATE_LIMIT_COOLDOWN if reason == "rate_limited" else ERROR_COOLDOWN
+            with self._lock:
+                self._cool_down(name, _retry_after(e) or cooldown)
+            self._breaker_result(backend, failed=True, rate_limited=reason == "rate_limited")
+            return reason, None, e
+
+        result = "ok" if valid else "invalid"
+        self._record(name, stage, time.perf_counter() - started, slo, result)
+        self._breaker_result(backend, failed=False)
+        return result, output, None
+
+    def _hedge_delay(self, name, slo):
+        """p95 latency of a model over its recent calls, or the SLO until there are enough of them"""
+        with self._lock:
+            latencies = sorted(self._model_health(name).latencies)
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return slo
+        return latencies[int(len(latencies) * 0.95)]
+
+    def _hedge_target(self, remaining):
+        """The next tier a hedged request may go to: not cooling down, breaker closed, within budget"""
+        now = self._clock()
+        with self._lock:
+            if self._hedges >= HEDGE_BUDGET * self._calls + 1:
+                return None
+            for name in remaining:
+                if self._model_health(name).cooldown_until <= now and self._breaker(MODELS[name][0]).state == "closed":
+                    return name
+        return None
+
+    def _hedged(self, name, backup, request, stage, slo, timeouts):
+        """Run name, and backup too if name is still running after its hedge delay
+
+        Returns the finished attempts as (name, result, output, error), in the
+        order they finished, stopping at the first valid answer.
+        """
+        delay = self._hedge_delay(name, slo)
+        primary = _executor.submit(contextvars.copy_context().run, self._attempt, name, request, stage, slo, timeouts[0])
+        try:
+            return [(name, *primary.result(timeout=delay))]
+        except FutureTimeout:
+            pass
+
+        with self._lock:
+            self._hedges += 1
+        print(f"🏎️ {name} still running after {delay:.2f}s for {stage}, hedging on {backup}")
+        hedge = _executor.submit(contextvars.copy_context().run, self._attempt, backup, request, stage, slo, timeouts[1])
+        names = {primary: name, hedge: backup}
+        finished = []
+        for future in as_completed(names):
+            finished.append((names[future], *future.result()))
+            if finished[-1][1] == "ok":
+                break
+        winner = finished[-1][0] if finished[-1][1] == "ok" else None
+        increment("llm_hedges_total", stage=stage, model=name,
+                  winner="primary" if winner == name else "backup" if winner else "none")
+        return finished
+
+    def generate(self, prompt, stage="default", max_tokens=500, temperature=0.1, validate=None, prompt_id=None):
+        """Answer from the first healthy tier whose output passes validate (if given)"""
+        _, slo = self.policies.get(stage, self.policies["default"])
+        tiers = self.candidates(stage)
+        actions = LEDGER.budget_actions(stage)
+        if "downgrade" in actions:
+            # Over budget: cheapest tiers first (stable, so health order breaks ties)
+            tiers = sorted(tiers, key=lambda name: sum(model_price(MODELS[name][1])))
+        if "throttle" in actions:
+            LEDGER.throttle()
+        with self._lock:
+            self._calls += 1
+
+        request = (prompt, max_tokens, temperature, validate, prompt_id)
+        remaining = list(tiers)
+        last_output, last_error = None, None
+        while remaining:
+            name = remaining.pop(0)
+            backend = MODELS[name][0]
+            if not self._allow(backend):
+                increment("llm_breaker_rejections_total", backend=backend, stage=stage)
+                continue
+
+            timeout = slo * TIMEOUT_FACTOR if remaining else LAST_TIER_TIMEOUT
+            backup = self._hedge_target(remaining)
+            if backup is None:
+                attempts = [(name, *self._attempt(name, request, stage, slo, timeout))]
+            else:
+                after_backup = remaining.index(backup) < len(remaining) - 1
+                backup_timeout = slo * TIMEOUT_FACTOR if after_backup else LAST_TIER_TIMEOUT
+                attempts = self._hedged(name, backup, request, stage, slo, (timeout, backup_timeout))
+                if any(used == backup for used, _, _, _ in attempts):
+                    remaining.remove(backup)
+
+            for used, result, output, error in attempts:
+                if result == "ok":
+                    return output
+            for used, result, output, error in attempts:
+                if result == "invalid":
+                    last_output = output
+                else:
+                    last_error = error
+                if remaining:
+                    increment("llm_fallbacks_total", stage=stage, model=used, reason=result)
+                    if result == "invalid":
+                        print(f"↪️ {used} gave an invalid answer for {stage}, retrying on {remaining[0]}")
+                    else:
+                        print(f"↪️ {used} failed for {stage} ({result}), falling back to {remaining[0]}")
+
+        if last_output is not None:
+            return last_output
+        if last_error is None:
+            raise BackendUnavailable(f"Every backend for {stage} is behind an open circuit breaker")
+        raise last_error
+
+    @contextmanager
+    def guard(self, backend):
+        """Run a call that bypasses generate() (a CrewAI agent loop) behind backend's breaker
+
+        Raises BackendUnavailable at once while the breaker is open; when it has
+        been open long enough the call is the half-open probe. Server failures
+        count towards opening it, a success closes it, and any other error sends
+        a probe back to waiting.
+        """
+        if not self._allow(backend):
+            increment("llm_breaker_rejections_total", backend=backend, stage="agent")
+            raise BackendUnavailable(f"The {backend} circuit breaker is open")
+        try:
+            yield
+        except Exception as e:
+            if failure_reason(e) == "rate_limited" or not backend_failed(e):
+                # Not the server failing: a probe waits again, the failure count is left alone
+                self._breaker_result(backend, failed=False, rate_limited=True)
+            else:
+                self._breaker_result(backend, failed=True)
+            raise
+        self._breaker_result(backend, failed=False)
+
+    def resilience_stats(self):
+        """Breaker state and consecutive failures per backend, and the share of calls that were hedged"""
+        with self._lock:
+            return {
+                "breakers": {
+                    backend: {"state": breaker.state, "failures": breaker.failures}
+                    for backend, breaker in self._breakers.items()
+                },
+                "hedged_share": round(self._hedges / self._calls, 3) if self._calls else None,
+            }
+
+    def model_stats(self):
+        """{model: requests, failure and invalid rates, latency p50/p95, cooling down}"""
+        now = self._clock()
+        stats = {}
+        with self._lock:
+            for name, health in self._health.items():
+                latencies = sorted(health.latencies)
+                stats[name] = {
+                    "requests": health.requests,
+                    "failure_rate": round(health.failures / health.requests, 3) if health.requests else None,
+                    "invalid_rate": round(health.invalid / health.requests, 3) if health.requests else None,
+                    "p50_s": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                    "p95_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+                    if latencies else None,
+                    "cooling_down": health.cooldown_until > now,
+                }
+        return stats
+
+ROUTER = LLMRouter()
+
+_installed = {"at": None, "models": None}
+
+def installed_ollama_models():
+    """Model tags pulled into the local Ollama (cached briefly), or None when it is unreachable"""
+    now = time.monotonic()
+    if _installed["at"] is None or now - _installed["at"] > INSTALLED_MODELS_TTL:
+        try:
+            with urllib.request.urlopen(f"{OLLAMA_HOST}/api/tags", timeout=2) as response:
+                _installed["models"] = {model["name"] for model in json.load(response).get("models", [])}
+        except (OSError, ValueError):
+            _installed["models"] = None
+        _installed["at"] = now
+    return _installed["models"]
+
+def agent_model(stage):
+    """LiteLLM model string for a CrewAI agent: the first tier of the stage that is pulled locally"""
+    tiers = AGENT_POLICIES.get(stage, AGENT_POLICIES["advice"])
+    installed = installed_ollama_models()
+    for name in tiers:
+        backend, model = MODELS[name]
+        if installed is None or model in installed or f"{model}:latest" in installed:
+            return f"{backend}/{model}"
+    backend, model = MODELS[tiers[-1]]
+    return f"{backend}/{model}"
@@ -0,0 +1,234 @@
+"""
+Notification emails rendered from stored meeting data.
+
+Templates are parsed once into literal/field pieces (cached), and rendering is
+a join over those pieces, with values HTML-escaped for the HTML part. The
+pipeline fills them from the meetings row and the event stage output, so no
+LLM call is needed to compose the confirmation.
+"""
+import re
+import json
+from html import escape
+from functools import lru_cache
+from string import Formatter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+from utils.outbox import enqueue_email
+
+DEFAULT_TIMEZONE = "Africa/Tunis"
+SIGNATURE = "Calendar Assistant"
+
+HTML_LAYOUT = """<html>
+  <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    {content}
+    <p style="margin-top: 30px; font-size: 12px; color: #666;">
+      This is an automated message from Calendar Assistant.
+    </p>
+  </body>
+</html>"""
+
+DETAILS_BLOCK = (
+    '<div style="margin-top: 20px; padding: 15px; background-color: #f5f5f5; '
+    'border-left: 4px solid #4CAF50;">{details}</div>'
+)
+
+TEMPLATES = {
+    "confirmed": {
+        "subject": "✅ Meeting Confirmed: {project_title}",
+        "text": (
+            "Hello {sender_name},\n\n"
+            "Your meeting has been successfully scheduled for {when} ({timezone} timezone).\n\n"
+            "Topic: {meeting_topic}\n\n"
+            "Please let me know if you need any changes.\n\n"
+            "Kind regards,\n{signature}"
+        ),
+        "html": (
+            "<p>Hello {sender_name},</p>"
+            "<p>Your meeting has been successfully scheduled for <strong>{when}</strong> ({timezone} timezone).</p>"
+            "<p>Please let me know if you need any changes.</p>"
+            "<p>Kind regards,<br>{signature}</p>"
+            + DETAILS_BLOCK.format(details="Meeting: {project_title}<br>Time: {when}<br>Description: {meeting_topic}")
+        ),
+    },
+    "alternatives": {
+        "subject": "📅 New time needed: {project_title}",
+        "text": (
+            "Hello {sender_name},\n\n"
+            "Unfortunately {requested} is not available ({timezone} timezone).\n"
+            "Here are some alternative slots:\n\n{alternatives_text}\n\n"
+            "Please reply with the slot that suits you best.\n\n"
+            "Kind regards,\n{signature}"
+        ),
+        "html": (
+            "<p>Hello {sender_name},</p>"
+            "<p>Unfortunately <strong>{requested}</strong> is not available ({timezone} timezone).</p>"
+            "<p>Here are some alternative slots:</p>{alternatives_html}"
+            "<p>Please reply with the slot that suits you best.</p>"
+            "<p>Kind regards,<br>{signature}</p>"
+        ),
+    },
+    "message": {
+        "subject": "{subject}",
+        "text": "{body}\n\n{meeting_details}",
+        "html": "<p>{body_html}</p>{details_html}",
+    },
+}
+
+# Values already rendered as HTML by the caller; everything else is escaped
+RAW_HTML_FIELDS = {"alternatives_html", "body_html", "details_html"}
+
+@lru_cache(maxsize=None)
+def compile_template(source):
+    """Split a template into (literal, field) pieces once"""
+    return tuple((literal, field) for literal, field, _, _ in Formatter().parse(source))
+
+def render(source, values, html=False):
+    """Fill a compiled template; fields are HTML-escaped when html=True"""
+    parts = []
+    for literal, field in compile_template(source):
+        parts.append(literal)
+        if field is not None:
+            value = str(values.get(field, ""))
+            parts.append(escape(value) if html and field not in RAW_HTML_FIELDS else value)
+    return "".join(parts)
+
+def render_notification(kind, values):
+    """(subject, text_body, html_body) for a template kind"""
+    template = TEMPLATES[kind]
+    values = {"signature": SIGNATURE, "timezone": DEFAULT_TIMEZONE, **values}
+    subject = render(template["subject"], values)
+    text_body = render(template["text"], values)
+    html_body = render(HTML_LAYOUT, {"content": render(template["html"], values, html=True)})
+    return subject, text_body, html_body
+
+def render_message(subject, body, meeting_details=""):
+    """Free-form message (used by the send_email tool)"""
+    details = meeting_details.replace("\\n", "\n") if meeting_details else ""
+    values = {
+        "subject": subject,
+        "body": body,
+        "meeting_details": details,
+        "body_html": escape(body).replace("\n", "<br>"),
+        "details_html": DETAILS_BLOCK.format(details=escape(details).replace("\n", "<br>")) if details else "",
+    }
+    return render_notification("message", values)
+
+# ==================== Meeting data ====================
+
+# Same formats as the dashboard's parse_meeting_date; the parse prompt does not enforce ISO
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d %B %Y", "%d-%m-%Y", "%Y/%m/%d", "%d.%m.%Y")
+
+def parse_meeting_day(meeting_date):
+    """The meeting day of a stored meeting_date in any of DATE_FORMATS, or None"""
+    if isinstance(meeting_date, datetime):
+        return meeting_date.date()
+    if isinstance(meeting_date, date):
+        return meeting_date
+    value = str(meeting_date or "").strip()
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def _parse_start(meeting_date, meeting_time):
+    """Meeting start, or None when the date cannot be read (the email then says 'the requested time')"""
+    if not meeting_date:
+        return None
+    day = parse_meeting_day(meeting_date)
+    if day is None:
+        return None
+    match = re.match(r"(\d{1,2}):(\d{2})", str(meeting_time or ""))
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        return datetime(day.year, day.month, day.day)
+    return datetime(day.year, day.month, day.day, int(match.group(1)), int(match.group(2)))
+
+def format_when(start, duration_hours):
+    """'Monday, December 23, 2025 at 01:00 PM - 02:00 PM'"""
+    end = start + timedelta(hours=duration_hours)
+    return f"{start.strftime('%A, %B %d, %Y at %I:%M %p')} - {end.strftime('%I:%M %p')}"
+
+def parse_event_output(output):
+    """('confirmed', event_id) or ('alternatives', [formatted slots]) from the event stage output
+
+    Raises ValueError when the output carries neither marker (a tool error or
+    agent chatter), so the run is recorded as failed instead of mailed out.
+    """
+    output = str(output or "")
+    if "EVENT CREATED" in output.upper():
+        match = re.search(r"EVENT CREATED:?\s*(\S+)", output, re.I)
+        return "confirmed", match.group(1).strip("\"'.,") if match else None
+
+    match = re.search(r"ALTERNATIVES FOUND:?", output, re.I)
+    if not match:
+        raise ValueError(f"Unrecognised event stage output: {output[:200]!r}")
+    listed = output[match.end():].strip()
+    try:
+        alternatives = json.loads(listed)
+        return "alternatives", [
+            item.get("formatted", str(item)) if isinstance(item, dict) else str(item) for item in alternatives
+        ]
+    except (ValueError, TypeError):
+        lines = [line.strip(" -*•") for line in listed.splitlines() if line.strip(" -*•")]
+        return "alternatives", lines
+
+def load_meeting(engine, email_id):
+    """Latest meetings row for an email joined with the sender, or None"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                """
+                SELECT e.sender_email, e.sender_name, m.project_title, m.meeting_topic,
+                       m.meeting_date, m.meeting_time, m.duration
+                FROM emails e
+                LEFT JOIN meetings m ON m.email_id = e.id
+                WHERE e.id = :email_id
+                ORDER BY m.id DESC
+                LIMIT 1
+                """
+            ),
+            {"email_id": email_id},
+        ).mappings().fetchone()
+    return dict(row) if row else None
+
+def build_notification(meeting, event_output, timezone=DEFAULT_TIMEZONE):
+    """(recipient, subject, text_body, html_body) for a processed meeting request"""
+    kind, detail = parse_event_output(event_output)
+    try:
+        duration = float(meeting.get("duration") or 1.0)
+    except (TypeError, ValueError):
+        duration = 1.0
+    start = _parse_start(meeting.get("meeting_date"), meeting.get("meeting_time"))
+    when = format_when(start, duration) if start else "the requested time"
+
+    values = {
+        "sender_name": meeting.get("sender_name") or "",
+        "project_title": meeting.get("project_title") or "your meeting request",
+        "meeting_topic": meeting.get("meeting_topic") or "",
+        "timezone": timezone,
+        "when": when,
+        "requested": when,
+        "event_id": detail if kind == "confirmed" else "",
+    }
+    if kind == "alternatives":
+        slots = detail or ["No free slot was found in the next days"]
+        values["alternatives_text"] = "\n".join(f"- {slot}" for slot in slots)
+        values["alternatives_html"] = "<ul>" + "".join(f"<li>{escape(slot)}</li>" for slot in slots) + "</ul>"
+
+    subject, text_body, html_body = render_notification(kind, values)
+    return meeting["sender_email"], subject, text_body, html_body
+
+def queue_meeting_notification(engine, email_id, event_output, timezone=DEFAULT_TIMEZONE):
+    """Render the notification for an email's meeting and put it in the outbox"""
+    meeting = load_meeting(engine, email_id)
+    if meeting is None:
+        raise ValueError(f"Email {email_id} not found")
+    recipient, subject, text_body, html_body = build_notification(meeting, event_output, timezone)
+    return enqueue_email(engine, recipient, subject, html_body, text_body=text_body, email_id=email_id)
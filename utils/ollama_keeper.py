@@ -0,0 +1,156 @@
+"""
+Keeps the local Ollama models loaded and their prompt prefixes cached.
+
+Ollama unloads a model once its keep_alive expires, and the next call then pays
+for loading the weights before it evaluates a single token. The keeper loads
+every model the pipeline may route to, warming each with the static blocks of
+the prompts it serves (utils.prompts) so the first real call already finds the
+prefix in the KV cache, and then checks /api/ps every REFRESH_SECONDS to reload
+any model the server dropped. Warm-ups ask for a single token, so they cost a
+prefix evaluation and nothing more.
+
+    python -m utils.ollama_keeper            # warm once and exit
+    OLLAMA_KEEP_WARM=qwen2.5:7b,llama3.2 ... # override the model list
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+import urllib.request
+
+from utils.llm_router import (
+    AGENT_POLICIES, MODELS, OLLAMA_HOST, OLLAMA_KEEP_ALIVE, STAGE_POLICIES, agent_model,
+)
+from utils.prompts import static_prefix
+from utils.tracing import increment, span
+
+REFRESH_SECONDS = 240
+WARMUP_TIMEOUT = 300
+
+# Tool stage -> the template its prompts start with
+STAGE_PROMPTS = {"parse": "parse_email", "advice": "advice"}
+
+def _request(path, payload=None, timeout=5):
+    request = urllib.request.Request(
+        f"{OLLAMA_HOST}{path}",
+        data=json.dumps(payload).encode() if payload is not None else None,
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+def loaded_models():
+    """Names of the models Ollama currently holds in memory, or None when it is unreachable"""
+    try:
+        return {model["name"] for model in _request("/api/ps").get("models", [])}
+    except (OSError, ValueError):
+        return None
+
+def _is_loaded(model, loaded):
+    return model in loaded or f"{model}:latest" in loaded
+
+def warm_targets():
+    """{ollama model: static prompt prefixes to cache} for every local tier in the policies"""
+    override = os.getenv("OLLAMA_KEEP_WARM")
+    if override:
+        return {model.strip(): [] for model in override.split(",") if model.strip()}
+
+    targets = {}
+    for stage, (tiers, _) in STAGE_POLICIES.items():
+        for name in tiers:
+            backend, model = MODELS[name]
+            if backend == "ollama":
+                prefixes = targets.setdefault(model, [])
+                if stage in STAGE_PROMPTS and STAGE_PROMPTS[stage] not in prefixes:
+                    prefixes.append(STAGE_PROMPTS[stage])
+    # The CrewAI agents bring their own system prompts, so their models are only loaded
+    for stage in AGENT_POLICIES:
+        backend, _, model = agent_model(stage).partition("/")
+        if backend == "ollama":
+            targets.setdefault(model, [])
+    return targets
+
+def warm_up(model, prompt_names=()):
+    """Load a model for OLLAMA_KEEP_ALIVE and evaluate each static prefix once; True on success"""
+    try:
+        with span("llm.warm_up", model=model, prefixes=len(prompt_names)):
+            if not prompt_names:
+                _request("/api/generate", {"model": model, "keep_alive": OLLAMA_KEEP_ALIVE}, WARMUP_TIMEOUT)
+            for name in prompt_names:
+                _request(
+                    "/api/chat",
+                    {
+                        "model": model,
+                        "messages": [static_prefix(name)],
+                        "stream": False,
+                        "keep_alive": OLLAMA_KEEP_ALIVE,
+                        "options": {"num_predict": 1},
+                    },
+                    WARMUP_TIMEOUT,
+                )
+    except (OSError, ValueError) as e:
+        increment("ollama_warmups_total", model=model, result="error")
+        print(f"⚠️ Could not warm up {model}: {e}")
+        return False
+    increment("ollama_warmups_total", model=model, result="ok")
+    return True
+
+class OllamaKeeper(threading.Thread):
+    """Daemon thread that reloads unloaded models every REFRESH_SECONDS until stopped"""
+
+    def __init__(self, targets=None, refresh_seconds=REFRESH_SECONDS):
+        super().__init__(name="ollama-keeper", daemon=True)
+        self.targets = targets
+        self.refresh_seconds = refresh_seconds
+        self._stop_event = threading.Event()
+
+    def refresh(self, force=False):
+        """Warm the targets missing from /api/ps (all of them with force); returns how many were warmed
+
+        Does nothing while Ollama is unreachable.
+        """
+        loaded = loaded_models()
+        if loaded is None:
+            return 0
+        if self.targets is None:
+            self.targets = warm_targets()
+        if force:
+            loaded = set()
+        return sum(
+            warm_up(model, prompt_names)
+            for model, prompt_names in self.targets.items()
+            if not _is_loaded(model, loaded)
+        )
+
+    def run(self):
+        # The first pass also caches the prefixes of models that were loaded by someone else
+        force = True
+        while not self._stop_event.is_set():
+            try:
+                self.refresh(force)
+            except Exception as e:
+                print(f"❌ Ollama keeper error: {e}")
+            force = False
+            self._stop_event.wait(self.refresh_seconds)
+
+    def stop(self, timeout=5):
+        """Stop the loop without waiting out a warm-up that is still loading"""
+        self._stop_event.set()
+        self.join(timeout)
+
+def start_ollama_keeper(refresh_seconds=REFRESH_SECONDS):
+    """Start and return the background keeper"""
+    keeper = OllamaKeeper(refresh_seconds=refresh_seconds)
+    keeper.start()
+    print("🔥 Ollama keeper started")
+    return keeper
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the local models and cache their prompt prefixes")
+    parser.parse_args()
+    keeper = OllamaKeeper()
+    warmed = keeper.refresh(force=True)
+    targets = keeper.targets or {}
+    print(f"🔥 {warmed}/{len(targets)} model(s) warmed: {', '.join(targets) or 'Ollama unreachable'}")
+    sys.exit(0 if targets and warmed == len(targets) else 1)
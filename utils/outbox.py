@@ -0,0 +1,263 @@
+"""
+Outbox for notification emails.
+
+The pipeline only inserts rows into the outbox table; a sender (a background
+thread, or `python -m utils.outbox` from cron) claims pending rows in batches,
+sends them over the pooled SMTP connections and retries failures with
+exponential backoff. Rows are keyed by email, recipient and subject, so a
+resumed pipeline run does not queue the same notification twice.
+"""
+import sys
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from sqlalchemy import bindparam, text
+
+from utils.smtp_pool import get_smtp_pool
+from utils.tracing import increment, span
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+CLAIM_TIMEOUT = timedelta(minutes=10)
+POLL_SECONDS = 5
+
+def ensure_outbox_table(engine):
+    """Create the outbox table if it does not exist"""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id TEXT PRIMARY KEY,
+                    email_id INTEGER,
+                    recipient TEXT NOT NULL,
+                    subject TEXT,
+                    text_body TEXT,
+                    html_body TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP,
+                    claimed_by TEXT,
+                    claimed_at TIMESTAMP,
+                    last_error TEXT,
+                    created_at TIMESTAMP,
+                    sent_at TIMESTAMP
+                )
+                """
+            )
+        )
+
+def _message_id(email_id, recipient, subject):
+    if email_id is None:
+        return uuid.uuid4().hex
+    return hashlib.sha1(f"{email_id}|{recipient.lower()}|{subject}".encode()).hexdigest()
+
+def enqueue_email(engine, recipient, subject, html_body, text_body=None, email_id=None):
+    """Queue a notification; returns its outbox id (existing id if already queued)"""
+    message_id = _message_id(email_id, recipient, subject)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                INSERT INTO outbox (id, email_id, recipient, subject, text_body, html_body,
+                                    status, attempts, next_attempt_at, created_at)
+                VALUES (:id, :email_id, :recipient, :subject, :text_body, :html_body,
+                        'pending', 0, :now, :now)
+                ON CONFLICT (id) DO NOTHING
+                """
+            ),
+            {
+                "id": message_id,
+                "email_id": email_id,
+                "recipient": recipient,
+                "subject": subject,
+                "text_body": text_body,
+                "html_body": html_body,
+                "now": now,
+            },
+        )
+    increment("outbox_enqueued_total")
+    print(f"📮 Queued email to {recipient}")
+    return message_id
+
+def claim_batch(engine, limit=BATCH_SIZE):
+    """Mark up to `limit` due messages as sending and return them"""
+    token = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        # Rows stuck in 'sending' (sender crashed mid-batch) become claimable again
+        conn.execute(
+            text(
+                """
+                UPDATE outbox SET status = 'pending', claimed_by = NULL
+                WHERE status = 'sending' AND claimed_at < :stale
+                """
+            ),
+            {"stale": now - CLAIM_TIMEOUT},
+        )
+        conn.execute(
+            text(
+                """
+                UPDATE outbox SET status = 'sending', claimed_by = :token, claimed_at = :now
+                WHERE status = 'pending' AND id IN (
+                    SELECT id FROM outbox
+                    WHERE status = 'pending' AND next_attempt_at <= :now
+                    ORDER BY created_at
+                    LIMIT :limit
+                )
+                """
+            ),
+            {"token": token, "now": now, "limit": limit},
+        )
+        rows = conn.execute(
+            text(
+                """
+                SELECT id, email_id, recipient, subject, text_body, html_body, attempts
+                FROM outbox WHERE claimed_by = :token AND status = 'sending'
+                ORDER BY created_at
+                """
+            ),
+            {"token": token},
+        ).mappings().fetchall()
+    return [dict(row) for row in rows]
+
+def build_message(row, email_config):
+    """MIME message for an outbox row"""
+    msg = MIMEMultipart("alternative")
+    msg["From"] = f"{email_config['sender_name']} <{email_config['sender_email']}>"
+    msg["To"] = row["recipient"]
+    msg["Subject"] = row["subject"]
+    if row.get("text_body"):
+        msg.attach(MIMEText(row["text_body"], "plain"))
+    if row.get("html_body"):
+        msg.attach(MIMEText(row["html_body"], "html"))
+    return msg
+
+def _backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+def _mark_sent(engine, ids):
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                UPDATE outbox SET status = 'sent', sent_at = :now, claimed_by = NULL, last_error = NULL
+                WHERE id IN :ids
+                """
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": ids, "now": datetime.now(timezone.utc)},
+        )
+
+def _mark_failed(engine, row, error):
+    attempts = row["attempts"] + 1
+    status = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                UPDATE outbox SET status = :status, attempts = :attempts, next_attempt_at = :next_attempt_at,
+                                  claimed_by = NULL, last_error = :error
+                WHERE id = :id
+                """
+            ),
+            {
+                "id": row["id"],
+                "status": status,
+                "attempts": attempts,
+                "next_attempt_at": datetime.now(timezone.utc) + _backoff(attempts),
+                "error": str(error)[:1000],
+            },
+        )
+    increment("outbox_failures_total", final=str(status == "failed").lower())
+
+def send_batch(engine, email_config, limit=BATCH_SIZE):
+    """Send one batch of due messages; returns (sent, failed) counts"""
+    rows = claim_batch(engine, limit)
+    if not rows:
+        return 0, 0
+
+    pool = get_smtp_pool(email_config)
+    sent, failed = [], 0
+    with span("outbox.send_batch", messages=len(rows)):
+        for row in rows:
+            try:
+                with span("smtp.send_message"):
+                    pool.send(build_message(row, email_config))
+                sent.append(row["id"])
+            except Exception as e:
+                print(f"❌ Outbox send to {row['recipient']} failed: {e}")
+                _mark_failed(engine, row, e)
+                failed += 1
+    if sent:
+        _mark_sent(engine, sent)
+        increment("outbox_sent_total", len(sent))
+    return len(sent), failed
+
+def drain_outbox(engine, email_config, limit=BATCH_SIZE):
+    """Send every due message now; returns (sent, failed) totals"""
+    ensure_outbox_table(engine)
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(engine, email_config, limit)
+        total_sent, total_failed = total_sent + sent, total_failed + failed
+        if sent + failed < limit:
+            break
+    if total_sent or total_failed:
+        print(f"📬 Outbox: {total_sent} sent, {total_failed} failed")
+    return total_sent, total_failed
+
+class OutboxSender(threading.Thread):
+    """Daemon thread that drains the outbox every POLL_SECONDS until stopped"""
+
+    def __init__(self, engine, email_config, poll_seconds=POLL_SECONDS, limit=BATCH_SIZE):
+        super().__init__(name="outbox-sender", daemon=True)
+        self.engine = engine
+        self.email_config = email_config
+        self.poll_seconds = poll_seconds
+        self.limit = limit
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                drain_outbox(self.engine, self.email_config, self.limit)
+            except Exception as e:
+                print(f"❌ Outbox sender error: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def notify(self):
+        """Drain now instead of waiting for the next poll"""
+        self._wake.set()
+
+    def stop(self, flush=True):
+        """Stop the loop; with flush, send what is still due before returning"""
+        self._stop_event.set()
+        self._wake.set()
+        self.join()
+        if flush:
+            drain_outbox(self.engine, self.email_config, self.limit)
+
+def start_outbox_sender(engine, email_config, poll_seconds=POLL_SECONDS):
+    """Start and return the background sender"""
+    ensure_outbox_table(engine)
+    sender = OutboxSender(engine, email_config, poll_seconds)
+    sender.start()
+    print("📮 Outbox sender started")
+    return sender
+
+if __name__ == "__main__":
+    import utils.bootstrap  # noqa: F401
+    from utils.database import setup_database
+    from orchestrator.main_orchestrator import EMAIL_CONFIG
+
+    sent, failed = drain_outbox(setup_database(), EMAIL_CONFIG)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from sqlalchemy import text
+
+# Stages in execution order; each one is a column of the pipeline_state table
+PIPELINE_STAGES = ["parsed", "advice", "availability", "event", "email_sent"]
+
+def ensure_pipeline_state_table(engine):
+    """Create the pipeline_state table if it does not exist"""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                CREATE TABLE IF NOT EXISTS pipeline_state (
+                    email_id INTEGER PRIMARY KEY,
+                    parsed TEXT,
+                    advice TEXT,
+                    availability TEXT,
+                    event TEXT,
+                    email_sent TEXT,
+                    last_error TEXT,
+                    updated_at TIMESTAMP
+                )
+                """
+            )
+        )
+
+def _upsert(engine, email_id, column, value):
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO pipeline_state (email_id, {column}, updated_at)
+                VALUES (:email_id, :value, :updated_at)
+                ON CONFLICT (email_id) DO UPDATE
+                SET {column} = EXCLUDED.{column}, updated_at = EXCLUDED.updated_at
+                """
+            ),
+            {"email_id": email_id, "value": value, "updated_at": datetime.now(timezone.utc)},
+        )
+
+def save_stage(engine, email_id, stage, output):
+    """Persist the output of one pipeline stage for an email"""
+    if stage not in PIPELINE_STAGES:
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+
+    _upsert(engine, email_id, stage, str(output))
+    print(f"💾 Checkpoint saved: email {email_id} -> {stage}")
+
+def clear_stage(engine, email_id, stage):
+    """Forget the output of one stage so a resume runs it again"""
+    if stage not in PIPELINE_STAGES:
+        raise ValueError(f"Unknown pipeline stage: {stage}")
+
+    _upsert(engine, email_id, stage, None)
+
+def record_failure(engine, email_id, error):
+    """Remember the last error of a pipeline run"""
+    _upsert(engine, email_id, "last_error", str(error))
+
+def load_pipeline_state(engine, email_id):
+    """Load the stored stage outputs for an email, or None if it never ran"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                f"""
+                SELECT {", ".join(PIPELINE_STAGES)}, last_error
+                FROM pipeline_state
+                WHERE email_id = :email_id
+                """
+            ),
+            {"email_id": email_id},
+        ).fetchone()
+
+    if not row:
+        return None
+
+    state = dict(zip(PIPELINE_STAGES, row[:len(PIPELINE_STAGES)]))
+    state["last_error"] = row[len(PIPELINE_STAGES)]
+    return state
+
+def first_incomplete_stage(state):
+    """Return the first stage without a stored output, or None when all are done"""
+    for stage in PIPELINE_STAGES:
+        if not state or state.get(stage) is None:
+            return stage
+    return None
+
+def find_incomplete_runs(engine):
+    """List email ids whose pipeline stopped before the last stage"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                """
+                SELECT email_id
+                FROM pipeline_state
+                WHERE email_sent IS NULL
+                ORDER BY updated_at
+                """
+            )
+        ).fetchall()
+
+    return [row[0] for row in rows]
@@ -0,0 +1,115 @@
+"""
+Versioned prompt templates laid out for prefix caching.
+
+Each template is a static instruction block, sent as the system message, and a
+dynamic data block (email body, person fields, history), sent last as the user
+message. Local servers such as Ollama reuse the KV cache of the longest prefix
+they have already evaluated, so every call of a stage shares the tokens of its
+instruction block and only the data at the end is evaluated again. Changing a
+static block means bumping its version; prompt_id() ends up on the llm.generate
+span, so traces show which layout produced an answer.
+"""
+import hashlib
+from functools import lru_cache
+
+PROMPTS = {
+    "parse_email": {
+        "version": 2,
+        "system": (
+            "You are an enterprise email understanding agent.\n"
+            "\n"
+            "Extract ONLY structured information from the email given after these instructions.\n"
+            "Return VALID JSON.\n"
+            "If information is missing, use null.\n"
+            "\n"
+            "Fields:\n"
+            "- sender_role (role of the sender in the context of the email: manager, client, supplier, team_member)\n"
+            "- project_title\n"
+            "- meeting topic (what will discuss in the meeting)\n"
+            "- relation_type (meeting_client, collaboration,supplier_offer)\n"
+            "- meeting_date\n"
+            "- meeting_time\n"
+            "- duration\n"
+            "- urgent (true/false)\n"
+            "- tasks_requested (array)\n"
+            "- documents_to_prepare (array)\n"
+            "- confirmation_status (confirmed / pending)\n"
+        ),
+        "user": 'Email:\n"""{email_text}"""\n\nReturn the JSON object now.',
+    },
+    "advice": {
+        "version": 2,
+        "system": (
+            "You are a senior executive advisor for a business owner.\n"
+            "\n"
+            "Your role is to help prepare for an upcoming meeting using the sections given after these instructions:\n"
+            "- MEETING CONTEXT: the meeting request extracted from the email\n"
+            "- PERSON & PROJECT CONTEXT: the person and the ongoing project\n"
+            "- RELATED HISTORY: past meetings and recommendations\n"
+            "\n"
+            "Analyze all the information and provide **clear, practical, and business-relevant guidance**.\n"
+            "\n"
+            "OUTPUT STRICTLY IN THIS FORMAT (no extra text, no markdown):\n"
+            "\n"
+            "TASKS:\n"
+            "- [Task 1: specific action item]\n"
+            "- [Task 2: specific action item]\n"
+            "- [Task 3: specific action item]\n"
+            "- [Task 4: specific action item]\n"
+            "- [Task 5: specific action item]\n"
+            "\n"
+            "ADVICE:\n"
+            "- [Advice 1: strategic recommendation]\n"
+            "- [Advice 2: strategic recommendation]\n"
+            "- [Advice 3: strategic recommendation]\n"
+            "- [Advice 4: strategic recommendation]\n"
+            "- [Advice 5: strategic recommendation]\n"
+            "\n"
+            "RULES:\n"
+            "- Be concise and actionable\n"
+            "- Avoid generic advice\n"
+            "- Base your reasoning on meeting type, urgency, project context, role expectations, and latest decision\n"
+            "- Build on the related history: follow up on earlier tasks instead of repeating them\n"
+            "- Each task should be a concrete preparation action\n"
+            "- Each advice should be a strategic insight for meeting success\n"
+        ),
+        "user": (
+            "========================\n"
+            "MEETING CONTEXT (JSON)\n"
+            "========================\n"
+            "{meeting_json}\n"
+            "\n"
+            "========================\n"
+            "PERSON & PROJECT CONTEXT\n"
+            "========================\n"
+            "Name: {name}\n"
+            "Role: {role}\n"
+            "Service / Position: {service}\n"
+            "Project Title: {project_title}\n"
+            "Project Description: {project_description}\n"
+            "Latest Decision from Last Meeting: {latest_decision}\n"
+            "\n"
+            "========================\n"
+            "RELATED HISTORY (past meetings and recommendations)\n"
+            "========================\n"
+            "{history}\n"
+            "\n"
+            "Answer with the TASKS and ADVICE sections now."
+        ),
+    },
+}
+
+@lru_cache(maxsize=None)
+def prompt_id(name):
+    """'name@v<version>#<hash of the static block>', stable while the cached prefix is"""
+    template = PROMPTS[name]
+    digest = hashlib.sha1(template["system"].encode()).hexdigest()[:8]
+    return f"{name}@v{template['version']}#{digest}"
+
+def static_prefix(name):
+    """The system message every call of a template starts with"""
+    return {"role": "system", "content": PROMPTS[name]["system"]}
+
+def render_prompt(template, /, **values):
+    """Chat messages for a template: the static block first, the filled data block last"""
+    return [static_prefix(template), {"role": "user", "content": PROMPTS[template]["user"].format(**values)}]
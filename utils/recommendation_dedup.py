@@ -0,0 +1,281 @@
+"""
+Near-duplicate detection for recommendations, per project and type.
+
+Each task or advice text is reduced to a MinHash signature over the character
+trigrams of its normalised content words (articles and prepositions dropped, so
+"Review the meeting materials" equals "Review meeting materials") and banded
+into an LSH table, so a new row only has to be compared with the few stored
+rows that share a band. A new row whose estimated Jaccard similarity with an
+open (not completed) row of the same project and type reaches
+DUPLICATE_THRESHOLD is suppressed; duplicates inside one batch, like the
+padding from parse_advisor_output, collapse the same way.
+
+Trigrams drown a single changed word in a long text ("Q3" vs "Q4", "signed" vs
+"unsigned"), so a similar pair is only a duplicate if no word was replaced:
+the content words of one must all appear in the other, and the numbers must be
+the same. `python -m utils.recommendation_dedup --check` runs the examples in
+DUPLICATE_EXAMPLES and DISTINCT_EXAMPLES.
+
+The per-project tables are filled lazily and catch up on rows written by other
+processes by reading ids above the last one seen. `python -m
+utils.recommendation_dedup` compacts rows stored before this existed.
+"""
+import sys
+import zlib
+import argparse
+import threading
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+from utils import history_index
+from utils.contact_resolver import normalize_name
+from utils.tracing import increment, span
+
+NUM_PERMUTATIONS = 128
+BANDS = 32
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 0.85
+DELETE_BATCH = 500
+
+_rng = np.random.default_rng(20240501)
+# Multiply-shift hashing: h(x) = ((a * x + b) mod 2^64) >> 32, with odd a
+_A = _rng.integers(1, 2**63, NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**63, NUM_PERMUTATIONS, dtype=np.uint64)
+
+STOP_WORDS = {
+    "a", "an", "the", "of", "for", "to", "and", "on", "in", "at", "by", "with", "all", "any",
+    "le", "la", "les", "de", "des", "du", "et", "pour", "sur", "avec",
+}
+
+# Pairs the deduplicator must collapse, and pairs it must keep apart
+DUPLICATE_EXAMPLES = [
+    ("Review the meeting materials", "Review meeting materials"),
+    ("Prepare the slides for the client", "Prepare slides for the client"),
+    ("Send the agenda to all participants", "Send agenda to participants"),
+]
+DISTINCT_EXAMPLES = [
+    ("Prepare the Q3 status report", "Prepare the Q4 status report"),
+    ("Prepare the Q3 budget variance report for the regional sales team",
+     "Prepare the Q4 budget variance report for the regional sales team"),
+    ("Send the signed contract to the client for final review",
+     "Send the unsigned contract to the client for final review"),
+]
+
+def content_words(value):
+    """Normalised words without stop words, plural 's' dropped"""
+    words = set()
+    for word in normalize_name(value).split():
+        if word in STOP_WORDS:
+            continue
+        words.add(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+    return frozenset(words)
+
+def same_wording(words, other):
+    """True unless a word of one text was replaced in the other (one set contains the other, same numbers)"""
+    numbers = {word for word in words if any(char.isdigit() for char in word)}
+    other_numbers = {word for word in other if any(char.isdigit() for char in word)}
+    return numbers == other_numbers and (words <= other or other <= words)
+
+def shingles(value):
+    """Character trigrams of each normalised content word, padded with a space on both sides"""
+    grams = set()
+    for word in normalize_name(value).split():
+        if word in STOP_WORDS:
+            continue
+        padded = f" {word} "
+        grams.update(padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1))
+    return grams or {normalize_name(value)}
+
+def minhash(value):
+    """NUM_PERMUTATIONS-long uint32 MinHash signature"""
+    hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles(value)), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, None] * _A + _B) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(signature == other))
+
+def is_duplicate(value, other):
+    """Whether two texts count as the same recommendation"""
+    return (
+        similarity(minhash(value), minhash(other)) >= DUPLICATE_THRESHOLD
+        and same_wording(content_words(value), content_words(other))
+    )
+
+class _ProjectTable:
+    """LSH buckets and signatures for the open recommendations of one project"""
+
+    def __init__(self):
+        self.last_id = 0
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+
+    def _keys(self, kind, signature):
+        rows = NUM_PERMUTATIONS // BANDS
+        return [(kind, band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+    def add(self, recommendation_id, kind, signature, words):
+        self.signatures[recommendation_id] = (kind, signature, words)
+        for key in self._keys(kind, signature):
+            self.buckets[key].add(recommendation_id)
+
+    def remove(self, recommendation_id):
+        kind, signature, _ = self.signatures.pop(recommendation_id)
+        for key in self._keys(kind, signature):
+            self.buckets[key].discard(recommendation_id)
+
+    def duplicate_of(self, kind, signature, words):
+        """(id, similarity) of the most similar stored row at or above the threshold, else None"""
+        candidates = set()
+        for key in self._keys(kind, signature):
+            candidates |= self.buckets.get(key, set())
+        best = None
+        for candidate in candidates:
+            _, other, other_words = self.signatures[candidate]
+            score = similarity(signature, other)
+            if score < DUPLICATE_THRESHOLD or (best is not None and score <= best[1]):
+                continue
+            if same_wording(words, other_words):
+                best = (candidate, score)
+        return best
+
+class RecommendationDeduplicator:
+    """Per-project LSH tables over open recommendations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._tables = {}
+
+    def _table(self, conn, engine, project_title):
+        if self._engine is not engine:
+            self._engine, self._tables = engine, {}
+        table = self._tables.setdefault(project_title, _ProjectTable())
+        rows = conn.execute(
+            text(
+                """
+                SELECT id, type, content, completed FROM recommendations
+                WHERE project_title = :project_title AND id > :after
+                ORDER BY id
+                """
+            ),
+            {"project_title": project_title, "after": table.last_id},
+        ).fetchall()
+        for recommendation_id, kind, content, completed in rows:
+            if not completed:
+                table.add(recommendation_id, kind, minhash(content), content_words(content))
+            table.last_id = recommendation_id
+        return table
+
+    def filter_new(self, conn, engine, project_title, items):
+        """Split (type, content) items into kept items and suppressed (type, content, duplicate id or None)
+
+        Matches against stored rows are re-checked in the database, since the
+        dashboard may have completed (or the compaction job deleted) them.
+        """
+        with self._lock, span("db.dedup_recommendations", items=len(items)):
+            table = self._table(conn, engine, project_title)
+            signatures = [(minhash(content), content_words(content)) for _, content in items]
+            while True:
+                kept, suppressed, pending = [], [], _ProjectTable()
+                for position, ((kind, content), (signature, words)) in enumerate(zip(items, signatures)):
+                    match = table.duplicate_of(kind, signature, words) or pending.duplicate_of(kind, signature, words)
+                    if match:
+                        # Negative ids are earlier items of this batch
+                        suppressed.append((kind, content, match[0] if match[0] > 0 else None))
+                        continue
+                    pending.add(-position - 1, kind, signature, words)
+                    kept.append((kind, content))
+
+                matched = {duplicate for _, _, duplicate in suppressed if duplicate}
+                stale = matched - _open_ids(conn, matched)
+                if not stale:
+                    break
+                for recommendation_id in stale:
+                    table.remove(recommendation_id)
+
+        for kind, _, _ in suppressed:
+            increment("recommendations_deduplicated_total", type=kind)
+        return kept, suppressed
+
+    def invalidate(self):
+        with self._lock:
+            self._tables = {}
+
+def _open_ids(conn, ids):
+    if not ids:
+        return set()
+    statement = text(
+        "SELECT id FROM recommendations WHERE id IN :ids AND completed IS NOT TRUE"
+    ).bindparams(bindparam("ids", expanding=True))
+    return {row[0] for row in conn.execute(statement, {"ids": sorted(ids)})}
+
+DEDUP = RecommendationDeduplicator()
+
+def compact_recommendations(engine, dry_run=False):
+    """Delete open rows that duplicate an older open row of the same project and type
+
+    The oldest row of each group is kept. Completed rows are never deleted.
+    Returns the number of rows removed (or that would be removed).
+    """
+    with span("db.compact_recommendations"), engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                """
+                SELECT id, project_title, type, content FROM recommendations
+                WHERE completed IS NOT TRUE
+                ORDER BY project_title, id
+                """
+            )
+        ).fetchall()
+
+    duplicates = []
+    tables = {}
+    for recommendation_id, project_title, kind, content in rows:
+        table = tables.setdefault(project_title, _ProjectTable())
+        signature, words = minhash(content), content_words(content)
+        if table.duplicate_of(kind, signature, words):
+            duplicates.append(recommendation_id)
+        else:
+            table.add(recommendation_id, kind, signature, words)
+
+    print(f"🧹 {len(duplicates)} duplicate recommendations out of {len(rows)} open rows")
+    if duplicates and not dry_run:
+        statement = text("DELETE FROM recommendations WHERE id IN :ids").bindparams(bindparam("ids", expanding=True))
+        with engine.begin() as conn:
+            for start in range(0, len(duplicates), DELETE_BATCH):
+                conn.execute(statement, {"ids": duplicates[start:start + DELETE_BATCH]})
+        DEDUP.invalidate()
+        # Deleted rows must not come back as advisor context
+        history_index.HISTORY.remove("recommendation", duplicates)
+    return len(duplicates)
+
+def check_examples():
+    """Names of the example pairs the deduplicator gets wrong (empty when all pass)"""
+    wrong = [f"{a!r} ~ {b!r}" for a, b in DUPLICATE_EXAMPLES if not is_duplicate(a, b)]
+    wrong += [f"{a!r} != {b!r}" for a, b in DISTINCT_EXAMPLES if is_duplicate(a, b)]
+    return wrong
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove near-duplicate open recommendations")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the duplicates")
+    parser.add_argument("--check", action="store_true", help="Only check the example pairs, without a database")
+    args = parser.parse_args()
+
+    if args.check:
+        wrong = check_examples()
+        for pair in wrong:
+            print(f"❌ {pair}")
+        print(f"{'❌' if wrong else '✅'} {len(DUPLICATE_EXAMPLES) + len(DISTINCT_EXAMPLES) - len(wrong)}"
+              f"/{len(DUPLICATE_EXAMPLES) + len(DISTINCT_EXAMPLES)} example pairs")
+        sys.exit(1 if wrong else 0)
+
+    import utils.bootstrap  # noqa: F401
+    from utils.database import setup_database
+
+    compact_recommendations(setup_database(), dry_run=args.dry_run)
+    sys.exit(0)
@@ -0,0 +1,143 @@
+"""
+Pooled, keep-alive SMTP connections.
+
+Connections are opened with STARTTLS and LOGIN once and then reused for later
+messages. A connection idle for a while is checked with NOOP before it is used.
+If a send fails because the server dropped the connection, it is retried once on
+a fresh connection. Pools are shared per (server, port, account).
+"""
+import time
+import queue
+import smtplib
+import threading
+from contextlib import contextmanager
+
+from utils.tracing import increment, span
+
+POOL_SIZE = 2
+NOOP_AFTER_SECONDS = 30
+MAX_IDLE_SECONDS = 240
+
+# Failures after which the connection is dropped and the send retried
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+class _Connection:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.client.quit()
+        except Exception:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+
+class SMTPPool:
+    """Up to `size` authenticated SMTP connections reused across messages"""
+
+    def __init__(self, server, port, username, password, size=POOL_SIZE, timeout=30, starttls=True):
+        self.server = server
+        self.port = port
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        with span("smtp.connect", server=self.server):
+            client = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    client.starttls()
+                client.login(self.username, self.password)
+            except Exception:
+                client.close()
+                raise
+        increment("smtp_connections_opened_total", server=self.server)
+        return _Connection(client)
+
+    def _checkout(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            idle = time.monotonic() - connection.last_used
+            if idle > MAX_IDLE_SECONDS:
+                connection.close()
+                continue
+            if idle > NOOP_AFTER_SECONDS:
+                try:
+                    if connection.client.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP failed")
+                except Exception:
+                    connection.close()
+                    continue
+            increment("smtp_connections_reused_total", server=self.server)
+            return connection
+
+    @contextmanager
+    def connection(self):
+        """Authenticated connection, returned to the pool afterwards unless it failed"""
+        with self._slots:
+            connection = self._checkout()
+            try:
+                yield connection.client
+            except BaseException:
+                connection.close()
+                raise
+            connection.last_used = time.monotonic()
+            try:
+                self._idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    def send(self, msg):
+        """Send an email.message.Message, retrying once on a dropped connection"""
+        for attempt in range(2):
+            try:
+                with self.connection() as client:
+                    return client.send_message(msg)
+            except RECONNECT_ERRORS:
+                if attempt:
+                    raise
+                increment("smtp_reconnects_total", server=self.server)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_smtp_pool(email_config):
+    """Shared pool for an EMAIL_CONFIG-style dict"""
+    key = (email_config["smtp_server"], email_config["smtp_port"], email_config["sender_email"])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPPool(
+                email_config["smtp_server"],
+                email_config["smtp_port"],
+                email_config["sender_email"],
+                email_config["sender_password"],
+                starttls=email_config.get("smtp_starttls", True),
+            )
+        return pool
+
+def close_pools():
+    """Close every pooled connection (e.g. at shutdown or between benchmark runs)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
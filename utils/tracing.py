@@ -0,0 +1,266 @@
+"""
+Lightweight span tracing and latency metrics for the pipeline.
+
+    with span("gmail.fetch_one_email"):
+        ...
+
+    @traced("db.store_email")
+    def store_email(...):
+        ...
+
+Finished spans are kept in memory and can be exported as OpenTelemetry (OTLP/JSON)
+documents; span durations feed Prometheus-style histograms served by
+start_metrics_server().
+"""
+import os
+import json
+import time
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+SERVICE_NAME = "automeet-ai"
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+MAX_FINISHED_SPANS = 10000
+
+_current_span = ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_finished_spans = deque(maxlen=MAX_FINISHED_SPANS)
+_histograms = {}
+_counters = {}
+
+class Span:
+    """One timed operation; attributes can be added while it is open"""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_seconds(self):
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+@contextmanager
+def span(name, **attributes):
+    """Trace the enclosed block as a child of the currently open span"""
+    current = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = str(e) or type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        _record(current)
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_span(name, start_ns, end_ns=None, **attributes):
+    """Record an operation timed elsewhere as a finished child of the open span"""
+    finished = Span(name, parent=_current_span.get(), attributes=attributes)
+    finished.start_ns = start_ns
+    finished.end_ns = end_ns if end_ns is not None else time.time_ns()
+    _record(finished)
+    return finished
+
+def current_span():
+    """The innermost open span, or None"""
+    return _current_span.get()
+
+def set_attribute(key, value):
+    """Set an attribute on the innermost open span, if any"""
+    active = _current_span.get()
+    if active is not None:
+        active.set_attribute(key, value)
+
+def increment(name, value=1, **labels):
+    """Add to a Prometheus counter"""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def _record(finished):
+    seconds = finished.duration_seconds
+    status = "error" if finished.error else "ok"
+
+    with _lock:
+        _finished_spans.append(finished)
+
+        histogram = _histograms.setdefault(
+            (finished.name, status),
+            {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0},
+        )
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+
+def finished_spans():
+    """Snapshot of the finished spans kept in memory"""
+    with _lock:
+        return list(_finished_spans)
+
+def counters():
+    """Snapshot of the counters as {(name, ((label, value), ...)): total}"""
+    with _lock:
+        return dict(_counters)
+
+def reset():
+    """Drop all recorded spans and metrics"""
+    with _lock:
+        _finished_spans.clear()
+        _histograms.clear()
+        _counters.clear()
+
+# ==================== OpenTelemetry JSON export ====================
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_span(finished):
+    document = {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "name": finished.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(finished.start_ns),
+        "endTimeUnixNano": str(finished.end_ns),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in finished.attributes.items()
+        ],
+        "status": {"code": 2, "message": finished.error} if finished.error else {"code": 1},
+    }
+    if finished.parent_span_id:
+        document["parentSpanId"] = finished.parent_span_id
+    return document
+
+def export_otlp_json(spans=None):
+    """Build an OTLP/JSON ExportTraceServiceRequest document"""
+    spans = finished_spans() if spans is None else spans
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "utils.tracing"},
+                        "spans": [_otlp_span(finished) for finished in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+def write_traces(path):
+    """Write all finished spans to path as OTLP/JSON"""
+    with open(path, "w") as f:
+        json.dump(export_otlp_json(), f, indent=2)
+    print(f"🧭 Traces written to {path}")
+
+# ==================== Prometheus metrics ====================
+
+def _label_value(value):
+    """A label value escaped as the text exposition format requires"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(pairs):
+    return ",".join(f'{key}="{_label_value(value)}"' for key, value in pairs)
+
+def render_prometheus():
+    """Render histograms and counters in the Prometheus text exposition format"""
+    with _lock:
+        histograms = {key: dict(value, buckets=list(value["buckets"])) for key, value in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [
+        "# HELP pipeline_span_duration_seconds Duration of traced pipeline operations",
+        "# TYPE pipeline_span_duration_seconds histogram",
+    ]
+    for (name, status), histogram in sorted(histograms.items()):
+        labels = _labels([("span", name), ("status", status)])
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f'pipeline_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'pipeline_span_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+        lines.append(f"pipeline_span_duration_seconds_sum{{{labels}}} {histogram['sum']:.6f}")
+        lines.append(f"pipeline_span_duration_seconds_count{{{labels}}} {histogram['count']}")
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                label_text = f"{{{_labels(labels)}}}" if labels else ""
+                lines.append(f"{name}{label_text} {value}")
+
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path):
+    """Write the current metrics to path (node_exporter textfile collector format)"""
+    with open(path, "w") as f:
+        f.write(render_prometheus())
+
+def start_metrics_server(port=None):
+    """Serve /metrics (Prometheus) and /traces (OTLP/JSON) from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                payload = render_prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/traces":
+                payload = json.dumps(export_otlp_json()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    port = int(port or os.getenv("METRICS_PORT", "9464"))
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📈 Metrics endpoint on http://localhost:{port}/metrics")
+    return server
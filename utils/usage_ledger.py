@@ -0,0 +1,360 @@
+"""
+Token and cost ledger for LLM calls, with budgets.
+
+Every routed generate() call and every CrewAI agent step is recorded in the
+llm_usage table (one row per call or per agent task) and in in-memory totals per
+day, email, stage and model. The email and stage come from usage_scope(), which
+the pipeline opens around each run; agent steps are read from the token counters
+CrewAI keeps on each LLM instance when a task finishes.
+
+Budgets come from LLM_BUDGETS, e.g.
+    LLM_BUDGETS='{"daily_cost_usd": 5, "daily_tokens": [2000000, "throttle"], "email_tokens": 40000}'
+The budgets are daily_cost_usd, daily_tokens, stage_daily_tokens (per stage)
+and email_tokens (per email). Each has a limit and an action: "downgrade" (the
+default) routes calls to the cheapest tiers of their stage and defers advice
+generation until the meeting is opened; "throttle" spaces calls out by
+THROTTLE_SECONDS.
+Prices per million tokens can be overridden with LLM_PRICES='{"model": [in, out]}'.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from utils.tracing import increment
+
+# USD per million (prompt, completion) tokens; local models are free
+PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+}
+PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+BUDGET_ACTIONS = ("downgrade", "throttle")
+THROTTLE_SECONDS = 2.0
+
+_scope = ContextVar("usage_scope", default={})
+
+def _parse_budgets(raw):
+    budgets = {}
+    for name, value in json.loads(raw or "{}").items():
+        limit, action = (value, "downgrade") if isinstance(value, (int, float)) else value
+        if action not in BUDGET_ACTIONS:
+            raise ValueError(f"Unknown budget action for {name}: {action}")
+        budgets[name] = (float(limit), action)
+    return budgets
+
+BUDGETS = _parse_budgets(os.getenv("LLM_BUDGETS"))
+
+def model_price(model):
+    """(prompt, completion) USD per million tokens of a backend model id ('ollama/qwen2.5:7b' allowed)"""
+    return PRICES.get(model.split("/", 1)[-1], (0.0, 0.0))
+
+def call_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = model_price(model)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+@contextmanager
+def usage_scope(**values):
+    """Attribute the calls made inside the block to an email_id and/or stage"""
+    token = _scope.set({**_scope.get(), **values})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+def ensure_usage_table(engine):
+    """Create the llm_usage table if it does not exist"""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                """
+                CREATE TABLE IF NOT EXISTS llm_usage (
+                    email_id INTEGER,
+                    stage TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    prompt_id TEXT,
+                    calls INTEGER NOT NULL DEFAULT 1,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    latency_ms REAL,
+                    cost_usd REAL NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP NOT NULL
+                )
+                """
+            )
+        )
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage (created_at)"))
+
+def _agent_counters(llm):
+    """(prompt, completion, requests) CrewAI has counted on an LLM instance, None if it does not count"""
+    try:
+        usage = llm.get_token_usage_summary()
+    except AttributeError:
+        return None
+    return usage.prompt_tokens, usage.completion_tokens, usage.successful_requests
+
+def agent_usage_baseline(llms):
+    """Counters of the agent LLMs before a run, so record_agent_step only charges the run's own calls"""
+    baseline = {}
+    for llm in llms:
+        counters = _agent_counters(llm)
+        if counters is not None:
+            baseline[id(llm)] = counters
+    return baseline
+
+class _Totals:
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens", "latency_ms", "cost_usd")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_ms = 0.0
+        self.cost_usd = 0.0
+
+    def add(self, calls, prompt_tokens, completion_tokens, latency_ms, cost_usd):
+        self.calls += calls
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.latency_ms += latency_ms or 0.0
+        self.cost_usd += cost_usd
+
+    @property
+    def tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+class UsageLedger:
+    """In-memory usage totals, written through to llm_usage once bound to an engine"""
+
+    def __init__(self, budgets=None, clock=time.time):
+        self.budgets = budgets if budgets is not None else BUDGETS
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._engine = None
+        # (day, email_id, stage, model) -> totals
+        self._totals = defaultdict(_Totals)
+        self._last_throttled = 0.0
+
+    def _today(self):
+        return datetime.fromtimestamp(self._clock(), timezone.utc).date()
+
+    def bind(self, engine):
+        """Write to engine from now on, starting from the usage it already holds for today"""
+        if engine is self._engine:
+            return
+        ensure_usage_table(engine)
+        today = self._today()
+        start = datetime.combine(today, datetime.min.time(), tzinfo=timezone.utc)
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT email_id, stage, model, SUM(calls), SUM(prompt_tokens), SUM(completion_tokens),
+                           SUM(latency_ms), SUM(cost_usd)
+                    FROM llm_usage
+                    WHERE created_at >= :start
+                    GROUP BY email_id, stage, model
+                    """
+                ),
+                {"start": start},
+            ).fetchall()
+        with self._lock:
+            self._engine = engine
+            self._totals = defaultdict(_Totals)
+            for email_id, stage, model, *sums in rows:
+                self._totals[(today, email_id, stage, model)].add(*(value or 0 for value in sums))
+
+    def record(self, model, prompt_tokens, completion_tokens, latency_ms=None, stage=None,
+               source="tool", prompt_id=None, calls=1):
+        """Add one call (or one agent step of several calls) to the totals and the table"""
+        scope = _scope.get()
+        email_id = scope.get("email_id")
+        stage = stage or scope.get("stage") or "default"
+        cost = call_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            self._totals[(self._today(), email_id, stage, model)].add(
+                calls, prompt_tokens, completion_tokens, latency_ms, cost
+            )
+            engine = self._engine
+
+        increment("llm_cost_usd_total", cost, model=model, stage=stage)
+        if engine is None:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        """
+                        INSERT INTO llm_usage (email_id, stage, model, source, prompt_id, calls, prompt_tokens,
+                                               completion_tokens, latency_ms, cost_usd, created_at)
+                        VALUES (:email_id, :stage, :model, :source, :prompt_id, :calls, :prompt_tokens,
+                                :completion_tokens, :latency_ms, :cost_usd, :created_at)
+                        """
+                    ),
+                    {
+                        "email_id": email_id,
+                        "stage": stage,
+                        "model": model,
+                        "source": source,
+                        "prompt_id": prompt_id,
+                        "calls": calls,
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "latency_ms": latency_ms,
+                        "cost_usd": cost,
+                        "created_at": datetime.now(timezone.utc),
+                    },
+                )
+        except Exception as e:
+            # Accounting must never fail the call it accounts for
+            print(f"⚠️ Could not record LLM usage: {e}")
+
+    def record_agent_step(self, llm, stage, seen):
+        """Record what an agent LLM used since the last step; seen holds the counters per LLM"""
+        now = _agent_counters(llm)
+        if now is None:
+            return
+        before = seen.get(id(llm), (0, 0, 0))
+        seen[id(llm)] = now
+        prompt_tokens, completion_tokens, calls = (after - previous for after, previous in zip(now, before))
+        if calls or prompt_tokens or completion_tokens:
+            self.record(llm.model, prompt_tokens, completion_tokens, stage=stage, source="agent", calls=calls)
+
+    def totals(self, by=("stage", "model"), day=None):
+        """{key tuple: {calls, prompt_tokens, completion_tokens, tokens, cost_usd, avg_latency_ms}}"""
+        fields = ("day", "email_id", "stage", "model")
+        day = day or self._today()
+        grouped = defaultdict(_Totals)
+        with self._lock:
+            for key, totals in self._totals.items():
+                if key[0] != day:
+                    continue
+                values = dict(zip(fields, key))
+                grouped[tuple(values[field] for field in by)].add(
+                    totals.calls, totals.prompt_tokens, totals.completion_tokens, totals.latency_ms, totals.cost_usd
+                )
+        return {
+            key: {
+                "calls": totals.calls,
+                "prompt_tokens": totals.prompt_tokens,
+                "completion_tokens": totals.completion_tokens,
+                "tokens": totals.tokens,
+                "cost_usd": round(totals.cost_usd, 6),
+                "avg_latency_ms": round(totals.latency_ms / totals.calls, 1) if totals.calls else None,
+            }
+            for key, totals in grouped.items()
+        }
+
+    def _spent(self, budget, stage, email_id):
+        today = self._today()
+        with self._lock:
+            if budget == "daily_cost_usd":
+                return sum(t.cost_usd for key, t in self._totals.items() if key[0] == today)
+            if budget == "daily_tokens":
+                return sum(t.tokens for key, t in self._totals.items() if key[0] == today)
+            if budget == "stage_daily_tokens":
+                return sum(t.tokens for key, t in self._totals.items() if key[0] == today and key[2] == stage)
+            if budget == "email_tokens":
+                if email_id is None:
+                    return 0
+                return sum(t.tokens for key, t in self._totals.items() if key[1] == email_id)
+        raise ValueError(f"Unknown budget: {budget}")
+
+    def exceeded(self, stage=None):
+        """{budget: action} for the budgets the current scope is over"""
+        scope = _scope.get()
+        stage = stage or scope.get("stage")
+        return {
+            name: action
+            for name, (limit, action) in self.budgets.items()
+            if self._spent(name, stage, scope.get("email_id")) >= limit
+        }
+
+    def budget_actions(self, stage=None):
+        """The actions ('downgrade', 'throttle') the next call of a stage is subject to"""
+        exceeded = self.exceeded(stage)
+        for budget, action in exceeded.items():
+            increment("llm_budget_exceeded_total", budget=budget, action=action)
+        return set(exceeded.values())
+
+    def budget_status(self):
+        """[(budget, limit, action, spent today)]; per stage and for the largest email where it applies"""
+        status = []
+        for name, (limit, action) in self.budgets.items():
+            if name == "daily_cost_usd":
+                spent = sum(row["cost_usd"] for row in self.totals(by=()).values())
+                status.append((name, limit, action, spent))
+            elif name == "daily_tokens":
+                spent = sum(row["tokens"] for row in self.totals(by=()).values())
+                status.append((name, limit, action, spent))
+            elif name == "stage_daily_tokens":
+                for (stage,), row in sorted(self.totals(by=("stage",)).items()):
+                    status.append((f"{name} ({stage})", limit, action, row["tokens"]))
+            elif name == "email_tokens":
+                by_email = {key: row for key, row in self.totals(by=("email_id",)).items() if key[0] is not None}
+                if by_email:
+                    (email_id,), row = max(by_email.items(), key=lambda item: item[1]["tokens"])
+                    status.append((f"{name} (email {email_id})", limit, action, row["tokens"]))
+        return status
+
+    def throttle(self):
+        """Wait until THROTTLE_SECONDS have passed since the previous throttled call"""
+        with self._lock:
+            wait = self._last_throttled + THROTTLE_SECONDS - time.monotonic()
+            self._last_throttled = time.monotonic() + max(wait, 0.0)
+        if wait > 0:
+            time.sleep(wait)
+
+LEDGER = UsageLedger()
+
+def usage_summary(engine, days=7, by=("stage", "model")):
+    """Rows of llm_usage totals over the last days, grouped by the given columns"""
+    columns = ", ".join(by)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                f"""
+                SELECT {columns}, SUM(calls) AS calls, SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(completion_tokens) AS completion_tokens, SUM(cost_usd) AS cost_usd,
+                       SUM(latency_ms) / SUM(calls) AS avg_latency_ms
+                FROM llm_usage
+                WHERE created_at >= :since
+                GROUP BY {columns}
+                ORDER BY cost_usd DESC, prompt_tokens DESC
+                """
+            ),
+            {"since": datetime.now(timezone.utc) - timedelta(days=days)},
+        ).mappings().fetchall()
+    return [dict(row) for row in rows]
+
+if __name__ == "__main__":
+    import utils.bootstrap  # noqa: F401
+    from utils.database import setup_database
+
+    parser = argparse.ArgumentParser(description="Summarise LLM token usage and cost")
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--by", default="stage,model", help="Comma separated: email_id, stage, model, prompt_id")
+    args = parser.parse_args()
+
+    engine = setup_database()
+    ensure_usage_table(engine)
+    by = tuple(column.strip() for column in args.by.split(","))
+    if not set(by) <= {"email_id", "stage", "model", "prompt_id", "source"}:
+        parser.error(f"Cannot group by {args.by}")
+    for row in usage_summary(engine, args.days, by):
+        key = " / ".join(str(row[column]) for column in by)
+        print(
+            f"💰 {key}: {row['calls']} calls, {row['prompt_tokens']} + {row['completion_tokens']} tokens, "
+            f"${row['cost_usd'] or 0:.4f}, avg {row['avg_latency_ms'] or 0:.0f} ms"
+        )
+    sys.exit(0)